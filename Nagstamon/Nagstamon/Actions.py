@@ -19,6 +19,9 @@
 
 import threading
 import gobject
+import heapq
+import Queue
+import random
 import time
 import datetime
 import urllib
@@ -44,6 +47,7 @@ import os, stat
 
 from Nagstamon import Objects
 from Nagstamon.Objects import Result
+from Nagstamon.Connection import KeepAliveHTTPHandler, KeepAliveHTTPSHandler, HTTPCompressionHandler
 
 #from Nagstamon import GUI
 import GUI
@@ -59,16 +63,155 @@ except:
 # flag which indicates if already rechecking all
 RecheckingAll = False
 
+# the one scheduler for all servers if refresh_engine is "scheduler"
+Scheduler = None
+
+# seconds the first refresh cycles of all servers get spread over at startup
+REFRESH_STARTUP_SPREAD = 5
+
 
 def StartRefreshLoop(servers=None, output=None, conf=None):
     """
-    the everlasting refresh cycle - starts refresh cycle for every server as thread
+    the everlasting refresh cycle - starts refresh cycle for every server
     """
+    enabled_servers = [server for server in servers.values() if str(conf.servers[server.get_name()].enabled) == "True"]
 
-    for server in servers.values():
-        if str(conf.servers[server.get_name()].enabled) == "True":
-            server.thread = RefreshLoopOneServer(server=server, output=output, conf=conf)
-            server.thread.start()
+    for index, server in enumerate(enabled_servers):
+        # do not hit all servers and the GUI at the same instant
+        delay = float(index) * REFRESH_STARTUP_SPREAD / len(enabled_servers)
+        StartRefreshLoopOneServer(server=server, output=output, conf=conf, delay=delay)
+
+
+def StartRefreshLoopOneServer(server=None, output=None, conf=None, delay=0):
+    """
+    start refresh cycle of one server with the refresh engine chosen in config, either as
+    thread of its own or as job of the one scheduler - both offer Stop() and Refresh()
+    """
+    global Scheduler
+
+    if str(conf.refresh_engine) == "scheduler":
+        if Scheduler == None:
+            Scheduler = RefreshScheduler(output=output, conf=conf)
+            Scheduler.start()
+        server.thread = RefreshJob(server=server, output=output, conf=conf, scheduler=Scheduler, delay=delay)
+    else:
+        server.thread = RefreshLoopOneServer(server=server, output=output, conf=conf, delay=delay)
+    server.thread.start()
+
+
+def RefreshServer(server=None, output=None, conf=None):
+    """
+    one refresh cycle of one server, used by both refresh engines
+    results get to the GUI only via gobject.idle_add() because this runs outside the GTK thread
+    """
+    # set server status for status field in popwin
+    server.status = "Refreshing (last updated %s)" % time.ctime()
+    gobject.idle_add(output.popwin.UpdateStatus, server)
+    # get current status
+    server_status = server.GetStatus(output=output)
+    # GTK/Pango does not like tag brackets < and >, so clean them out from description
+    server_status.error = server_status.error.replace("<", "").replace(">", "").replace("\n", " ")
+    # debug
+    if str(conf.debug_mode) == "True":
+        server.Debug(server=server.get_name(), debug="server return values: " + str(server_status.result) + " " + str(server_status.error))
+    if server_status.error != "":
+        # set server status for status field in popwin
+        server.status = "ERROR"
+        # give server status description for future usage
+        server.status_description = str(server_status.error)
+        gobject.idle_add(output.popwin.UpdateStatus, server)
+        ShowRefreshError(output=output, conf=conf)
+    elif server_status.unchanged == True:
+        # nothing changed so there is no need to rebuild the GUI
+        server.status = "Connected (last updated %s)" % time.ctime()
+        gobject.idle_add(output.popwin.UpdateStatus, server)
+    else:
+        # set server status for status field in popwin
+        server.status = "Connected (last updated %s)" % time.ctime()
+        # tell gobject to care about GUI stuff - refresh display status
+        gobject.idle_add(_RefreshDisplayStatusTimed, server, output)
+        if str(conf.fullscreen) == "True":
+            gobject.idle_add(output.popwin.RefreshFullscreen)
+    return server_status
+
+
+def RefreshCycle(server=None, output=None, conf=None):
+    """
+    one refresh cycle of one server guarded by its circuit breaker, used by both refresh engines
+    gives back seconds to wait until next cycle
+    """
+    breaker = server.breaker
+    if breaker.state == breaker.OPEN:
+        if breaker.is_due() == False:
+            # monitor could not be reached at all - find out cheaply if it is back
+            if breaker.connection_failed == True and server.Probe() == True:
+                if str(conf.debug_mode) == "True":
+                    server.Debug(server=server.get_name(), debug="Probe succeeded, trying full refresh")
+            else:
+                server.status = "ERROR (%s)" % (breaker.get_status())
+                gobject.idle_add(output.popwin.UpdateStatus, server)
+                return breaker.get_delay()
+        breaker.half_open()
+
+    breaker.connection_failed = False
+    cycle_start = time.time()
+    server_status = RefreshServer(server=server, output=output, conf=conf)
+    server.timings.add("total", time.time() - cycle_start)
+    cycle_timings = server.timings.end_cycle()
+    if str(conf.debug_mode) == "True":
+        server.Debug(server=server.get_name(), debug="Cycle timings: " +\
+                     ", ".join(["%s %.3f" % (phase, cycle_timings[phase]) for phase in server.timings.PHASES if cycle_timings.has_key(phase)]) +\
+                     " - p50/p95/max: " + server.timings.format_stats())
+
+    if server_status.error != "":
+        delay = breaker.failure(conf.backoff_ceiling_seconds)
+        server.status = "ERROR (%s)" % (breaker.get_status())
+        gobject.idle_add(output.popwin.UpdateStatus, server)
+        if str(conf.debug_mode) == "True":
+            server.Debug(server=server.get_name(), debug="Circuit breaker: " + breaker.get_status())
+        return delay
+
+    breaker.success()
+    return server.get_update_interval()
+
+
+def _RefreshDisplayStatusTimed(server, output):
+    # GUI update runs in GTK main loop later on, so its duration gets recorded apart from the cycle
+    start = time.time()
+    output.RefreshDisplayStatus()
+    server.timings.record("gui", time.time() - start)
+    # returning False runs idle callback only once
+    return False
+
+
+def ShowRefreshError(output=None, conf=None):
+    """
+    show error in statusbar for some seconds - timers of gobject do the waiting so the
+    calling refresh loop does not get blocked
+    """
+    # use a flag to prevent all threads at once to write to statusbar label in case
+    # of lost network connectivity - this leads to a mysterious pango crash
+    if output.statusbar.isShowingError == False:
+        # tell gobject to care about GUI stuff - refresh display status
+        gobject.idle_add(output.RefreshDisplayStatus)
+        if str(conf.fullscreen) == "True":
+            gobject.idle_add(output.popwin.RefreshFullscreen)
+        # wait a moment and change statusbar to the error message
+        gobject.timeout_add(5000, _ShowRefreshErrorMessage, output, conf)
+
+
+def _ShowRefreshErrorMessage(output, conf):
+    # shorter error message - see https://sourceforge.net/tracker/?func=detail&aid=3017044&group_id=236865&atid=1101373
+    output.statusbar.ShowErrorMessage({"True":"ERROR", "False":"ERR"}[str(conf.long_display)])
+    # wait some seconds and set statusbar error message status back
+    gobject.timeout_add(5000, _ResetRefreshError, output)
+    # returning False runs timer only once
+    return False
+
+
+def _ResetRefreshError(output):
+    output.statusbar.isShowingError = False
+    return False
 
 
 class RefreshLoopOneServer(threading.Thread):
@@ -79,6 +222,8 @@ class RefreshLoopOneServer(threading.Thread):
     stopped = False
     # Check flag, if set and thread recognizes do a refresh, set to True at the beginning
     doRefresh = True
+    # seconds to wait before first refresh
+    delay = 0
 
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
@@ -86,14 +231,18 @@ class RefreshLoopOneServer(threading.Thread):
         # include threading mechanism
         threading.Thread.__init__(self, name=self.server.get_name())
         self.setDaemon(1)
+        # lets Stop() and Refresh() interrupt waiting
+        self.wakeup = threading.Event()
 
     def Stop(self):
         # simply sets the stopped flag to True to let the above while stop this thread when checking next
         self.stopped = True
+        self.wakeup.set()
 
     def Refresh(self):
-        # simply sets the stopped flag to True to let the above while stop this thread when checking next
+        # sets the doRefresh flag and wakes up thread to refresh immediately
         self.doRefresh = True
+        self.wakeup.set()
 
     def run(self):
         """
@@ -102,9 +251,13 @@ class RefreshLoopOneServer(threading.Thread):
         # do stuff like getting server version and setting some URLs
         self.server.init_config()
 
+        if self.delay > 0:
+            self.wakeup.wait(self.delay)
+            self.wakeup.clear()
+
         while self.stopped == False:
             # check if we have to leave update interval sleep
-            if self.server.count > int(self.conf.update_interval_seconds): self.doRefresh = True
+            if self.server.count > self.server.get_update_interval(): self.doRefresh = True
 
             # self.doRefresh could also been changed by RefreshAllServers()
             if self.doRefresh == True:
@@ -112,60 +265,23 @@ class RefreshLoopOneServer(threading.Thread):
                 self.server.count = 0
                 # check if server is already checked
                 if self.server.isChecking == False:
-                    # set server status for status field in popwin
-                    self.server.status = "Refreshing (last updated %s)" % time.ctime()
-                    gobject.idle_add(self.output.popwin.UpdateStatus, self.server)
-                    # get current status
-                    server_status = self.server.GetStatus(output=self.output)
-                    # GTK/Pango does not like tag brackets < and >, so clean them out from description
-                    server_status.error = server_status.error.replace("<", "").replace(">", "").replace("\n", " ")
-                    # debug
-                    if str(self.conf.debug_mode) == "True":
-                        self.server.Debug(server=self.server.get_name(), debug="server return values: " + str(server_status.result) + " " + str(server_status.error))
-                    if server_status.error != "":
-                        # set server status for status field in popwin
-                        self.server.status = "ERROR"
-                        # give server status description for future usage
-                        self.server.status_description = str(server_status.error)
-                        gobject.idle_add(self.output.popwin.UpdateStatus, self.server)
-                        # tell gobject to care about GUI stuff - refresh display status
-                        # use a flag to prevent all threads at once to write to statusbar label in case
-                        # of lost network connectivity - this leads to a mysterious pango crash
-                        if self.output.statusbar.isShowingError == False:
-                            gobject.idle_add(self.output.RefreshDisplayStatus)
-                            if str(self.conf.fullscreen) == "True":
-                                gobject.idle_add(self.output.popwin.RefreshFullscreen)
-                            # wait a moment
-                            time.sleep(5)
-                            # change statusbar to the following error message
-                            # show error message in statusbar
-                            # shorter error message - see https://sourceforge.net/tracker/?func=detail&aid=3017044&group_id=236865&atid=1101373
-                            gobject.idle_add(self.output.statusbar.ShowErrorMessage, {"True":"ERROR", "False":"ERR"}[str(self.conf.long_display)])
-                            # wait some seconds
-                            time.sleep(5)
-                            # set statusbar error message status back
-                            self.output.statusbar.isShowingError = False
-                        # wait a moment
-                        time.sleep(10)
+                    delay = RefreshCycle(server=self.server, output=self.output, conf=self.conf)
+                    if self.server.breaker.state != self.server.breaker.CLOSED:
+                        # failing monitor - wait for next try or probe, Refresh() or Stop() wake up earlier
+                        self.wakeup.wait(delay)
+                        self.wakeup.clear()
                     else:
-                        # set server status for status field in popwin
-                        self.server.status = "Connected (last updated %s)" % time.ctime()
-                        # tell gobject to care about GUI stuff - refresh display status
-                        gobject.idle_add(self.output.RefreshDisplayStatus)
-                        if str(self.conf.fullscreen) == "True":
-                            gobject.idle_add(self.output.popwin.RefreshFullscreen)
-                        # wait for the doRefresh flag to be True, if it is, do a refresh
-                        if self.doRefresh == True:
-                            if str(self.conf.debug_mode) == "True":
-                                self.server.Debug(server=self.server.get_name(), debug="Refreshing output - server is already checking: " + str(self.server.isChecking))
-                            # reset refresh flag
-                            self.doRefresh = False
-                            # call Hook() for extra action
-                            self.server.Hook()
+                        if str(self.conf.debug_mode) == "True":
+                            self.server.Debug(server=self.server.get_name(), debug="Refreshing output - server is already checking: " + str(self.server.isChecking))
+                        # reset refresh flag
+                        self.doRefresh = False
+                        # call Hook() for extra action
+                        self.server.Hook()
 
             else:
-                # sleep and count
-                time.sleep(1)
+                # sleep and count - Refresh() or Stop() wake up earlier
+                self.wakeup.wait(1)
+                self.wakeup.clear()
                 self.server.count += 1
                 # call Hook() for extra action
                 self.server.Hook()
@@ -173,6 +289,153 @@ class RefreshLoopOneServer(threading.Thread):
                 if str(self.conf.fullscreen) == "True":
                     gobject.idle_add(self.output.popwin.RefreshFullscreen)
 
+        # connections kept alive are not needed anymore
+        self.server.connection_pool.close()
+
+
+class RefreshScheduler(threading.Thread):
+    """
+    one thread for all servers instead of one per server - keeps the due times of all
+    servers in a heap and sleeps until the next one is due instead of waking up every second,
+    due refresh cycles are handed to a small pool of worker threads doing the blocking HTTP requests
+    """
+    # intervals vary randomly by this fraction so servers do not stay in lockstep
+    JITTER = 0.1
+
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        threading.Thread.__init__(self, name="RefreshScheduler")
+        self.setDaemon(1)
+        # heap of (due time, sequence number, job) - sequence number keeps order of jobs with same due time
+        self.timers = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        # due jobs waiting for a worker
+        self.queue = Queue.Queue()
+
+
+    def Schedule(self, job, delay=0):
+        """
+        let job run again in delay seconds - an earlier scheduled time of this job gets void
+        """
+        self.condition.acquire()
+        try:
+            self._push(job, delay)
+        finally:
+            self.condition.release()
+
+
+    def Wakeup(self, job):
+        """
+        let job run now if it is waiting for its next cycle - a running cycle is good enough
+        """
+        self.condition.acquire()
+        try:
+            if job.due != None and job.stopped == False:
+                self._push(job, 0)
+        finally:
+            self.condition.release()
+
+
+    def _push(self, job, delay):
+        job.due = time.time() + delay
+        self.sequence += 1
+        heapq.heappush(self.timers, (job.due, self.sequence, job))
+        self.condition.notify()
+
+
+    def run(self):
+        for i in range(max(1, int(self.conf.refresh_engine_workers))):
+            worker = threading.Thread(target=self.Work, name="RefreshWorker-%s" % (i))
+            worker.setDaemon(1)
+            worker.start()
+
+        self.condition.acquire()
+        while True:
+            now = time.time()
+            while len(self.timers) > 0 and self.timers[0][0] <= now:
+                due, sequence, job = heapq.heappop(self.timers)
+                # rescheduled or stopped jobs leave their old timer behind
+                if job.stopped == True or job.due != due:
+                    continue
+                # job is not due anymore until worker has finished it
+                job.due = None
+                self.queue.put(job)
+            if len(self.timers) > 0:
+                self.condition.wait(self.timers[0][0] - now)
+            else:
+                self.condition.wait()
+
+
+    def Work(self):
+        """
+        worker thread - runs due refresh cycles one after another
+        """
+        while True:
+            job = self.queue.get()
+            try:
+                delay = job.Cycle()
+            except:
+                traceback.print_exc(file=sys.stdout)
+                delay = job.server.get_update_interval()
+            if job.stopped == True:
+                # connections kept alive are not needed anymore
+                job.server.connection_pool.close()
+            else:
+                self.Schedule(job, delay * random.uniform(1 - self.JITTER, 1 + self.JITTER))
+
+
+class RefreshJob(object):
+    """
+    refresh cycles of one server run by RefreshScheduler - offers the same Stop() and Refresh()
+    as RefreshLoopOneServer
+    """
+    # kind of a stop please flag, if set to True no more cycles will be run
+    stopped = False
+    # time when next cycle is due, None while cycle is running
+    due = None
+    initialized = False
+    # seconds to wait before first refresh
+    delay = 0
+
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+
+
+    def start(self):
+        self.scheduler.Schedule(self, self.delay)
+
+
+    def Stop(self):
+        self.stopped = True
+        if self.due != None:
+            self.server.connection_pool.close()
+
+
+    def Refresh(self):
+        self.scheduler.Wakeup(self)
+
+
+    def Cycle(self):
+        """
+        one refresh cycle, gives back seconds to wait until next one
+        """
+        if self.initialized == False:
+            # do stuff like getting server version and setting some URLs
+            self.server.init_config()
+            self.initialized = True
+
+        # check if server is already checked
+        if self.server.isChecking == True:
+            return self.server.get_update_interval()
+
+        delay = RefreshCycle(server=self.server, output=self.output, conf=self.conf)
+        # call Hook() for extra action
+        self.server.Hook()
+        return delay
+
 
 def RefreshAllServers(servers=None, output=None, conf=None):
     """
@@ -188,6 +451,8 @@ def RefreshAllServers(servers=None, output=None, conf=None):
             if str(conf.debug_mode) == "True":
                 server.Debug(server=server.get_name(), debug="Checking server...")
 
+            # asked for explicitly so try failing servers too
+            server.breaker.half_open()
             server.thread.Refresh()
 
             # set server status for status field in popwin
@@ -301,7 +566,8 @@ class RecheckAll(threading.Thread):
                         gobject.idle_add(self.output.popwin.UpdateStatus, server)
 
                         # special treatment for Check_MK Multisite because there is only one URL call necessary
-                        if server.type != "Check_MK Multisite":
+                        # and for Icinga 2 which reschedules many objects per request
+                        if not server.type in ["Check_MK Multisite", "Icinga 2"]:
                             for host in server.hosts.values():
                                 # construct an unique key which refers to rechecking thread in dictionary
                                 rechecks_dict[server.get_name() + ": " + host.get_name()] = Recheck(server=server, host=host.get_name(), service="")
@@ -319,7 +585,7 @@ class RecheckAll(threading.Thread):
                                     if str(self.conf.debug_mode) == "True":
                                         server.Debug(server=server.get_name(), host=host.get_name(), service=service.get_name(), debug="Rechecking...")
                         else:
-                            # Check_MK Multisite does it its own way
+                            # Check_MK Multisite and Icinga 2 do it their own way
                             server.recheck_all()
                 # wait until all rechecks have been done
                 while len(rechecks_dict) > 0:
@@ -661,7 +927,11 @@ class Action(threading.Thread):
                 # debug
                 if str(self.conf.debug_mode) == "True":
                     self.server.Debug(server=self.server.name, host=self.host, service=self.service, debug="ACTION: URL in background " + string)
-                self.server.FetchURL(string)
+                if "_transid=" in string and hasattr(self.server, "_keep_transid"):
+                    # answer contains a fresh transid for the next Check_MK action
+                    self.server._keep_transid(self.server.FetchURL(string, "raw").result)
+                else:
+                    self.server.FetchURL(string)
             # used for example by Op5Monitor.py
             elif action_type == "url-post":
                 # make string ready for URL
@@ -686,7 +956,8 @@ class Action(threading.Thread):
                     if str(self.conf.debug_mode) == "True":
                         self.server.Debug(server=self.server.name, host=self.host, service=self.service, debug="ACTION: URL-Check_MK in background " + string)
 
-                    self.server.FetchURL(string)
+                    # answer contains a fresh transid for the next action
+                    self.server._keep_transid(self.server.FetchURL(string, "raw").result)
         except:
             import traceback
             traceback.print_exc(file=sys.stdout)
@@ -804,6 +1075,13 @@ def CreateServer(server=None, conf=None, debug_queue=None, resources=None):
     new_server.use_display_name_host = server.use_display_name_host
     new_server.use_display_name_service = server.use_display_name_service
 
+    # parallel requests in one refresh cycle
+    new_server.max_concurrent_requests = server.max_concurrent_requests
+    # refresh interval of this server if it should differ from the global one
+    new_server.update_interval_seconds = server.update_interval_seconds
+    # rows per request for monitors which page their status
+    new_server.page_size = server.page_size
+
     # create permanent urlopener for server to avoid memory leak with millions of openers
     new_server.urlopener = BuildURLOpener(new_server)
     # server's individual preparations for HTTP connections (for example cookie creation), version of monitor
@@ -828,7 +1106,13 @@ def BuildURLOpener(server):
     where IE proxy settings are used automatically if available
     In UNIX $HTTP_PROXY will be used
     The MultipartPostHandler is needed for submitting multipart forms from Opsview
+    The KeepAlive handlers keep connections open in server.connection_pool for the next requests,
+    HTTPCompressionHandler asks for compressed responses and counts bytes in server.transfer_stats
     """
+    connection_handlers = (KeepAliveHTTPHandler(server.connection_pool, server.timings),\
+                           KeepAliveHTTPSHandler(server.connection_pool, server.timings),\
+                           HTTPCompressionHandler(server.transfer_stats))
+
     # trying with changed digest/basic auth order as some digest auth servers do not
     # seem to work wi the previous way
     if str(server.use_proxy) == "False":
@@ -837,13 +1121,15 @@ def BuildURLOpener(server):
                                          server.basic_handler,\
                                          server.proxy_handler,\
                                          urllib2.HTTPCookieProcessor(server.Cookie),\
-                                         MultipartPostHandler)
+                                         MultipartPostHandler,\
+                                         *connection_handlers)
     elif str(server.use_proxy) == "True":
         if str(server.use_proxy_from_os) == "True":
             urlopener = urllib2.build_opener(server.digest_handler,\
                                              server.basic_handler,\
                                              urllib2.HTTPCookieProcessor(server.Cookie),\
-                                             MultipartPostHandler)
+                                             MultipartPostHandler,\
+                                             *connection_handlers)
         else:
             # if proxy from OS is not used there is to add a authenticated proxy handler
             server.passman.add_password(None, server.proxy_address, server.proxy_username, server.proxy_password)
@@ -854,7 +1140,8 @@ def BuildURLOpener(server):
                                             server.digest_handler,\
                                             server.basic_handler,\
                                             urllib2.HTTPCookieProcessor(server.Cookie),\
-                                            MultipartPostHandler)
+                                            MultipartPostHandler,\
+                                            *connection_handlers)
     return urlopener
 
 
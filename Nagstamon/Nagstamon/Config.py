@@ -57,6 +57,12 @@ class Config(object):
         """
         # move from minute interval to seconds
         self.update_interval_seconds = 60
+        # "threads" runs one refresh thread per server, "scheduler" runs one timer thread
+        # for all servers which hands refresh cycles to a few workers
+        self.refresh_engine = "threads"
+        self.refresh_engine_workers = 4
+        # longest wait in seconds before retrying a failing server
+        self.backoff_ceiling_seconds = 300
         self.short_display = False
         self.long_display = True
         self.show_grid = True
@@ -800,6 +806,15 @@ class Server(object):
         self.use_display_name_host = False
         self.use_display_name_service = False
 
+        # maximum of parallel requests to monitor in one refresh cycle
+        self.max_concurrent_requests = 4
+
+        # own refresh interval of this server, 0 means global update_interval_seconds
+        self.update_interval_seconds = 0
+
+        # rows per request for monitors which page their status
+        self.page_size = 1000
+
 
 class Action(object):
     """
@@ -0,0 +1,736 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    persistent HTTP connections for the server urlopeners
+    urllib2 closes every connection after one request which means a new TCP and
+    maybe TLS handshake for every single request of every refresh cycle
+    furthermore transfer compression for the big status pages, incremental decoding of
+    big JSON answers and a circuit breaker for monitors which fail
+"""
+
+import urllib2
+import httplib
+import socket
+import select
+import ssl
+import threading
+import time
+import zlib
+import collections
+import json
+
+
+class ConnectionPool(object):
+    """
+        keeps idle HTTP/1.1 connections of one server, keyed by host and tunnel host
+        so proxy connections and direct connections never get mixed up
+    """
+
+    # connections of one host which are kept idle at the same time
+    MAX_IDLE = 4
+    # connections idle longer than this are not trusted anymore
+    MAX_IDLE_SECONDS = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = dict()
+        # counters for debugging
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+
+
+    def get(self, key):
+        """
+        give back an idle connection for key or None if a new one has to be opened
+        """
+        self.lock.acquire()
+        try:
+            connections = self.idle.get(key, [])
+            while len(connections) > 0:
+                connection, idle_since = connections.pop()
+                if time.time() - idle_since < self.MAX_IDLE_SECONDS and not _is_dropped(connection):
+                    self.hits += 1
+                    return connection
+                self.dropped += 1
+                connection.close()
+            self.misses += 1
+            return None
+        finally:
+            self.lock.release()
+
+
+    def put(self, key, connection):
+        """
+        give connection back to pool after its response has been read completely
+        """
+        self.lock.acquire()
+        try:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.MAX_IDLE:
+                connections.append((connection, time.time()))
+                return
+        finally:
+            self.lock.release()
+        connection.close()
+
+
+    def close(self):
+        """
+        close all idle connections, for example when server gets deleted or changed
+        """
+        self.lock.acquire()
+        try:
+            for connections in self.idle.values():
+                for connection, idle_since in connections:
+                    connection.close()
+            self.idle = dict()
+        finally:
+            self.lock.release()
+
+
+    def get_stats(self):
+        """
+        counters for debug output
+        """
+        return {"hits": self.hits, "misses": self.misses, "dropped": self.dropped}
+
+
+def _is_dropped(connection):
+    """
+    an idle keep-alive connection must not be readable - if it is the server closed it
+    """
+    if connection.sock is None:
+        return True
+    try:
+        readable = select.select([connection.sock], [], [], 0)[0]
+    except (select.error, socket.error, ValueError):
+        return True
+    return len(readable) > 0
+
+
+class KeepAliveResponse(httplib.HTTPResponse):
+    """
+        HTTPResponse which gives its connection back to the pool when it was read completely
+    """
+
+    def __init__(self, *args, **kwds):
+        httplib.HTTPResponse.__init__(self, *args, **kwds)
+        self.release = None
+        self.reading = False
+        # time spent reading the body goes to timings as download phase
+        self.timings = None
+        self.read_time = 0
+
+
+    def read(self, amt=None):
+        # if httplib closes the response while reading the body is complete
+        self.reading = True
+        start = time.time()
+        try:
+            return httplib.HTTPResponse.read(self, amt)
+        finally:
+            self.read_time += time.time() - start
+            self.reading = False
+
+
+    def close(self):
+        # HEAD requests and responses like 304 have no body to be read
+        complete = self.reading or self.fp is None or self.length == 0
+        httplib.HTTPResponse.close(self)
+        if self.timings is not None:
+            timings = self.timings
+            self.timings = None
+            timings.add("download", self.read_time)
+        if self.release is not None:
+            release = self.release
+            self.release = None
+            release(complete and not self.will_close)
+
+
+def _create_connection(address, timeout, source_address, timings):
+    """
+    socket.create_connection() with name resolution and connecting measured separately
+    """
+    host, port = address
+    start = time.time()
+    addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    if timings is not None:
+        timings.add("dns", time.time() - start)
+
+    start = time.time()
+    error = None
+    for family, socktype, proto, canonname, sockaddr in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            if timings is not None:
+                timings.add("connect", time.time() - start)
+            return sock
+        except socket.error, err:
+            error = err
+            if sock is not None:
+                sock.close()
+
+    if error is not None:
+        raise error
+    raise socket.error("getaddrinfo returns an empty list")
+
+
+class KeepAliveHTTPConnection(httplib.HTTPConnection):
+    response_class = KeepAliveResponse
+    timings = None
+
+    def connect(self):
+        self.sock = _create_connection((self.host, self.port), self.timeout, self.source_address, self.timings)
+        if self._tunnel_host:
+            self._tunnel()
+
+
+class KeepAliveHTTPSConnection(httplib.HTTPSConnection):
+    response_class = KeepAliveResponse
+    timings = None
+
+    def connect(self):
+        self.sock = _create_connection((self.host, self.port), self.timeout, self.source_address, self.timings)
+        if self._tunnel_host:
+            self._tunnel()
+        start = time.time()
+        # _context exists since Python 2.7.9 and carries certificate settings
+        if getattr(self, "_context", None) is not None:
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=self._tunnel_host or self.host)
+        else:
+            self.sock = ssl.wrap_socket(self.sock, self.key_file, self.cert_file)
+        if self.timings is not None:
+            self.timings.add("tls", time.time() - start)
+
+
+class KeepAliveHandlerMixin(object):
+    """
+        replacement for urllib2.AbstractHTTPHandler.do_open() which takes connections
+        from the pool instead of opening and closing one per request
+        everything else - auth handlers, proxy handler, cookies - stays as it is because
+        they work on request and response objects only
+    """
+
+    def do_open(self, http_class, req, **http_conn_args):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        tunnel_headers = {}
+        if req._tunnel_host:
+            # Proxy-Authorization should not be sent to origin server
+            if "Proxy-Authorization" in headers:
+                tunnel_headers["Proxy-Authorization"] = headers.pop("Proxy-Authorization")
+
+        key = (http_class.__name__, host, req._tunnel_host)
+
+        connection = self.pool.get(key)
+        if connection is not None:
+            try:
+                response = self._request(connection, req, headers)
+            except (socket.error, httplib.HTTPException), err:
+                connection.close()
+                # server closed the kept connection meanwhile - try once again with a fresh one,
+                # but a timed out or POST request might have reached the monitor and must not run twice
+                if isinstance(err, socket.timeout) or req.has_data():
+                    if isinstance(err, socket.error):
+                        raise urllib2.URLError(err)
+                    raise
+                connection = None
+        if connection is None:
+            connection = http_class(host, timeout=req.timeout, **http_conn_args)
+            connection.set_debuglevel(self._debuglevel)
+            connection.timings = self.timings
+            if req._tunnel_host:
+                connection.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+            try:
+                response = self._request(connection, req, headers)
+            except socket.error, err:
+                connection.close()
+                raise urllib2.URLError(err)
+
+        if response.will_close:
+            connection.close()
+        else:
+            def release(reusable, key=key, connection=connection):
+                if reusable:
+                    self.pool.put(key, connection)
+                else:
+                    connection.close()
+            response.release = release
+        response.timings = self.timings
+
+        # same wrapping as done by urllib2
+        response.recv = response.read
+        fp = socket._fileobject(response, close=True)
+
+        resp = urllib2.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+
+    def _request(self, connection, req, headers):
+        # connect first so time to first byte does not contain connection setup
+        if connection.sock is None:
+            connection.connect()
+        start = time.time()
+        connection.request(req.get_method(), req.get_selector(), req.data, headers)
+        response = connection.getresponse(buffering=True)
+        if self.timings is not None:
+            self.timings.add("ttfb", time.time() - start)
+        return response
+
+
+class KeepAliveHTTPHandler(KeepAliveHandlerMixin, urllib2.HTTPHandler):
+
+    def __init__(self, pool, timings=None, debuglevel=0):
+        urllib2.HTTPHandler.__init__(self, debuglevel)
+        self.pool = pool
+        self.timings = timings
+
+
+    def http_open(self, req):
+        return self.do_open(KeepAliveHTTPConnection, req)
+
+
+class KeepAliveHTTPSHandler(KeepAliveHandlerMixin, urllib2.HTTPSHandler):
+
+    def __init__(self, pool, timings=None, debuglevel=0):
+        urllib2.HTTPSHandler.__init__(self, debuglevel)
+        self.pool = pool
+        self.timings = timings
+
+
+    def https_open(self, req):
+        # _context exists since Python 2.7.9 and carries certificate settings
+        if getattr(self, "_context", None) is not None:
+            return self.do_open(KeepAliveHTTPSConnection, req, context=self._context)
+        return self.do_open(KeepAliveHTTPSConnection, req)
+
+
+class TransferStats(object):
+    """
+        bytes received on the wire and after decompression, per server
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wire = 0
+        self.decoded = 0
+
+
+    def add(self, wire=0, decoded=0):
+        self.lock.acquire()
+        self.wire += wire
+        self.decoded += decoded
+        self.lock.release()
+
+
+    def get_stats(self):
+        """
+        counters for debug output
+        """
+        return {"wire": self.wire, "decoded": self.decoded}
+
+
+class PhaseTimings(object):
+    """
+        durations of the phases of refresh cycles of one server - DNS, connect, TLS, time to first
+        byte, download, parsing, filtering, GUI update - and rolling percentiles over the last cycles
+        phases of requests running in parallel add up within a cycle
+    """
+
+    PHASES = ("dns", "connect", "tls", "ttfb", "download", "parse", "filter", "gui", "total")
+    # number of cycles the percentiles are calculated of
+    WINDOW = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cycle = dict()
+        self.samples = dict()
+        for phase in self.PHASES:
+            self.samples[phase] = collections.deque(maxlen=self.WINDOW)
+
+
+    def add(self, phase, seconds):
+        """
+        add duration to phase of current cycle
+        """
+        self.lock.acquire()
+        self.cycle[phase] = self.cycle.get(phase, 0) + seconds
+        self.lock.release()
+
+
+    def record(self, phase, seconds):
+        """
+        add duration directly as sample of its own, for phases like GUI update which happen
+        after the cycle has been finished
+        """
+        self.lock.acquire()
+        self.samples.setdefault(phase, collections.deque(maxlen=self.WINDOW)).append(seconds)
+        self.lock.release()
+
+
+    def end_cycle(self):
+        """
+        finish current cycle and give back its phase durations
+        """
+        self.lock.acquire()
+        try:
+            cycle, self.cycle = self.cycle, dict()
+            for phase, seconds in cycle.items():
+                self.samples.setdefault(phase, collections.deque(maxlen=self.WINDOW)).append(seconds)
+            return cycle
+        finally:
+            self.lock.release()
+
+
+    def get_stats(self):
+        """
+        p50, p95, max and number of samples per phase over the last cycles
+        """
+        self.lock.acquire()
+        try:
+            stats = dict()
+            for phase, samples in self.samples.items():
+                if len(samples) == 0:
+                    continue
+                values = sorted(samples)
+                stats[phase] = {"p50": values[int(round((len(values) - 1) * 0.5))],
+                                "p95": values[int(round((len(values) - 1) * 0.95))],
+                                "max": values[-1],
+                                "count": len(values)}
+            return stats
+        finally:
+            self.lock.release()
+
+
+    def format_stats(self):
+        """
+        p50/p95/max per phase in seconds for debug output
+        """
+        stats = self.get_stats()
+        return ", ".join(["%s %.3f/%.3f/%.3f" % (phase, stats[phase]["p50"], stats[phase]["p95"], stats[phase]["max"])\
+                          for phase in self.PHASES if stats.has_key(phase)])
+
+
+class CountingFile(object):
+    """
+        file-like wrapper for uncompressed responses, only counting bytes
+    """
+
+    def __init__(self, fp, stats):
+        self.fp = fp
+        self.stats = stats
+
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.stats.add(wire=len(data), decoded=len(data))
+        return data
+
+
+    def readline(self, size=-1):
+        data = self.fp.readline(size)
+        self.stats.add(wire=len(data), decoded=len(data))
+        return data
+
+
+    def close(self):
+        self.fp.close()
+
+
+class DecompressingFile(object):
+    """
+        file-like wrapper which decompresses gzip or deflate encoded responses while they are read
+        so neither the compressed nor the decompressed body has to be held twice in memory
+    """
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, fp, encoding, stats):
+        self.fp = fp
+        self.stats = stats
+        self.encoding = encoding
+        if encoding == "gzip":
+            # 16 + MAX_WBITS lets zlib expect a gzip header
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            self.decompressor = zlib.decompressobj()
+        # some servers send raw deflate data without zlib header - find out with first chunk
+        self.first_chunk = True
+        self.buffer = ""
+        self.eof = False
+
+
+    def _decompress(self, chunk):
+        try:
+            return self.decompressor.decompress(chunk)
+        except zlib.error:
+            if self.encoding == "deflate" and self.first_chunk:
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                return self.decompressor.decompress(chunk)
+            raise
+
+
+    def _fill(self, size):
+        """
+        decompress until buffer has size bytes or body is read completely - size < 0 means everything
+        """
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while not self.eof and (size < 0 or length < size):
+            chunk = self.fp.read(self.CHUNK_SIZE)
+            if chunk == "":
+                data = self.decompressor.flush()
+                self.eof = True
+            else:
+                data = self._decompress(chunk)
+                self.first_chunk = False
+            self.stats.add(wire=len(chunk), decoded=len(data))
+            chunks.append(data)
+            length += len(data)
+        self.buffer = "".join(chunks)
+
+
+    def read(self, size=-1):
+        if size == None:
+            size = -1
+        self._fill(size)
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+    def readline(self, size=-1):
+        while not self.eof and self.buffer.find("\n") == -1:
+            self._fill(len(self.buffer) + self.CHUNK_SIZE)
+        end = self.buffer.find("\n") + 1
+        if end == 0:
+            end = len(self.buffer)
+        if size >= 0:
+            end = min(end, size)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+
+    def close(self):
+        self.fp.close()
+
+
+class HTTPCompressionHandler(urllib2.BaseHandler):
+    """
+        asks for gzip/deflate compressed responses and decompresses them transparently
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+
+    def http_request(self, req):
+        if not req.has_header("Accept-encoding"):
+            req.add_unredirected_header("Accept-encoding", "gzip, deflate")
+        return req
+
+
+    def http_response(self, req, response):
+        encoding = response.info().getheader("Content-Encoding", "").strip().lower()
+        if encoding in ("gzip", "x-gzip", "deflate"):
+            fp = DecompressingFile(response, {"x-gzip": "gzip"}.get(encoding, encoding), self.stats)
+            # length and encoding of the body as seen by the callers are different now
+            del response.info()["Content-Encoding"]
+            del response.info()["Content-Length"]
+        else:
+            fp = CountingFile(response, self.stats)
+        decoded = urllib2.addinfourl(fp, response.info(), response.geturl())
+        decoded.code = response.code
+        decoded.msg = response.msg
+        return decoded
+
+    https_request = http_request
+    https_response = http_response
+
+
+class JSONArrayDecoder(object):
+    """
+        incremental decoder for answers consisting of one JSON array - chunks of the answer
+        are fed in as they arrive and the complete elements are given back at once, so
+        neither the whole answer nor the whole list has to be held in memory
+    """
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+
+
+    def feed(self, data):
+        """
+        add next chunk of answer and give back the elements completed by it
+        """
+        self.buffer += data
+        elements = list()
+        position = 0
+        while not self.finished:
+            while position < len(self.buffer) and self.buffer[position] in self.WHITESPACE:
+                position += 1
+            if position == len(self.buffer):
+                break
+            if not self.started:
+                if self.buffer[position] != "[":
+                    raise ValueError("JSON answer is no array")
+                self.started = True
+                position += 1
+                continue
+            if self.buffer[position] == ",":
+                position += 1
+                continue
+            if self.buffer[position] == "]":
+                self.finished = True
+                position += 1
+                break
+            try:
+                element, end = self.decoder.raw_decode(self.buffer, position)
+            except ValueError:
+                # element is not complete yet
+                break
+            # numbers might go on in the next chunk
+            if end == len(self.buffer) and not isinstance(element, (dict, list)):
+                break
+            elements.append(element)
+            position = end
+        self.buffer = self.buffer[position:]
+        return elements
+
+
+    def close(self):
+        """
+        end of answer - give back the last elements and complain if array is incomplete
+        """
+        elements = self.feed("")
+        if not self.finished:
+            raise ValueError("JSON answer ended unexpectedly")
+        return elements
+
+
+def is_connection_error(error):
+    """
+    tell if error means monitor could not be reached at all - refused connections, timeouts,
+    broken connections - unlike HTTP errors which come from a monitor which is alive
+    """
+    if isinstance(error, urllib2.HTTPError):
+        return False
+    return isinstance(error, (urllib2.URLError, socket.error, httplib.HTTPException))
+
+
+class CircuitBreaker(object):
+    """
+        keeps refresh cycles from hammering a failing monitor
+        closed - everything fine, refresh in usual interval
+        open - last cycle failed, next full cycle only after a backoff delay which doubles with
+        every failure up to a ceiling - meanwhile cheap probes find out if a monitor which was
+        not reachable at all is back again
+        half-open - backoff delay has passed or probe succeeded, next cycle decides
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    # backoff after first failure
+    BASE_DELAY = 10
+    # seconds between probes of an unreachable monitor and their timeout
+    PROBE_INTERVAL = 10
+    PROBE_TIMEOUT = 5
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0
+        # set by connection errors, not by HTTP errors - only then probing makes sense
+        self.connection_failed = False
+
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0
+
+
+    def failure(self, ceiling):
+        """
+        open circuit after failed cycle and give back seconds until next cycle or probe
+        """
+        self.failures += 1
+        self.state = self.OPEN
+        backoff = min(self.BASE_DELAY * 2 ** min(self.failures - 1, 16), max(int(ceiling), self.BASE_DELAY))
+        self.retry_at = time.time() + backoff
+        return self.get_delay()
+
+
+    def half_open(self):
+        """
+        let next cycle try the monitor regardless of backoff
+        """
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+
+
+    def is_due(self):
+        return time.time() >= self.retry_at
+
+
+    def get_delay(self):
+        """
+        seconds until next full cycle or, if monitor was not reachable at all, until next probe
+        """
+        delay = max(0, self.retry_at - time.time())
+        if self.connection_failed == True:
+            return min(delay, self.PROBE_INTERVAL)
+        return delay
+
+
+    def get_status(self):
+        """
+        state description for status line in popwin
+        """
+        status = "circuit %s after %s failure%s, next try in %.0f s" % (self.state, self.failures,\
+                 {True: "", False: "s"}[self.failures == 1], max(0, self.retry_at - time.time()))
+        if self.connection_failed == True:
+            status += ", probing every %s s" % (self.PROBE_INTERVAL)
+        return status
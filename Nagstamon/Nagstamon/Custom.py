@@ -31,6 +31,9 @@ from Nagstamon.Server.op5Monitor import Op5MonitorServer
 from Nagstamon.Server.Opsview import OpsviewServer
 from Nagstamon.Server.Thruk import ThrukServer
 from Nagstamon.Server.Zabbix import ZabbixServer
+from Nagstamon.Server.Livestatus import LivestatusServer
+from Nagstamon.Server.StatusDat import StatusDatServer
+from Nagstamon.Server.Icinga2 import Icinga2Server
 
 
 # moved registration process because of circular dependencies
@@ -43,4 +46,7 @@ register_server(Op5MonitorServer)
 register_server(OpsviewServer)
 register_server(ThrukServer)
 register_server(ZabbixServer)
+register_server(LivestatusServer)
+register_server(StatusDatServer)
+register_server(Icinga2Server)
 
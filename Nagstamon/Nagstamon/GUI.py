@@ -2957,6 +2957,11 @@ class ServerVBox(gtk.VBox):
         self.output.popwin.UpdateStatus(server)
         self.output.popwin.Resize()
 
+        # try new credentials right now instead of waiting for backoff of failed cycles
+        if server.thread:
+            server.breaker.half_open()
+            server.thread.Refresh()
+
 
     def AuthUsername(self, widget, event):
         """
@@ -4092,9 +4097,8 @@ class GenericServer(object):
                 self.servers[new_server.name] = created_server
 
                 if str(self.conf.servers[new_server.name].enabled) == "True":
-                    # start new thread (should go to Actions!)
-                    self.servers[new_server.name].thread = Actions.RefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
-                    self.servers[new_server.name].thread.start()
+                    # start refresh cycle of new server
+                    Actions.StartRefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
 
             # fill settings dialog treeview
             self.settingsdialog.FillTreeView("servers_treeview", self.conf.servers, "Servers", "selected_server")
@@ -4322,6 +4326,10 @@ class EditServer(GenericServer):
         new_server = Config.Server()
 
         keys = new_server.__dict__.keys()
+        # settings which have no widget in dialog and only live in config file are kept
+        for key in keys:
+            if self.conf.servers[self.server].__dict__.has_key(key):
+                new_server.__dict__[key] = self.conf.servers[self.server].__dict__[key]
         for i in ["input_entry_", "input_checkbutton_", "input_radiobutton_", "input_spinbutton_", "input_filechooser_"]:
             for key in keys:
                 j = self.builder.get_object(i + key)
@@ -4380,9 +4388,8 @@ class EditServer(GenericServer):
             if created_server is not None:
                 self.servers[new_server.name] = created_server
                 if str(self.conf.servers[new_server.name].enabled) == "True":
-                    # start new thread (should go to Actions)
-                    self.servers[new_server.name].thread = Actions.RefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
-                    self.servers[new_server.name].thread.start()
+                    # start refresh cycle of new server
+                    Actions.StartRefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
 
             # fill settings dialog treeview
             self.settingsdialog.FillTreeView("servers_treeview", self.conf.servers, "Servers", "selected_server")
@@ -18,6 +18,8 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
 
 import Actions
+import threading
+import time
 
 
 class Column(object):
@@ -140,6 +142,8 @@ class GenericObject(object):
         self.visible = True
         # Check_MK also has site info
         self.site = ""
+        # address of host if monitor gives it away with status information
+        self.address = ""
         # server to be added to hash
         self.server = ""
 
@@ -256,12 +260,47 @@ class GenericService(GenericObject):
         return " ".join((self.server, self.site, self.host, self.name, self.status))
 
 
+class AddressCache(object):
+    """
+    addresses of hosts or DNS names of addresses, each one forgotten after ttl seconds
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = dict()
+
+
+    def get(self, key):
+        """
+        give back cached value of key or None if unknown or too old
+        """
+        self.lock.acquire()
+        try:
+            if self.entries.has_key(key):
+                value, stored = self.entries[key]
+                if time.time() - stored < self.ttl:
+                    return value
+                del self.entries[key]
+            return None
+        finally:
+            self.lock.release()
+
+
+    def put(self, key, value):
+        self.lock.acquire()
+        self.entries[key] = (value, time.time())
+        self.lock.release()
+
+
 class Result(object):
     """
     multi purpose result object, used in Servers.Generic.FetchURL()
     """
     result = ""
     error = ""
+    # set if content did not change since last request
+    unchanged = False
 
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
@@ -21,18 +21,104 @@ import urllib, urllib2
 import webbrowser
 import socket
 import sys
+import os
 import re
 import copy
+import time
+import cookielib
+import ConfigParser
+import xml.parsers.expat
+
+# to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
+# see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
+try:
+    from BeautifulSoup import BeautifulStoneSoup
+except:
+    from Nagstamon.thirdparty.BeautifulSoup import BeautifulStoneSoup
 
 from Nagstamon.Objects import *
 from Nagstamon.Server.Generic import GenericServer
 
+
+class StatusXMLParser(object):
+    """
+        streaming expat parser for Centreon status XML - every <l> row becomes one flat dictionary
+        of its child elements, elements outside of rows like <numrows> are collected in info
+        texts are UTF-8 encoded strings
+    """
+
+    def __init__(self):
+        self.rows = list()
+        self.info = dict()
+        self.row = None
+        self.text = list()
+        # not well-formed XML stops parsing, the rest of it is ignored
+        self.broken = False
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.returns_unicode = False
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self._start
+        self.parser.EndElementHandler = self._end
+        self.parser.CharacterDataHandler = self._data
+
+
+    def feed(self, data):
+        """
+        parse next chunk of UTF-8 encoded XML as it comes in, empty data ends it
+        """
+        if not self.broken:
+            try:
+                self.parser.Parse(data, data == "")
+            except xml.parsers.expat.ExpatError:
+                self.broken = True
+
+
+    def parse(self, data):
+        """
+        parse complete UTF-8 encoded XML and give back its rows
+        """
+        self.feed(data)
+        self.feed("")
+        if self.broken:
+            # not well-formed XML like HTML entities in plugin output - the old slow way
+            self.rows, self.info = list(), dict()
+            soup = BeautifulStoneSoup(data.decode("utf8"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
+            for l in soup.findAll("l"):
+                self.rows.append(dict([(element.name, element.text.encode("utf8"))\
+                                       for element in l.findAll(recursive=False)]))
+            for element in soup.findAll("i", limit=1):
+                for child in element.findAll(recursive=False):
+                    self.info[child.name] = child.text.encode("utf8")
+        return self.rows
+
+
+    def _start(self, name, attributes):
+        if name == "l":
+            self.row = dict()
+        self.text = list()
+
+
+    def _data(self, data):
+        self.text.append(data)
+
+
+    def _end(self, name):
+        if name == "l":
+            self.rows.append(self.row)
+            self.row = None
+        elif self.row != None:
+            self.row[name] = "".join(self.text)
+        else:
+            self.info[name] = "".join(self.text)
+        self.text = list()
+
+
 class CentreonServer(GenericServer):
     TYPE = 'Centreon'
     # centreon generic web interface uses a sid which is needed to ask for news
     SID = None
-    # count for SID regeneration
-    SIDcount = 0
+    # time of last SID regeneration - Hook() is not called in fixed intervals by every refresh engine
+    SIDtime = 0
 
     # URLs for browser shortlinks/buttons on popup window
     BROWSER_URLS= { "monitor": "$MONITOR$/main.php?p=1",\
@@ -64,6 +150,14 @@ class CentreonServer(GenericServer):
         # Entries for monitor default actions in context menu
         self.MENU_ACTIONS = ["Monitor", "Recheck", "Acknowledge", "Downtime"]
 
+        # ids of hosts and services as given away by status XML so actions need no HTML scraping
+        self.host_ids = dict()
+        self.service_ids = dict()
+        # SID which has been saved last to avoid needless writing
+        self.saved_SID = None
+        # a restored session which did not work is not tried again, even if its file could not be removed
+        self.session_restore_failed = False
+
 
     def init_HTTP(self):
         """
@@ -81,7 +175,9 @@ class CentreonServer(GenericServer):
         """
         self.HTTPheaders = {}
         self.SID = None
-        self.SIDcount = 0
+        self.SIDtime = time.time()
+        # saved session is of no use anymore
+        self._remove_session()
         self._get_sid()
 
 
@@ -138,6 +234,11 @@ class CentreonServer(GenericServer):
         if str(self.conf.connect_by_host) == "True" or host == "":
             return Result(result=host)
 
+        # address might be known from status information or an earlier request
+        ip = self.address_cache.get(host)
+        if ip != None:
+            return Result(result=self._resolve_address(ip))
+
         # do a web interface search limited to only one result - the hostname
         cgi_data = urllib.urlencode({"sid":self.SID,\
                                     "search":host,\
@@ -157,18 +258,10 @@ class CentreonServer(GenericServer):
         if len(xmlobj) != 0:
             # when connection by DNS is not configured do it by IP
             try:
-                if str(self.conf.connect_by_dns) == "True":
-                   # try to get DNS name for ip, if not available use ip
-                    try:
-                        address = socket.gethostbyaddr(xmlobj.l.a.text)[0]
-                        del xmlobj
-                    except:
-                        self.Error(sys.exc_info())
-                        address = str(xmlobj.l.a.text)
-                        del xmlobj
-                else:
-                    address = str(xmlobj.l.a.text)
-                    del xmlobj
+                ip = str(xmlobj.l.a.text)
+                del xmlobj
+                self.address_cache.put(host, ip)
+                address = self._resolve_address(ip)
             except:
                 result, error = self.Error(sys.exc_info())
                 return Result(error=error)
@@ -240,10 +333,102 @@ class CentreonServer(GenericServer):
         del result, error
 	
 
+    def _get_session_file(self):
+        """
+        file where SID, session cookie and XML path are kept between restarts
+        """
+        # server name might contain anything, the file has to stay in sessions directory though
+        return os.path.join(self.conf.configdir, "sessions", "centreon_" + re.sub(r"[^\w.-]", "_", self.get_name()) + ".conf")
+
+
+    def _save_session(self):
+        """
+        save SID, session cookie and XML path so a restart does not need a new login
+        """
+        try:
+            config = ConfigParser.RawConfigParser()
+            config.add_section("session")
+            # only valid for the same monitor and user
+            config.set("session", "monitor_cgi_url", self.monitor_cgi_url)
+            config.set("session", "username", self.conf.Obfuscate(self.username))
+            config.set("session", "sid", self.conf.Obfuscate(self.SID))
+            config.set("session", "sid_time", str(int(self.SIDtime)))
+            config.set("session", "xml_ndo", self.XML_NDO)
+            for number, cookie in enumerate(self.Cookie):
+                config.add_section("cookie_%s" % number)
+                config.set("cookie_%s" % number, "name", cookie.name)
+                config.set("cookie_%s" % number, "value", self.conf.Obfuscate(cookie.value))
+                config.set("cookie_%s" % number, "domain", cookie.domain)
+                config.set("cookie_%s" % number, "path", cookie.path)
+                config.set("cookie_%s" % number, "secure", str(cookie.secure))
+
+            if not os.path.exists(os.path.dirname(self._get_session_file())):
+                os.mkdir(os.path.dirname(self._get_session_file()))
+            # session is as good as a password so only the user may read it
+            f = os.fdopen(os.open(self._get_session_file(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), "w")
+            config.write(f)
+            f.close()
+            self.saved_SID = self.SID
+        except:
+            self.Error(sys.exc_info())
+
+
+    def _load_session(self):
+        """
+        restore SID, session cookie and XML path of an earlier run - True if there was one
+        which fits to this server, the first status request tells if it is still valid
+        """
+        try:
+            if not os.path.exists(self._get_session_file()):
+                return False
+            config = ConfigParser.RawConfigParser()
+            config.read(self._get_session_file())
+            if config.get("session", "monitor_cgi_url") != self.monitor_cgi_url or\
+               self.conf.DeObfuscate(config.get("session", "username")) != self.username:
+                return False
+
+            self.Cookie.clear()
+            for section in config.sections():
+                if section.startswith("cookie_"):
+                    domain = config.get(section, "domain")
+                    self.Cookie.set_cookie(cookielib.Cookie(0, config.get(section, "name"),
+                                                            self.conf.DeObfuscate(config.get(section, "value")),
+                                                            None, False, domain, domain.startswith("."), domain.startswith("."),
+                                                            config.get(section, "path"), True,
+                                                            config.get(section, "secure") == "True",
+                                                            None, True, None, None, {}))
+            self.SID = self.conf.DeObfuscate(config.get("session", "sid"))
+            self.SIDtime = int(config.get("session", "sid_time"))
+            self.XML_NDO = config.get("session", "xml_ndo")
+            self.saved_SID = self.SID
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Restored session from " + self._get_session_file())
+            return True
+        except:
+            self.Error(sys.exc_info())
+            return False
+
+
+    def _remove_session(self):
+        """
+        forget saved session
+        """
+        self.saved_SID = None
+        try:
+            if os.path.exists(self._get_session_file()):
+                os.unlink(self._get_session_file())
+        except:
+            self.Error(sys.exc_info())
+
+
     def _get_host_id(self, host):
         """
         get host_id via parsing raw html
         """
+        # id is known from status XML
+        if self.host_ids.has_key(host):
+            return self.host_ids[host]
+
         cgi_data = urllib.urlencode({"p":201,\
                                     "o":"hd", "host_name":host})
         result = self.FetchURL(self.monitor_cgi_url + "/main.php?" + cgi_data, cgi_data=urllib.urlencode({"sid":self.SID}), giveback="raw")
@@ -264,6 +449,7 @@ class CentreonServer(GenericServer):
             if int(host_id):
                 if str(self.conf.debug_mode) == "True":
                     self.Debug(server=self.get_name(), host=host, debug = "Host ID is " + host_id)
+                self.host_ids[host] = host_id
                 return host_id
             else:
                 return ""
@@ -275,6 +461,10 @@ class CentreonServer(GenericServer):
         """
         parse a ton of html to get a host and a service id...
         """
+        # ids are known from status XML
+        if self.service_ids.has_key((host, service)):
+            return self.service_ids[(host, service)]
+
         cgi_data = urllib.urlencode({"p":"20218",\
                                      "host_name":host,\
                                      "service_description":service,\
@@ -293,6 +483,8 @@ class CentreonServer(GenericServer):
                 if l.find('selected="selected"') <> -1:
                     ids.append(l.split('value="')[1].split('"')[0])
             else:
+                if len(ids) == 2:
+                    self.service_ids[(host, service)] = tuple(ids)
                 return ids
         else:
             if str(self.conf.debug_mode) == "True":
@@ -301,78 +493,152 @@ class CentreonServer(GenericServer):
             return "", ""
 
 
-    def _get_status(self):
+    def _get_status_url(self, objects, page):
         """
-        Get status from Centreon Server
+        URL of one page of hosts or services status XML
         """
-        # get sid in case this has not yet been done
-        if self.SID == None or self.SID == "":
+        if objects == "hosts":
+            return self.monitor_cgi_url + "/include/monitoring/status/Hosts/" + self.XML_NDO + "/hostXML.php?" +\
+                   urllib.urlencode({"num":page, "limit":self.get_page_size(), "o":"hpb", "sort_type":"status", "sid":self.SID})
+        else:
+            return self.monitor_cgi_url + "/include/monitoring/status/Services/" + self.XML_NDO + "/serviceXML.php?" +\
+                   urllib.urlencode({"num":page, "limit":self.get_page_size(), "o":"svcpb", "sort_type":"status", "sid":self.SID})
+
+
+    def _fetch_status_page(self, objects, page):
+        """
+        fetch one page of hosts or services status XML and parse its rows into flat dictionaries
+        while it is downloaded - info of result contains the elements outside of rows like numrows
+        """
+        url = self._get_status_url(objects, page)
+        parser = StatusXMLParser()
+        # beginning of answer is enough to recognize an invalid session
+        head = list()
+
+        def feed(data):
+            if len(head) == 0:
+                head.append(data[:64])
+            parser.feed(data)
+
+        result = self.FetchURLChunks(url, feed)
+        if result.error != "": return result
+
+        # in case there are no children session id is invalid
+        if "".join(head).strip() in ("<response>bad session id</response>", "Bad Session ID"):
+            return Result(result="ERROR", error="Bad Session ID")
+
+        if parser.broken:
+            # parsing the whole page with BeautifulStoneSoup needs all of it
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Status XML not well-formed, parsing it again the slow way: " + url)
+            result = self.FetchURL(url, giveback="raw")
+            if result.error != "": return result
+            parse_start = time.time()
+            parser = StatusXMLParser()
+            parser.parse(result.result.encode("utf8"))
+            self.timings.add("parse", time.time() - parse_start)
+
+        return Result(result=parser.rows, info=parser.info)
+
+
+    def _fetch_status_pages(self, objects):
+        """
+        fetch all pages of hosts or services status XML - the first page tells the number of rows
+        so the remaining pages can be fetched in parallel
+        gives back rows of all pages as flat dictionaries
+        """
+        result = self._fetch_status_page(objects, 0)
+        if result.error == "Bad Session ID":
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Bad session ID, retrieving new one...")
+
+            # try again... a second time a bad session id is an error
             self.SID = self._get_sid().result
-            # those ndo urls would not be changing too often so this check migth be done here
-            self._get_ndo_url()
+            result = self._fetch_status_page(objects, 0)
+        if result.error != "": return result
+
+        rows = result.result
+        page_size = self.get_page_size()
+        if result.info.has_key("numrows"):
+            # all other pages at once
+            page_count = (int(result.info["numrows"]) + page_size - 1) / page_size
+            results = self.RunConcurrently([(self._fetch_status_page, objects, page) for page in range(1, page_count)])
+            for result in results:
+                if result.error != "": return result
+                rows.extend(result.result)
+        else:
+            # older Centreon versions do not tell the number of rows so ask until a page is not full
+            page = 0
+            while len(result.result) >= page_size:
+                page += 1
+                result = self._fetch_status_page(objects, page)
+                if result.error != "": return result
+                rows.extend(result.result)
 
-        # services (unknown, warning or critical?)
-        nagcgiurl_services = self.monitor_cgi_url + "/include/monitoring/status/Services/" + self.XML_NDO + "/serviceXML.php?" + urllib.urlencode({"num":0, "limit":999, "o":"svcpb", "sort_type":"status", "sid":self.SID})
+        return Result(result=rows)
 
-        # hosts (up or down or unreachable)
-        nagcgiurl_hosts = self.monitor_cgi_url + "/include/monitoring/status/Hosts/" + self.XML_NDO + "/hostXML.php?" + urllib.urlencode({"num":0, "limit":999, "o":"hpb", "sort_type":"status", "sid":self.SID})
+
+    def _get_status(self):
+        """
+        Get status from Centreon Server
+        """
+        # get sid in case this has not yet been done - maybe there is still one of an earlier run
+        session_restored = False
+        if self.SID == None or self.SID == "":
+            if not self.session_restore_failed:
+                session_restored = self._load_session()
+            if not session_restored:
+                self.SID = self._get_sid().result
+                # those ndo urls would not be changing too often so this check migth be done here
+                self._get_ndo_url()
 
         # hosts - mostly the down ones
         # unfortunately the hosts status page has a different structure so
         # hosts must be analyzed separately
         try:
-            result = self.FetchURL(nagcgiurl_hosts, giveback="xml")
-            xmlobj, error = result.result, result.error
-            if error != "": return Result(result=copy.deepcopy(xmlobj), error=copy.deepcopy(error))
-
-            # in case there are no children session id is invalid
-            if xmlobj == "<response>bad session id</response>" or str(xmlobj) == "Bad Session ID":
-                del xmlobj
-                if str(self.conf.debug_mode) == "True":
-                    self.Debug(server=self.get_name(), debug="Bad session ID, retrieving new one...")
-
-                # try again...
-                self.SID = self._get_sid().result
-                result = self.FetchURL(nagcgiurl_hosts, giveback="xml")
-                xmlobj, error = result.result, result.error
-                if error != "": return Result(result=copy.deepcopy(xmlobj), error=copy.deepcopy(error))
-
-                # a second time a bad session id should raise an error
-                if xmlobj == "<response>bad session id</response>" or str(xmlobj) == "Bad Session ID":
-                    return Result(result="ERROR", error=str(xmlobj))
-
-            for l in xmlobj.findAll("l"):
+            result = self._fetch_status_pages("hosts")
+            if result.error != "":
+                # restored session or XML path might not be valid anymore - start from scratch
+                if session_restored:
+                    self.SID = None
+                    self.session_restore_failed = True
+                    self._remove_session()
+                    return self._get_status()
+                return result
+
+            # rows are flat dictionaries of the elements of every <l> row
+            for l in result.result:
                 try:
                     # host objects contain service objects
-                    if not self.new_hosts.has_key(str(l.hn.text)):
-                        self.new_hosts[str(l.hn.text)] = GenericHost()
-                        self.new_hosts[str(l.hn.text)].name =  str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].server = self.name
-                        self.new_hosts[str(l.hn.text)].status = str(l.cs.text)
-                        self.new_hosts[str(l.hn.text)].attempt, self.new_hosts[str(l.hn.text)].status_type  = str(l.tr.text).split(" ")
-                        self.new_hosts[str(l.hn.text)].status_type = self.HARD_SOFT[self.new_hosts[str(l.hn.text)].status_type]
-                        self.new_hosts[str(l.hn.text)].last_check = str(l.lc.text)
-                        self.new_hosts[str(l.hn.text)].duration = str(l.lsc.text)
-                        self.new_hosts[str(l.hn.text)].status_information= str(l.ou.text)
-                        if l.find("cih") != None:
-                            self.new_hosts[str(l.hn.text)].criticality = str(l.cih.text)
-                        else:
-                            self.new_hosts[str(l.hn.text)].criticality = ""
-                        self.new_hosts[str(l.hn.text)].acknowledged = bool(int(str(l.ha.text)))
-                        self.new_hosts[str(l.hn.text)].scheduled_downtime = bool(int(str(l.hdtm.text)))
-                        if l.find("is") != None:
-                            self.new_hosts[str(l.hn.text)].flapping = bool(int(str(l.find("is").text)))
-                        else:
-                            self.new_hosts[str(l.hn.text)].flapping = False
-                        self.new_hosts[str(l.hn.text)].notifications_disabled = not bool(int(str(l.ne.text)))
-                        self.new_hosts[str(l.hn.text)].passiveonly = not bool(int(str(l.ace.text)))
+                    if not self.new_hosts.has_key(l["hn"]):
+                        host = GenericHost()
+                        host.name = l["hn"]
+                        host.server = self.name
+                        host.status = l["cs"]
+                        host.attempt, status_type = l["tr"].split(" ")
+                        host.status_type = self.HARD_SOFT[status_type]
+                        host.last_check = l["lc"]
+                        host.duration = l["lsc"]
+                        host.status_information = l["ou"]
+                        host.criticality = l.get("cih", "")
+                        host.acknowledged = bool(int(l["ha"]))
+                        host.scheduled_downtime = bool(int(l["hdtm"]))
+                        host.flapping = bool(int(l.get("is", 0)))
+                        host.notifications_disabled = not bool(int(l["ne"]))
+                        host.passiveonly = not bool(int(l["ace"]))
+                        if l.has_key("a"):
+                            host.address = l["a"]
+                        self.new_hosts[host.name] = host
+                    # remember id for actions
+                    if l.has_key("hid"):
+                        self.host_ids[l["hn"]] = l["hid"]
                 except:
                     # set checking flag back to False
                     self.isChecking = False
                     result, error = self.Error(sys.exc_info())
                     return Result(result=result, error=error)
 
-            del xmlobj
+            del result
 
         except:
             # set checking flag back to False
@@ -382,51 +648,40 @@ class CentreonServer(GenericServer):
 
         # services
         try:
-            result = self.FetchURL(nagcgiurl_services, giveback="xml")
-            xmlobj, error = result.result, result.error
-            if error != "": return Result(result=xmlobj, error=copy.deepcopy(error))
-
-            # in case there are no children session id is invalid
-            if xmlobj == "<response>bad session id</response>" or xmlobj == "Bad Session ID":
-                # debug
-                if str(self.conf.debug_mode) == "True":
-                    self.Debug(server=self.get_name(), debug="Bad session ID, retrieving new one...")
-                # try again...
-                self.SID = self._get_sid().result
-                result = self.FetchURL(nagcgiurl_services, giveback="xml")
-                xmlobj, error = result.result, result.error
-                if error != "": return Result(result="ERROR", error=copy.deepcopy(error))
+            result = self._fetch_status_pages("services")
+            if result.error != "": return result
 
-            for l in xmlobj.findAll("l"):
+            for l in result.result:
                 try:
                     # host objects contain service objects
-                    if not self.new_hosts.has_key(str(l.hn.text)):
-                        self.new_hosts[str(l.hn.text)] = GenericHost()
-                        self.new_hosts[str(l.hn.text)].name = str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].status = "UP"
+                    if not self.new_hosts.has_key(l["hn"]):
+                        self.new_hosts[l["hn"]] = GenericHost()
+                        self.new_hosts[l["hn"]].name = l["hn"]
+                        self.new_hosts[l["hn"]].status = "UP"
                     # if a service does not exist create its object
-                    if not self.new_hosts[str(l.hn.text)].services.has_key(str(l.sd.text)):
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)] = GenericService()
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].host = str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].name = str(l.sd.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].server = self.name
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status = str(l.cs.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].attempt, \
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type = str(l.ca.text).split(" ")
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type =\
-                            self.HARD_SOFT[self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type]
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].last_check = str(l.lc.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].duration = str(l.d.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_information = str(l.po.text).replace("\n", " ").strip()
-                        if l.find("cih") != None:
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = str(l.cih.text)
-                        else:
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = ""
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].acknowledged = bool(int(str(l.pa.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].scheduled_downtime = bool(int(str(l.dtm.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].flapping = bool(int(str(l.find("is").text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].notifications_disabled = not bool(int(str(l.ne.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].passiveonly = not bool(int(str(l.ac.text)))
+                    services = self.new_hosts[l["hn"]].services
+                    if not services.has_key(l["sd"]):
+                        service = GenericService()
+                        service.host = l["hn"]
+                        service.name = l["sd"]
+                        service.server = self.name
+                        service.status = l["cs"]
+                        service.attempt, status_type = l["ca"].split(" ")
+                        service.status_type = self.HARD_SOFT[status_type]
+                        service.last_check = l["lc"]
+                        service.duration = l["d"]
+                        service.status_information = l["po"].replace("\n", " ").strip()
+                        service.criticality = l.get("cih", "")
+                        service.acknowledged = bool(int(l["pa"]))
+                        service.scheduled_downtime = bool(int(l["dtm"]))
+                        service.flapping = bool(int(l["is"]))
+                        service.notifications_disabled = not bool(int(l["ne"]))
+                        service.passiveonly = not bool(int(l["ac"]))
+                        services[service.name] = service
+                    # remember ids for actions
+                    if l.has_key("hid") and l.has_key("svc_id"):
+                        self.host_ids[l["hn"]] = l["hid"]
+                        self.service_ids[(l["hn"], l["sd"])] = (l["hid"], l["svc_id"])
                 except:
                     # set checking flag back to False
                     self.isChecking = False
@@ -434,7 +689,7 @@ class CentreonServer(GenericServer):
                     return Result(result=result, error=error)
 
             # do some cleanup
-            del xmlobj
+            del result
 
         except:
             # set checking flag back to False
@@ -442,6 +697,10 @@ class CentreonServer(GenericServer):
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
+        # keep session for next start if it is a new one
+        if self.SID != self.saved_SID:
+            self._save_session()
+
         # return True if all worked well
         return Result()
 
@@ -569,18 +828,18 @@ class CentreonServer(GenericServer):
 
     def Hook(self):
         """
-        in case count is down get a new SID, just in case
+        in case SID is older than an hour get a new one, just in case
         was kicked out but as to be seen in https://sourceforge.net/p/nagstamon/bugs/86/ there are problems with older
         Centreon installations so this should come back
         """
         # renewing the SID once an hour might be enough
         # maybe this is unnecessary now that we authenticate via login/password, no md5
-        if self.SIDcount >= 3600:
+        if self.SIDtime == 0:
+            self.SIDtime = time.time()
+        elif time.time() - self.SIDtime >= 3600:
             if str(self.conf.debug_mode) == "True":
                 self.Debug(server=self.get_name(), debug="Old SID: " + self.SID + " " + str(self.Cookie))
             self.SID = self._get_sid().result
             if str(self.conf.debug_mode) == "True":
                 self.Debug(server=self.get_name(), debug="New SID: " + self.SID + " " + str(self.Cookie))
-            self.SIDcount = 0
-        else:
-            self.SIDcount += 1
+            self.SIDtime = time.time()
@@ -30,6 +30,10 @@ import traceback
 import base64
 import re
 import gobject
+import hashlib
+import threading
+import HTMLParser
+import htmlentitydefs
 
 # to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
 # see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
@@ -44,6 +48,160 @@ from Nagstamon.Actions import HostIsFilteredOutByRE,\
                               CriticalityIsFilteredOutByRE,\
                               not_empty
 from Nagstamon.Objects import *
+from Nagstamon.Connection import ConnectionPool, TransferStats, PhaseTimings, CircuitBreaker, JSONArrayDecoder,\
+                                 is_connection_error
+
+
+class StatusTableParser(HTMLParser.HTMLParser):
+    """
+        streaming parser for the <table class="status"> of status.cgi pages - every row of this table
+        becomes a list of its cells, every cell a tuple of its non-empty texts and the file names of its
+        icons, all the rest of the page is skipped
+        texts are UTF-8 encoded strings, broken is set if the page had to be parsed by BeautifulSoup
+    """
+
+    # where the status table starts - everything before is not worth parsing
+    STATUS_TABLE = re.compile("<table[^>]*class=[\"']?status[\"' >]", re.IGNORECASE)
+
+    # feeding the page in chunks allows to stop right after the status table
+    CHUNK_SIZE = 65536
+
+    # UTF-8 &nbsp; is whitespace for BeautifulSoup but not for str.strip()
+    NBSP_EDGES = re.compile("^(?:\s|\xc2\xa0)+|(?:\s|\xc2\xa0)+$")
+
+    def __init__(self):
+        HTMLParser.HTMLParser.__init__(self)
+        self.rows = list()
+        # nesting depth of tables and depth of the status table once found
+        self.depth = 0
+        self.status_depth = None
+        self.done = False
+        self.broken = False
+        self.row = None
+        self.cell = None
+        self.text = list()
+
+
+    def parse(self, data):
+        """
+        parse status.cgi HTML and give back the rows of its status table
+        """
+        # FetchURL gives back unicode but texts and entities are handled as UTF-8 bytes
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        table = self.STATUS_TABLE.search(data)
+        if table == None:
+            raise IndexError("no status table found")
+        try:
+            for start in range(table.start(), len(data), self.CHUNK_SIZE):
+                self.feed(data[start:start + self.CHUNK_SIZE])
+                if self.done:
+                    break
+            else:
+                self.close()
+        except (HTMLParser.HTMLParseError, UnicodeError):
+            # broken HTML - the old slow way
+            self.broken = True
+            self.rows = self._parse_soup(data)
+        return self.rows
+
+
+    def _parse_soup(self, data):
+        """
+        same rows as parse() but with BeautifulSoup
+        """
+        rows = list()
+        soup = BeautifulSoup(data, convertEntities=BeautifulSoup.ALL_ENTITIES)
+        table = soup('table', {'class': 'status'})[0]
+        # some Icinga versions have a <tbody> tag in cgi output HTML
+        if len(table('tbody')) > 0:
+            table = table('tbody')[0]
+        for tr in table('tr', recursive=False):
+            row = list()
+            for td in tr('td', recursive=False):
+                texts = [text.strip().encode("utf-8") for text in td(text=not_empty) if text.strip() != ""]
+                icons = [img["src"].split("/")[-1] for img in td.findAll("img", src=True)]
+                row.append((texts, icons))
+            rows.append(row)
+        soup.decompose()
+        return rows
+
+
+    def _flush(self):
+        """
+        tags separate texts like the text nodes of BeautifulSoup
+        """
+        if len(self.text) > 0:
+            text = "".join(self.text).strip()
+            if "\xc2\xa0" in text:
+                text = self.NBSP_EDGES.sub("", text)
+            if text != "" and self.cell != None:
+                self.cell[0].append(text)
+            self.text = list()
+
+
+    def handle_starttag(self, tag, attributes):
+        if self.done:
+            return
+        self._flush()
+        if tag == "table":
+            self.depth += 1
+            if self.status_depth == None and ("class", "status") in attributes:
+                self.status_depth = self.depth
+        elif self.status_depth == None:
+            return
+        elif tag == "tr" and self.depth == self.status_depth:
+            self.cell = None
+            self.row = list()
+            self.rows.append(self.row)
+        elif tag == "td" and self.depth == self.status_depth and self.row != None:
+            self.cell = (list(), list())
+            self.row.append(self.cell)
+        elif tag == "img" and self.cell != None:
+            for name, value in attributes:
+                if name == "src" and value:
+                    self.cell[1].append(value.split("/")[-1])
+
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        self._flush()
+        if tag == "table":
+            if self.depth == self.status_depth:
+                self.done = True
+                self.row = self.cell = None
+            self.depth -= 1
+        elif self.depth != self.status_depth:
+            return
+        elif tag == "td":
+            self.cell = None
+        elif tag == "tr":
+            self.row = self.cell = None
+
+
+    def handle_data(self, data):
+        if self.cell != None:
+            self.text.append(data)
+
+
+    def handle_entityref(self, name):
+        if self.cell != None:
+            if htmlentitydefs.name2codepoint.has_key(name):
+                self.text.append(unichr(htmlentitydefs.name2codepoint[name]).encode("utf-8"))
+            else:
+                self.text.append("&%s" % name)
+
+
+    def handle_charref(self, name):
+        if self.cell != None:
+            try:
+                if name[0] in "xX":
+                    self.text.append(unichr(int(name[1:], 16)).encode("utf-8"))
+                else:
+                    self.text.append(unichr(int(name)).encode("utf-8"))
+            except ValueError:
+                self.text.append("&#%s;" % name)
 
 
 class GenericServer(object):
@@ -86,6 +244,11 @@ class GenericServer(object):
                        "downtime.gif" : "scheduled_downtime",\
                        "flapping.gif" : "flapping"}
 
+    # parts of status pages which change with every request even if no status changed,
+    # like the "Last Updated:" header - they are ignored when comparing the content hash of responses
+    # durations calculated by the CGIs change too but are displayed, so they have to count
+    VOLATILE_CONTENT = re.compile("Last Updated: [^<]*")
+
     # Entries for monitor default actions in context menu
     MENU_ACTIONS = ["Monitor", "Recheck", "Acknowledge", "Submit check result", "Downtime"]
 
@@ -141,6 +304,17 @@ class GenericServer(object):
         self.proxy_handler = None
         self.proxy_auth_handler = None
         self.urlopener = None
+        # kept-alive HTTP connections used by urlopener
+        self.connection_pool = ConnectionPool()
+        # bytes on the wire and decompressed
+        self.transfer_stats = TransferStats()
+        # backoff for failing refresh cycles
+        self.breaker = CircuitBreaker()
+        # durations of refresh cycle phases
+        self.timings = PhaseTimings()
+        # addresses of hosts for actions and DNS names of addresses, both saving requests
+        self.address_cache = AddressCache()
+        self.dns_cache = AddressCache()
         # headers for HTTP requests, might be needed for authorization on Nagios/Icinga Hosts
         self.HTTPheaders = dict()
         # attempt to use only one bound list of TreeViewColumns instead of ever increasing one
@@ -152,6 +326,10 @@ class GenericServer(object):
         self.refresh_authentication = False
         # to handle Icinga versions this information is necessary, might be of future use for others too
         self.version = ""
+        # ETag, Last-Modified and content hash of status URLs to find out if anything changed since last cycle
+        self.FetchURL_cache = dict()
+        # filter settings used for last filtered snapshot
+        self.filters_fingerprint = None
 
         # Special FX
         # Centreon
@@ -161,6 +339,14 @@ class GenericServer(object):
         self.use_display_name_host = False
         self.use_display_name_service = False
 
+        # maximum of parallel requests to monitor in one refresh cycle
+        self.max_concurrent_requests = 4
+
+        # own refresh interval of this server, 0 means global update_interval_seconds
+        self.update_interval_seconds = 0
+        # rows per request for monitors which page their status
+        self.page_size = 1000
+
 
     def init_HTTP(self):
         """
@@ -197,6 +383,76 @@ class GenericServer(object):
                               "soft": self.monitor_cgi_url + "/status.cgi?hostgroup=all&style=hostdetail&hoststatustypes=12&hostprops=524288&limit=0"}
 
 
+    def get_cgi_filters(self):
+        """
+        translate active filters into status.cgi hoststatustypes/hostprops/servicestatustypes/serviceprops
+        so objects which would be filtered out anyway are not transferred at all
+        gives back parameters for hosts and services as dictionary
+        the service parameters contain host properties too for filters of services on certain hosts
+        """
+        # bits of status types and properties as used by status.cgi
+        hoststatustypes, servicestatustypes = 12, 28
+        hostprops, serviceprops = 0, 0
+        # host states of services - pending, up, down, unreachable
+        svc_hoststatustypes, svc_hostprops = 15, 0
+
+        if str(self.conf.filter_all_down_hosts) == "True":
+            hoststatustypes &= ~4
+        if str(self.conf.filter_all_unreachable_hosts) == "True":
+            hoststatustypes &= ~8
+        if str(self.conf.filter_all_warning_services) == "True":
+            servicestatustypes &= ~4
+        if str(self.conf.filter_all_unknown_services) == "True":
+            servicestatustypes &= ~8
+        if str(self.conf.filter_all_critical_services) == "True":
+            servicestatustypes &= ~16
+        # 0 would mean no filter at all for status.cgi so better get everything than nothing
+        if hoststatustypes == 0:
+            hoststatustypes = 12
+        if servicestatustypes == 0:
+            servicestatustypes = 28
+
+        # not in scheduled downtime
+        if str(self.conf.filter_hosts_services_maintenance) == "True":
+            hostprops |= 2
+            serviceprops |= 2
+        # not acknowledged
+        if str(self.conf.filter_acknowledged_hosts_services) == "True":
+            hostprops |= 8
+            serviceprops |= 8
+        # active checks enabled
+        if str(self.conf.filter_hosts_services_disabled_checks) == "True":
+            hostprops |= 32
+            serviceprops |= 32
+        # not flapping
+        if str(self.conf.filter_all_flapping_hosts) == "True":
+            hostprops |= 2048
+        if str(self.conf.filter_all_flapping_services) == "True":
+            serviceprops |= 2048
+        # notifications enabled
+        if str(self.conf.filter_hosts_services_disabled_notifications) == "True":
+            hostprops |= 8192
+            serviceprops |= 8192
+        # hard state
+        if str(self.conf.filter_hosts_in_soft_state) == "True":
+            hostprops |= 262144
+        if str(self.conf.filter_services_in_soft_state) == "True":
+            serviceprops |= 262144
+
+        if str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
+            svc_hostprops |= 2
+        if str(self.conf.filter_services_on_acknowledged_hosts) == "True":
+            svc_hostprops |= 8
+        if str(self.conf.filter_services_on_down_hosts) == "True":
+            svc_hoststatustypes &= ~4
+        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
+            svc_hoststatustypes &= ~8
+
+        return {"hosts": "&hoststatustypes=%s&hostprops=%s" % (hoststatustypes, hostprops),\
+                "services": "&hoststatustypes=%s&hostprops=%s&servicestatustypes=%s&serviceprops=%s" %\
+                            (svc_hoststatustypes, svc_hostprops, servicestatustypes, serviceprops)}
+
+
     def reset_HTTP(self):
         """
         if authentication fails try to reset any HTTP session stuff - might be different for different monitors
@@ -211,6 +467,55 @@ class GenericServer(object):
         return str(self.name)
 
 
+    def Probe(self):
+        """
+        cheap check if a monitor which could not be reached is back again - HEAD request of
+        monitor URL, every HTTP answer counts as success
+        """
+        request = urllib2.Request(self.monitor_url, headers=self.HTTPheaders.get("raw", {}))
+        request.get_method = lambda: "HEAD"
+        try:
+            self.urlopener.open(request, timeout=self.breaker.PROBE_TIMEOUT).close()
+        except urllib2.HTTPError, err:
+            err.close()
+        except:
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Probe failed: " + traceback.format_exception_only(*sys.exc_info()[:2])[0])
+            return False
+        return True
+
+
+    def get_timings(self):
+        """
+        return p50, p95, max and number of samples in seconds of refresh cycle phases over the
+        last cycles as dictionary keyed by phase - dns, connect, tls, ttfb, download, parse,
+        filter, gui and total
+        """
+        return self.timings.get_stats()
+
+
+    def get_update_interval(self):
+        """
+        return refresh interval of server in seconds - its own one if set, otherwise the global one
+        """
+        try:
+            if int(self.update_interval_seconds) > 0:
+                return int(self.update_interval_seconds)
+        except ValueError:
+            pass
+        return int(self.conf.update_interval_seconds)
+
+
+    def get_page_size(self):
+        """
+        return number of rows per request for monitors which page their status
+        """
+        try:
+            return max(1, int(self.page_size))
+        except ValueError:
+            return 1000
+
+
     def get_username(self):
         """
         return stringified username
@@ -477,130 +782,71 @@ class GenericServer(object):
         """
         Get status from Nagios Server
         """
-        # create Nagios items dictionary with to lists for services and hosts
-        # every list will contain a dictionary for every failed service/host
-        # this dictionary is only temporarily
-        nagitems = {"services":[], "hosts":[]}
-
         # new_hosts dictionary
         self.new_hosts = dict()
 
+        # get all 4 status pages first to know if anything changed at all
+        urls = [self.cgiurl_hosts["hard"], self.cgiurl_hosts["soft"], self.cgiurl_services["hard"], self.cgiurl_services["soft"]]
+        results = dict(zip(urls, self.FetchStatusURLs(urls)))
+        for result in results.values():
+            if result.error != "": return Result(result=result.result, error=result.error)
+        if self.StatusURLsUnchanged(results.values()):
+            return Result(unchanged=True)
+
+        parse_start = time.time()
+
         # hosts - mostly the down ones
         # unfortunately the hosts status page has a different structure so
         # hosts must be analyzed separately
         try:
             for status_type in "hard", "soft":
-                result = self.FetchURL(self.cgiurl_hosts[status_type])
-                htobj, error = result.result, result.error
-
-                if error != "": return Result(result=copy.deepcopy(htobj), error=copy.deepcopy(error))
-
-                # put a copy of a part of htobj into table to be able to delete htobj
-                # too mnuch copy.deepcopy()s here give recursion crashs
-                table = htobj('table', {'class': 'status'})[0]
-
-                # access table rows
-                # some Icinga versions have a <tbody> tag in cgi output HTML which
-                # omits the <tr> tags being found
-                if len(table('tbody')) == 0:
-                    trs = table('tr', recursive=False)
-                else:
-                    tbody = table('tbody')[0]
-                    trs = tbody('tr', recursive=False)
-
-                # do some cleanup
-                del result, error
+                # only rows, texts and icons of the status table are extracted from the page
+                parser = StatusTableParser()
+                rows = parser.parse(results[self.cgiurl_hosts[status_type]].result)
+                if parser.broken and str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="Status HTML broken, parsed it the slow way: " + self.cgiurl_hosts[status_type])
+                host = ""
 
                 # kick out table heads
-                trs.pop(0)
-
-                # dummy tds to be deleteable
-                tds = []
-
-                for tr in trs:
+                for tds in rows[1:]:
                     try:
                         # ignore empty <tr> rows
-                        if len(tr('td', recursive=False)) > 1:
-                            n = dict()
-                            # get tds in one tr
-                            tds = tr('td', recursive=False)
-                            # host
-                            try:
-                                n["host"] = str(tds[0].table.tr.td.table.tr.td.a.string)
-                            except:
-                                n["host"] = str(nagitems[len(nagitems)-1]["host"])
-                            # status
-                            n["status"] = str(tds[1].string)
-                            # last_check
-                            n["last_check"] = str(tds[2].string)
-                            # duration
-                            n["duration"] = str(tds[3].string)
+                        if len(tds) > 1:
+                            # every td is a tuple of its texts and icons
+                            texts = [td[0] + [""] for td in tds]
+                            # host - empty cell means same host as in row before
+                            if texts[0][0] != "":
+                                host = texts[0][0]
                             # division between Nagios and Icinga in real life... where
                             # Nagios has only 5 columns there are 7 in Icinga 1.3...
                             # ... and 6 in Icinga 1.2 :-)
                             if len(tds) < 7:
-                                # the old Nagios table
-                                # status_information
-                                if len(tds[4](text=not_empty)) == 0:
-                                    n["status_information"] = ""
-                                else:
-                                    n["status_information"] = str(tds[4].string).encode("utf-8").replace("\n", " ").strip()
                                 # attempts are not shown in case of hosts so it defaults to "N/A"
-                                n["attempt"] = "N/A"
+                                attempt = "N/A"
+                                status_information = " ".join(tds[4][0])
                             else:
-                                # attempts are shown for hosts
-                                # to fix http://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3280961&group_id=236865 .attempt needs
-                                # to be stripped
-                                n["attempt"] = str(tds[4].string).strip()
-                                # status_information
-                                if len(tds[5](text=not_empty)) == 0:
-                                    n["status_information"] = ""
-                                else:
-                                    n["status_information"] = str(tds[5].string).encode("utf-8").replace("\n", " ").strip()
-
-                            # status flags
-                            n["passiveonly"] = False
-                            n["notifications_disabled"] = False
-                            n["flapping"] = False
-                            n["acknowledged"] = False
-                            n["scheduled_downtime"] = False
-
-                            # map status icons to status flags
-                            icons = tds[0].findAll('img')
-                            for i in icons:
-                                icon = i["src"].split("/")[-1]
-                                if icon in self.STATUS_MAPPING:
-                                    n[self.STATUS_MAPPING[icon]] = True
-                            # cleaning
-                            del icons
-
-                            # add dictionary full of information about this host item to nagitems
-                            nagitems["hosts"].append(n)
-                            # after collection data in nagitems create objects from its informations
+                                attempt = texts[4][0]
+                                status_information = " ".join(tds[5][0])
+
                             # host objects contain service objects
-                            if not self.new_hosts.has_key(n["host"]):
-                                new_host = n["host"]
-                                self.new_hosts[new_host] = GenericHost()
-                                self.new_hosts[new_host].name = n["host"]
-                                self.new_hosts[new_host].server = self.name
-                                self.new_hosts[new_host].status = n["status"]
-                                self.new_hosts[new_host].last_check = n["last_check"]
-                                self.new_hosts[new_host].duration = n["duration"]
-                                self.new_hosts[new_host].attempt = n["attempt"]
-                                self.new_hosts[new_host].status_information= n["status_information"].encode("utf-8")
-                                self.new_hosts[new_host].passiveonly = n["passiveonly"]
-                                self.new_hosts[new_host].notifications_disabled = n["notifications_disabled"]
-                                self.new_hosts[new_host].flapping = n["flapping"]
-                                self.new_hosts[new_host].acknowledged = n["acknowledged"]
-                                self.new_hosts[new_host].scheduled_downtime = n["scheduled_downtime"]
-                                self.new_hosts[new_host].status_type = status_type
-                            del tds, n
+                            if not self.new_hosts.has_key(host):
+                                self.new_hosts[host] = GenericHost()
+                                self.new_hosts[host].name = host
+                                self.new_hosts[host].server = self.name
+                                self.new_hosts[host].status = texts[1][0]
+                                self.new_hosts[host].last_check = texts[2][0]
+                                self.new_hosts[host].duration = texts[3][0]
+                                self.new_hosts[host].attempt = attempt
+                                self.new_hosts[host].status_information = status_information.replace("\n", " ").strip()
+                                self.new_hosts[host].status_type = status_type
+                                # map status icons to status flags
+                                for icon in tds[0][1]:
+                                    if icon in self.STATUS_MAPPING:
+                                        self.new_hosts[host].__dict__[self.STATUS_MAPPING[icon]] = True
                     except:
                         self.Error(sys.exc_info())
 
-                # do some cleanup
-                htobj.decompose()
-                del htobj, trs, table
+                del rows, parser
 
         except:
             # set checking flag back to False
@@ -611,119 +857,59 @@ class GenericServer(object):
         # services
         try:
             for status_type in "hard", "soft":
-                result = self.FetchURL(self.cgiurl_services[status_type])
-                htobj, error = result.result, result.error
-                if error != "": return Result(result=copy.deepcopy(htobj), error=copy.deepcopy(error))
-
-                # too much copy.deepcopy()s here give recursion crashs
-                table = htobj('table', {'class': 'status'})[0]
-
-                # some Icinga versions have a <tbody> tag in cgi output HTML which
-                # omits the <tr> tags being found
-                if len(table('tbody')) == 0:
-                    trs = table('tr', recursive=False)
-                else:
-                    tbody = table('tbody')[0]
-                    trs = tbody('tr', recursive=False)
-
-                del result, error
+                parser = StatusTableParser()
+                rows = parser.parse(results[self.cgiurl_services[status_type]].result)
+                if parser.broken and str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="Status HTML broken, parsed it the slow way: " + self.cgiurl_services[status_type])
+                host = ""
 
                 # kick out table heads
-                trs.pop(0)
-
-                # dummy tds to be deleteable
-                tds = []
-
-                for tr in trs:
+                for tds in rows[1:]:
                     try:
                         # ignore empty <tr> rows - there are a lot of them - a Nagios bug?
-                        tds = tr('td', recursive=False)
                         if len(tds) > 1:
-                            n = dict()
-                            # host
+                            texts = [td[0] + [""] for td in tds]
                             # the resulting table of Nagios status.cgi table omits the
                             # hostname of a failing service if there are more than one
                             # so if the hostname is empty the nagios status item should get
-                            # its hostname from the previuos item - one reason to keep "nagitems"
-                            try:
-                                n["host"] = str(tds[0](text=not_empty)[0])
-                            except:
-                                n["host"] = str(nagitems["services"][len(nagitems["services"])-1]["host"])
-                            # service
-                            n["service"] = str(tds[1](text=not_empty)[0])
-                            # status
-                            n["status"] = str(tds[2](text=not_empty)[0])
-                            # last_check
-                            n["last_check"] = str(tds[3](text=not_empty)[0])
-                            # duration
-                            n["duration"] = str(tds[4](text=not_empty)[0])
-                            # attempt
-                            # to fix http://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3280961&group_id=236865 .attempt needs
-                            # to be stripped
-                            n["attempt"] = str(tds[5](text=not_empty)[0]).strip()
-                            # status_information
-                            if len(tds[6](text=not_empty)) == 0:
-                                n["status_information"] = ""
-                            else:
-                                n["status_information"] = str(tds[6](text=not_empty)[0]).encode("utf-8")
-                            # status flags
-                            n["passiveonly"] = False
-                            n["notifications_disabled"] = False
-                            n["flapping"] = False
-                            n["acknowledged"] = False
-                            n["scheduled_downtime"] = False
-
-                            # map status icons to status flags
-                            icons = tds[1].findAll('img')
-                            for i in icons:
-                                icon = i["src"].split("/")[-1]
-                                if icon in self.STATUS_MAPPING:
-                                    n[self.STATUS_MAPPING[icon]] = True
-                            # cleaning
-                            del icons
-
-                            # add dictionary full of information about this service item to nagitems - only if service
-                            nagitems["services"].append(n)
-                            # after collection data in nagitems create objects of its informations
+                            # its hostname from the previous row
+                            if texts[0][0] != "":
+                                host = texts[0][0]
+                            service = texts[1][0]
+
                             # host objects contain service objects
-                            if not self.new_hosts.has_key(n["host"]):
-                                self.new_hosts[n["host"]] = GenericHost()
-                                self.new_hosts[n["host"]].name = n["host"]
-                                self.new_hosts[n["host"]].status = "UP"
+                            if not self.new_hosts.has_key(host):
+                                self.new_hosts[host] = GenericHost()
+                                self.new_hosts[host].name = host
+                                self.new_hosts[host].server = self.name
+                                self.new_hosts[host].status = "UP"
                                 # trying to fix https://sourceforge.net/tracker/index.php?func=detail&aid=3299790&group_id=236865&atid=1101370
                                 # if host is not down but in downtime or any other flag this should be evaluated too
                                 # map status icons to status flags
-                                icons = tds[0].findAll('img')
-                                for i in icons:
-                                    icon = i["src"].split("/")[-1]
+                                for icon in tds[0][1]:
                                     if icon in self.STATUS_MAPPING:
-                                        self.new_hosts[n["host"]].__dict__[self.STATUS_MAPPING[icon]] = True
+                                        self.new_hosts[host].__dict__[self.STATUS_MAPPING[icon]] = True
 
                             # if a service does not exist create its object
-                            if not self.new_hosts[n["host"]].services.has_key(n["service"]):
-                                new_service = n["service"]
-                                self.new_hosts[n["host"]].services[new_service] = GenericService()
-                                self.new_hosts[n["host"]].services[new_service].host = n["host"]
-                                self.new_hosts[n["host"]].services[new_service].name = n["service"]
-                                self.new_hosts[n["host"]].services[new_service].server = self.name
-                                self.new_hosts[n["host"]].services[new_service].status = n["status"]
-                                self.new_hosts[n["host"]].services[new_service].last_check = n["last_check"]
-                                self.new_hosts[n["host"]].services[new_service].duration = n["duration"]
-                                self.new_hosts[n["host"]].services[new_service].attempt = n["attempt"]
-                                self.new_hosts[n["host"]].services[new_service].status_information = n["status_information"].encode("utf-8")
-                                self.new_hosts[n["host"]].services[new_service].passiveonly = n["passiveonly"]
-                                self.new_hosts[n["host"]].services[new_service].notifications_disabled = n["notifications_disabled"]
-                                self.new_hosts[n["host"]].services[new_service].flapping = n["flapping"]
-                                self.new_hosts[n["host"]].services[new_service].acknowledged = n["acknowledged"]
-                                self.new_hosts[n["host"]].services[new_service].scheduled_downtime = n["scheduled_downtime"]
-                                self.new_hosts[n["host"]].services[new_service].status_type = status_type
-                            del tds, n
+                            if not self.new_hosts[host].services.has_key(service):
+                                self.new_hosts[host].services[service] = GenericService()
+                                self.new_hosts[host].services[service].host = host
+                                self.new_hosts[host].services[service].name = service
+                                self.new_hosts[host].services[service].server = self.name
+                                self.new_hosts[host].services[service].status = texts[2][0]
+                                self.new_hosts[host].services[service].last_check = texts[3][0]
+                                self.new_hosts[host].services[service].duration = texts[4][0]
+                                self.new_hosts[host].services[service].attempt = texts[5][0]
+                                self.new_hosts[host].services[service].status_information = " ".join(tds[6][0]).replace("\n", " ").strip()
+                                self.new_hosts[host].services[service].status_type = status_type
+                                # map status icons to status flags
+                                for icon in tds[1][1]:
+                                    if icon in self.STATUS_MAPPING:
+                                        self.new_hosts[host].services[service].__dict__[self.STATUS_MAPPING[icon]] = True
                     except:
                         self.Error(sys.exc_info())
 
-                # do some cleanup
-                htobj.decompose()
-                del htobj, trs, table
+                del rows, parser
 
         except:
             # set checking flag back to False
@@ -732,12 +918,148 @@ class GenericServer(object):
             return Result(result=result, error=error)
 
         # some cleanup
-        del nagitems
+        del results
+
+        self.timings.add("parse", time.time() - parse_start)
 
         #dummy return in case all is OK
         return Result()
 
 
+    def RunConcurrently(self, calls):
+        """
+        run independent calls of one refresh cycle like (function, arg1, arg2...) in parallel,
+        at most max_concurrent_requests at once
+        results come back in the same order as calls, exceptions are raised again here
+        """
+        try:
+            limit = max(1, int(self.max_concurrent_requests))
+        except:
+            limit = 1
+
+        if limit == 1 or len(calls) < 2:
+            return [call[0](*call[1:]) for call in calls]
+
+        # authentication stuff like cookie logins should be done only once and not by every thread
+        self.init_HTTP()
+
+        results = [None] * len(calls)
+        errors = [None] * len(calls)
+        semaphore = threading.Semaphore(limit)
+
+        def run(index, call):
+            try:
+                try:
+                    results[index] = call[0](*call[1:])
+                except:
+                    errors[index] = sys.exc_info()
+            finally:
+                semaphore.release()
+
+        threads = list()
+        for index, call in enumerate(calls):
+            semaphore.acquire()
+            thread = threading.Thread(target=run, args=(index, call), name="%s-%s" % (self.get_name(), index))
+            thread.setDaemon(1)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        for error in errors:
+            if error != None:
+                raise error[0], error[1], error[2]
+
+        return results
+
+
+    def FetchStatusURLs(self, urls, giveback="raw"):
+        """
+        fetch all status URLs of one refresh cycle conditionally and in parallel
+        results come back in the same order as urls
+        """
+        return self.RunConcurrently([(self._fetch_status_url, url, giveback) for url in urls])
+
+
+    def _fetch_status_url(self, url, giveback):
+        return self.FetchURL(url, giveback=giveback, conditional=True)
+
+
+    def StatusURLsUnchanged(self, results):
+        """
+        True if all status URLs of a cycle delivered the same content as in the last cycle
+        """
+        for result in results:
+            if result.unchanged == False:
+                return False
+        return True
+
+
+    def FetchURLChunks(self, url, callback):
+        """
+        hand the answer of url undecoded chunk by chunk into callback while it is downloaded,
+        so the whole answer is never held in memory - time spent in callback counts as parsing
+        result is the MD5 digest of the answer
+        """
+        self.init_HTTP()
+        try:
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="FetchURLChunks: " + url +\
+                           " Connection pool: " + str(self.connection_pool.get_stats()))
+            urlcontent = self.urlopener.open(urllib2.Request(url, None, self.HTTPheaders["raw"]))
+            try:
+                digest = hashlib.md5()
+                parse_time = 0
+                while True:
+                    data = urlcontent.read(65536)
+                    digest.update(data)
+                    parse_start = time.time()
+                    # empty data tells callback that the answer is complete
+                    callback(data)
+                    parse_time += time.time() - parse_start
+                    if data == "":
+                        break
+            finally:
+                urlcontent.close()
+            self.timings.add("parse", parse_time)
+        except:
+            # monitor not reachable at all - refresh loop may probe it cheaply instead of full cycles
+            if is_connection_error(sys.exc_info()[1]):
+                self.breaker.connection_failed = True
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        return Result(result=digest.hexdigest())
+
+
+    def FetchJSONRows(self, url, callback):
+        """
+        stream the elements of the JSON array at url one by one into callback while it is
+        downloaded, so neither the whole answer nor the whole decoded list is held in memory
+        result is the number of elements, unchanged tells if the answer is the same as the last time
+        """
+        decoder = JSONArrayDecoder()
+        count = [0]
+
+        def feed(data):
+            if data == "":
+                rows = decoder.close()
+            else:
+                rows = decoder.feed(data)
+            for row in rows:
+                callback(row)
+            count[0] += len(rows)
+
+        result = self.FetchURLChunks(url, feed)
+        if result.error != "":
+            return result
+
+        digest = result.result
+        unchanged = self.FetchURL_cache.has_key(url) and self.FetchURL_cache[url]["digest"] == digest
+        self.FetchURL_cache[url] = {"digest": digest, "etag": None, "last_modified": None, "content": None}
+        return Result(result=count[0], unchanged=unchanged)
+
+
     def GetStatus(self, output=None):
         """
         get nagios status information from cgiurl and give it back
@@ -759,6 +1081,8 @@ class GenericServer(object):
         self.status, self.status_description = status.result, status.error
 
         if status.error != "":
+            # last snapshot might not fit to the cached content anymore
+            self.FetchURL_cache.clear()
             # ask for password if authorization failed
             if "HTTP Error 401" in status.error or \
                "HTTP Error 403" in status.error or \
@@ -768,24 +1092,45 @@ class GenericServer(object):
                 if str(self.conf.servers[self.name].enabled) == "True":
                     # needed to get valid credentials
                     self.refresh_authentication = True
-                    while status.error != "":
-                        gobject.idle_add(output.RefreshDisplayStatus)
+                    gobject.idle_add(output.RefreshDisplayStatus)
 
-                        # clean existent authentication
-                        self.reset_HTTP()
-                        self.init_HTTP()
+                    # clean existent authentication and try once again - if it still fails
+                    # the circuit breaker of the refresh loop decides when to try next
+                    self.reset_HTTP()
+                    self.init_HTTP()
 
-                        status = self._get_status()
-                        self.status, self.status_description = status.result, status.error
-                        # take a break not to DOS the monitor...
-                        time.sleep(10)
+                    status = self._get_status()
+                    self.status, self.status_description = status.result, status.error
+            if status.error != "":
+                self.isChecking = False
+                return Result(result=self.status, error=self.status_description)
 
-                        # if monitor has been disabled do not try to connect to it
-                        if str(self.conf.servers[self.name].enabled) == "False":
-                            break
-            else:
+        # nothing changed on monitor and filters are the same - last snapshot is still valid
+        filters_fingerprint = self._get_filters_fingerprint()
+        if status.unchanged == True:
+            if filters_fingerprint == self.filters_fingerprint:
+                if str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="Status unchanged since last cycle, keeping last snapshot")
+                self.WorstStatus = "UP"
+                self.isChecking = False
+                return Result(unchanged=True)
+            # filters changed but unchanged content has not been parsed - get it all again to filter it anew
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Status unchanged but filters changed, getting status again")
+            self.FetchURL_cache.clear()
+            status = self._get_status()
+            self.status, self.status_description = status.result, status.error
+            if status.error != "":
                 self.isChecking = False
                 return Result(result=self.status, error=self.status_description)
+        self.filters_fingerprint = filters_fingerprint
+
+        # remember addresses given away by monitor so actions using $ADDRESS$ need no extra request
+        for host in self.new_hosts.values():
+            if host.address != "":
+                self.address_cache.put(host.name, host.address)
+
+        filter_start = time.time()
 
         # this part has been before in GUI.RefreshDisplay() - wrong place, here it needs to be reset
         self.nagitems_filtered = {"services":{"CRITICAL":[], "WARNING":[], "UNKNOWN":[]}, "hosts":{"DOWN":[], "UNREACHABLE":[]}}
@@ -1035,6 +1380,8 @@ class GenericServer(object):
         self.hosts = copy.deepcopy(self.new_hosts)
         self.new_hosts.clear()
 
+        self.timings.add("filter", time.time() - filter_start)
+
         # after all checks are done unset checking flag
         self.isChecking = False
 
@@ -1042,7 +1389,15 @@ class GenericServer(object):
         return Result()
 
 
-    def FetchURL(self, url, giveback="obj", cgi_data=None, no_auth=False):
+    def _get_filters_fingerprint(self):
+        """
+        all filter settings which influence the filtered snapshot
+        """
+        return [(key, str(value)) for key, value in sorted(self.conf.__dict__.items())\
+                if key.startswith("filter_") or key.startswith("re_")]
+
+
+    def FetchURL(self, url, giveback="obj", cgi_data=None, no_auth=False, conditional=False):
         """
         get content of given url, cgi_data only used if present
         "obj" FetchURL gives back a dict full of miserable hosts/services,
@@ -1050,6 +1405,8 @@ class GenericServer(object):
         "raw" it gives back pure HTML - useful for finding out IP or new version
         existence of cgi_data forces urllib to use POST instead of GET requests
         NEW: gives back a list containing result and, if necessary, a more clear error description
+        if conditional is True the request is sent with If-None-Match/If-Modified-Since and
+        result.unchanged tells if the content is the same as the last time
         """
 
         # run this method which checks itself if there is some action to take for initializing connection
@@ -1066,38 +1423,64 @@ class GenericServer(object):
             try:
                 # debug
                 if str(self.conf.debug_mode) == "True":
-                    self.Debug(server=self.get_name(), debug="FetchURL: " + url + " CGI Data: " + str(cgi_data))
-                request = urllib2.Request(url, cgi_data, HTTPheaders[giveback])
+                    self.Debug(server=self.get_name(), debug="FetchURL: " + url + " CGI Data: " + str(cgi_data) +\
+                               " Connection pool: " + str(self.connection_pool.get_stats()) +\
+                               " Transferred bytes: " + str(self.transfer_stats.get_stats()))
+                # only GET requests might be answered with "304 Not Modified"
+                conditional = conditional and cgi_data == None
+                if conditional:
+                    headers = self._get_conditional_headers(url, HTTPheaders[giveback])
+                else:
+                    headers = HTTPheaders[giveback]
+                request = urllib2.Request(url, cgi_data, headers)
                 # use opener - if cgi_data is not empty urllib uses a POST request
-                urlcontent = self.urlopener.open(request)
-                del url, cgi_data, request
+                try:
+                    urlcontent = self.urlopener.open(request)
+                    content = urlcontent.read()
+                    etag, last_modified = urlcontent.info().getheader("ETag"), urlcontent.info().getheader("Last-Modified")
+                    urlcontent.close()
+                    del urlcontent
+                except urllib2.HTTPError, err:
+                    # monitor says content did not change so reuse the last one
+                    if conditional and err.code == 304 and self.FetchURL_cache.has_key(url):
+                        err.close()
+                        content = etag = last_modified = None
+                    else:
+                        raise
+                if conditional:
+                    content, unchanged = self._check_conditional_content(url, content, etag, last_modified)
+                else:
+                    unchanged = False
+                del cgi_data, request
             except:
-                del url, cgi_data, request
+                del cgi_data, request
+                # monitor not reachable at all - refresh loop may probe it cheaply instead of full cycles
+                if is_connection_error(sys.exc_info()[1]):
+                    self.breaker.connection_failed = True
                 result, error = self.Error(sys.exc_info())
                 return Result(result=result, error=error)
 
             # give back pure HTML or XML in case giveback is "raw"
             if giveback == "raw":
-                result = Result(result=urlcontent.read().decode("utf8"))
-                urlcontent.close()
-                del urlcontent
-                return result
+                return Result(result=content.decode("utf8"), unchanged=unchanged)
 
             # objectified HTML
             if giveback == "obj":
-                yummysoup = BeautifulSoup(urlcontent.read().decode("utf8"), convertEntities=BeautifulSoup.ALL_ENTITIES)
-                urlcontent.close()
-                del urlcontent
+                parse_start = time.time()
+                yummysoup = BeautifulSoup(content.decode("utf8"), convertEntities=BeautifulSoup.ALL_ENTITIES)
+                self.timings.add("parse", time.time() - parse_start)
+                del content
                 #return Result(result=copy.deepcopy(yummysoup))
-                return Result(result=yummysoup)
+                return Result(result=yummysoup, unchanged=unchanged)
 
             # objectified generic XML, valid at least for Opsview and Centreon
             elif giveback == "xml":
-                xmlobj = BeautifulStoneSoup(urlcontent.read().decode("utf8"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
-                urlcontent.close()
-                del urlcontent
+                parse_start = time.time()
+                xmlobj = BeautifulStoneSoup(content.decode("utf8"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
+                self.timings.add("parse", time.time() - parse_start)
+                del content
                 #return Result(result=copy.deepcopy(xmlobj))
-                return Result(result=xmlobj)
+                return Result(result=xmlobj, unchanged=unchanged)
 
         except:
             # do some cleanup
@@ -1108,6 +1491,43 @@ class GenericServer(object):
         return Result(result=result, error=error)
 
 
+    def _get_conditional_headers(self, url, headers):
+        """
+        add validators of last response of url to a copy of headers
+        """
+        headers = dict(headers)
+        if self.FetchURL_cache.has_key(url):
+            if self.FetchURL_cache[url]["etag"] != None:
+                headers["If-None-Match"] = self.FetchURL_cache[url]["etag"]
+            if self.FetchURL_cache[url]["last_modified"] != None:
+                headers["If-Modified-Since"] = self.FetchURL_cache[url]["last_modified"]
+        return headers
+
+
+    def _check_conditional_content(self, url, content, etag=None, last_modified=None):
+        """
+        compare content with the last one of url and remember it for next time
+        content None means "304 Not Modified" - then the last content is given back
+        the content itself is only kept if there are validators for a later 304
+        """
+        if content == None:
+            return self.FetchURL_cache[url]["content"], True
+
+        if self.VOLATILE_CONTENT != None:
+            digest = hashlib.md5(self.VOLATILE_CONTENT.sub("", content)).hexdigest()
+        else:
+            digest = hashlib.md5(content).hexdigest()
+
+        unchanged = self.FetchURL_cache.has_key(url) and self.FetchURL_cache[url]["digest"] == digest
+
+        cache = {"digest": digest, "etag": etag, "last_modified": last_modified, "content": None}
+        if etag != None or last_modified != None:
+            cache["content"] = content
+        self.FetchURL_cache[url] = cache
+
+        return content, unchanged
+
+
     def GetHost(self, host):
         """
         find out ip or hostname of given host to access hosts/devices which do not appear in DNS but
@@ -1118,46 +1538,58 @@ class GenericServer(object):
         if str(self.conf.connect_by_host) == "True" or host == "":
             return Result(result=host)
 
-        # initialize ip string
-        ip = ""
+        # address might be known from status information or an earlier request
+        ip = self.address_cache.get(host)
 
-        # glue nagios cgi url and hostinfo
-        cgiurl_host  = self.monitor_cgi_url + "/extinfo.cgi?type=1&host=" + host
+        if ip == None:
+            # glue nagios cgi url and hostinfo
+            cgiurl_host  = self.monitor_cgi_url + "/extinfo.cgi?type=1&host=" + host
 
-        # get host info
-        result = self.FetchURL(cgiurl_host, giveback="obj")
-        htobj = result.result
+            # get host info
+            result = self.FetchURL(cgiurl_host, giveback="obj")
+            htobj = result.result
 
-        try:
-            # take ip from html soup
-            ip = htobj.findAll(name="div", attrs={"class":"data"})[-1].text
+            try:
+                # take ip from html soup
+                ip = htobj.findAll(name="div", attrs={"class":"data"})[-1].text
 
-            # workaround for URL-ified IP as described in SF bug 2967416
-            # https://sourceforge.net/tracker/?func=detail&aid=2967416&group_id=236865&atid=1101370
-            if not ip.find("://") == -1:
-                ip = ip.split("://")[1]
+                # workaround for URL-ified IP as described in SF bug 2967416
+                # https://sourceforge.net/tracker/?func=detail&aid=2967416&group_id=236865&atid=1101370
+                if not ip.find("://") == -1:
+                    ip = ip.split("://")[1]
+            except:
+                result, error = self.Error(sys.exc_info())
+                return Result(result=result, error=error)
 
-            # print IP in debug mode
-            if str(self.conf.debug_mode) == "True":
-                self.Debug(server=self.get_name(), host=host, debug ="IP of %s:" % (host) + " " + ip)
-            # when connection by DNS is not configured do it by IP
-            if str(self.conf.connect_by_dns) == "True":
+            # do some cleanup
+            del htobj
+
+            self.address_cache.put(host, ip)
+
+        # print IP in debug mode
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug ="IP of %s:" % (host) + " " + ip)
+
+        # give back host or ip
+        return Result(result=self._resolve_address(ip))
+
+
+    def _resolve_address(self, ip):
+        """
+        give back DNS name of ip if connection by DNS is configured, otherwise ip itself
+        reverse lookups block so their results get cached, failed ones too
+        """
+        if str(self.conf.connect_by_dns) == "True" and ip != "":
+            address = self.dns_cache.get(ip)
+            if address == None:
                 # try to get DNS name for ip, if not available use ip
                 try:
                     address = socket.gethostbyaddr(ip)[0]
                 except:
                     address = ip
-            else:
-                address = ip
-        except:
-            result, error = self.Error(sys.exc_info())
-            return Result(result=result, error=error)
-
-        # do some cleanup
-        del htobj
-
-        # give back host or ip
-        return Result(result=address)
+                self.dns_cache.put(ip, address)
+            return address
+        return ip
 
 
     def Hook(self):
@@ -0,0 +1,364 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    Icinga 2 backend - asks the REST API of Icinga 2 for hosts and services in trouble, only for the
+    attributes shown here and already filtered by Icinga 2 itself
+    monitor URL is the API like https://icinga.example.com:5665, monitor CGI URL might point to Icinga Web 2
+"""
+
+import sys
+import urllib
+import webbrowser
+import datetime
+import time
+import json
+
+from Nagstamon import Actions
+from Nagstamon.Objects import *
+from Nagstamon.Server.Generic import GenericServer
+
+
+class Icinga2Server(GenericServer):
+    """
+        Icinga 2 REST API at /v1
+    """
+
+    TYPE = 'Icinga 2'
+
+    # web interface is Icinga Web 2 at monitor CGI URL
+    BROWSER_URLS = {"monitor": "$MONITOR-CGI$",\
+                    "hosts": "$MONITOR-CGI$/monitor/list/hosts?host_problem=1",\
+                    "services": "$MONITOR-CGI$/monitor/list/services?service_problem=1",\
+                    "history": "$MONITOR-CGI$/monitor/list/eventhistory"}
+
+    # autologin is used only by Centreon, display names only by Icinga 1.x
+    DISABLED_CONTROLS = ["input_checkbutton_use_autologin",
+                         "label_autologin_key",
+                         "input_entry_autologin_key",
+                         "input_checkbutton_use_display_name_host",
+                         "input_checkbutton_use_display_name_service"]
+
+    # hosts which are down but not reachable because of their parents are unreachable
+    STATES_MAPPING = {"hosts": {0: "UP", 1: "DOWN", 2: "UNREACHABLE"},\
+                      "services": {0: "OK", 1: "WARNING", 2: "CRITICAL", 3: "UNKNOWN"}}
+
+    # only attributes which are really used get transferred
+    HOST_ATTRS = ["name", "address", "state", "state_type", "check_attempt", "max_check_attempts",
+                  "last_check", "last_state_change", "last_check_result", "last_reachable", "acknowledgement",
+                  "downtime_depth", "flapping", "enable_notifications", "enable_active_checks"]
+
+    SERVICE_ATTRS = ["host_name", "name", "state", "state_type", "check_attempt", "max_check_attempts",
+                     "last_check", "last_state_change", "last_check_result", "acknowledgement",
+                     "downtime_depth", "flapping", "enable_notifications", "enable_active_checks"]
+
+    # hosts or services handled by one action request
+    ACTION_BATCH_SIZE = 50
+
+    def init_config(self):
+        """
+        nothing to prepare - URLs are built with every cycle because they contain the filters
+        """
+        pass
+
+
+    def init_HTTP(self):
+        """
+        Icinga 2 API answers only if JSON is accepted, actions are posted as JSON
+        """
+        GenericServer.init_HTTP(self)
+
+        if not "Accept" in self.HTTPheaders["raw"]:
+            for giveback in ["raw", "obj"]:
+                self.HTTPheaders[giveback]["Accept"] = "application/json"
+                self.HTTPheaders[giveback]["Content-Type"] = "application/json"
+
+
+    def _get_filters(self):
+        """
+        translate active filters into filter expressions of the API for hosts and services so objects
+        which would be filtered out anyway are not transferred at all
+        """
+        hosts = ["host.state != 0"]
+        services = ["service.state != 0"]
+
+        # Icinga 2 hosts are only up or down, unreachable ones are down and not reachable
+        if str(self.conf.filter_all_down_hosts) == "True":
+            hosts.append("!(host.state == 1 && host.last_reachable)")
+        if str(self.conf.filter_all_unreachable_hosts) == "True":
+            hosts.append("host.last_reachable")
+        if str(self.conf.filter_all_warning_services) == "True":
+            services.append("service.state != 1")
+        if str(self.conf.filter_all_critical_services) == "True":
+            services.append("service.state != 2")
+        if str(self.conf.filter_all_unknown_services) == "True":
+            services.append("service.state != 3")
+
+        # filters which apply to hosts and services the same way
+        for flag, expression in [("filter_hosts_services_maintenance", "%s.downtime_depth == 0"),
+                                 ("filter_acknowledged_hosts_services", "%s.acknowledgement == 0"),
+                                 ("filter_hosts_services_disabled_checks", "%s.enable_active_checks"),
+                                 ("filter_hosts_services_disabled_notifications", "%s.enable_notifications")]:
+            if str(self.conf.__dict__[flag]) == "True":
+                hosts.append(expression % "host")
+                services.append(expression % "service")
+
+        if str(self.conf.filter_all_flapping_hosts) == "True":
+            hosts.append("!host.flapping")
+        if str(self.conf.filter_all_flapping_services) == "True":
+            services.append("!service.flapping")
+        if str(self.conf.filter_hosts_in_soft_state) == "True":
+            hosts.append("host.state_type == 1")
+        if str(self.conf.filter_services_in_soft_state) == "True":
+            services.append("service.state_type == 1")
+
+        # services on certain hosts - host attributes are available in service filters
+        if str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
+            services.append("host.downtime_depth == 0")
+        if str(self.conf.filter_services_on_acknowledged_hosts) == "True":
+            services.append("host.acknowledgement == 0")
+        if str(self.conf.filter_services_on_down_hosts) == "True":
+            services.append("!(host.state == 1 && host.last_reachable)")
+        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
+            services.append("host.last_reachable")
+
+        return {"hosts": " && ".join(hosts), "services": " && ".join(services)}
+
+
+    def _get_url(self, object_type, attrs, expression, joins=[]):
+        """
+        URL of /v1/objects with attrs projection, joined attributes and filter
+        """
+        parameters = [("attrs", attr) for attr in attrs] + [("joins", join) for join in joins] + [("filter", expression)]
+        return "%s/v1/objects/%s?%s" % (self.monitor_url.rstrip("/"), object_type, urllib.urlencode(parameters))
+
+
+    def _get_status(self):
+        """
+        Get status from Icinga 2 API
+        """
+        # new_hosts dictionary
+        self.new_hosts = dict()
+
+        filters = self._get_filters()
+        urls = [self._get_url("hosts", self.HOST_ATTRS, filters["hosts"]),\
+                self._get_url("services", self.SERVICE_ATTRS, filters["services"], joins=["host.address"])]
+        results = self.FetchStatusURLs(urls)
+        for result in results:
+            if result.error != "": return Result(result=result.result, error=result.error)
+        if self.StatusURLsUnchanged(results):
+            return Result(unchanged=True)
+
+        parse_start = time.time()
+        try:
+            hosts, services = [json.loads(result.result)["results"] for result in results]
+
+            for h in hosts:
+                attrs = h["attrs"]
+                name = attrs["name"].encode("utf-8")
+                if not self.new_hosts.has_key(name):
+                    new_host = GenericHost()
+                    new_host.name = name
+                    new_host.server = self.name
+                    self._fill(new_host, attrs, self.STATES_MAPPING["hosts"])
+                    # down hosts behind down parents count as unreachable
+                    if new_host.status == "DOWN" and attrs["last_reachable"] == False:
+                        new_host.status = "UNREACHABLE"
+                    new_host.address = attrs["address"].encode("utf-8")
+                    self.new_hosts[name] = new_host
+
+            for s in services:
+                attrs = s["attrs"]
+                host, name = attrs["host_name"].encode("utf-8"), attrs["name"].encode("utf-8")
+                # host objects contain service objects
+                if not self.new_hosts.has_key(host):
+                    self.new_hosts[host] = GenericHost()
+                    self.new_hosts[host].name = host
+                    self.new_hosts[host].server = self.name
+                    self.new_hosts[host].status = "UP"
+                    # address of host joined to service
+                    if s.get("joins", {}).has_key("host"):
+                        self.new_hosts[host].address = s["joins"]["host"]["address"].encode("utf-8")
+                # if a service does not exist create its object
+                if not self.new_hosts[host].services.has_key(name):
+                    new_service = GenericService()
+                    new_service.host = host
+                    new_service.name = name
+                    new_service.server = self.name
+                    self._fill(new_service, attrs, self.STATES_MAPPING["services"])
+                    self.new_hosts[host].services[name] = new_service
+        except:
+            # set checking flag back to False
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        self.timings.add("parse", time.time() - parse_start)
+
+        return Result()
+
+
+    def _fill(self, item, attrs, states):
+        """
+        set attributes common to hosts and services - numbers come as floats
+        """
+        item.status = states[int(attrs["state"])]
+        item.last_check = datetime.datetime.fromtimestamp(int(attrs["last_check"])).isoformat(" ")
+        item.duration = Actions.HumanReadableDurationThruk(attrs["last_state_change"])
+        item.attempt = "%s/%s" % (int(attrs["check_attempt"]), int(attrs["max_check_attempts"]))
+        # pending objects have no check result yet
+        if attrs["last_check_result"] != None:
+            item.status_information = attrs["last_check_result"]["output"].encode("utf-8").replace("\n", " ").strip()
+        item.passiveonly = not attrs["enable_active_checks"]
+        item.notifications_disabled = not attrs["enable_notifications"]
+        item.flapping = attrs["flapping"]
+        item.acknowledged = attrs["acknowledgement"] != 0
+        item.scheduled_downtime = attrs["downtime_depth"] != 0
+        item.status_type = {0: "soft", 1: "hard"}[int(attrs["state_type"])]
+
+
+    def _action(self, action, objects, parameters):
+        """
+        post action of /v1/actions for (host, service) tuples - service "" means host
+        several of them are selected per request by one filter
+        """
+        hosts = ['host.name == %s' % self._quote(host) for host, service in objects if service == ""]
+        services = ['host.name == %s && service.name == %s' % (self._quote(host), self._quote(service))\
+                    for host, service in objects if service != ""]
+
+        for object_type, expressions in [("Host", hosts), ("Service", services)]:
+            for i in range(0, len(expressions), self.ACTION_BATCH_SIZE):
+                data = {"type": object_type,
+                        "filter": " || ".join(["(%s)" % e for e in expressions[i:i + self.ACTION_BATCH_SIZE]])}
+                data.update(parameters)
+                url = "%s/v1/actions/%s" % (self.monitor_url.rstrip("/"), action)
+
+                if str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="Submitting action %s for %s %s objects: " %\
+                               (action, len(expressions[i:i + self.ACTION_BATCH_SIZE]), object_type) + data["filter"])
+
+                result = self.FetchURL(url, giveback="raw", cgi_data=json.dumps(data))
+                if result.error != "" and str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="Action %s failed: %s" % (action, result.error))
+
+
+    def _quote(self, value):
+        """
+        string literal for filter expressions - same escaping as JSON
+        """
+        if not isinstance(value, unicode):
+            value = value.decode("utf-8")
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+    def GetHost(self, host):
+        """
+        address of host - mostly known from status, otherwise asked for
+        """
+        if str(self.conf.connect_by_host) == "True" or host == "":
+            return Result(result=host)
+
+        ip = self.address_cache.get(host)
+        if ip == None:
+            if self.hosts.has_key(host) and self.hosts[host].address != "":
+                ip = self.hosts[host].address
+            else:
+                result = self.FetchURL(self._get_url("hosts", ["address"], "host.name == %s" % self._quote(host)), giveback="raw")
+                if result.error != "":
+                    return result
+                try:
+                    hosts = json.loads(result.result)["results"]
+                except:
+                    result, error = self.Error(sys.exc_info())
+                    return Result(result=result, error=error)
+                if len(hosts) == 0:
+                    return Result(result=host)
+                ip = hosts[0]["attrs"]["address"].encode("utf-8")
+            self.address_cache.put(host, ip)
+
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug="IP of %s:" % host + " " + ip)
+
+        return Result(result=self._resolve_address(ip))
+
+
+    def open_tree_view(self, host, service=""):
+        """
+        open host or service in Icinga Web 2 if there is one configured as monitor CGI URL
+        """
+        if self.monitor_cgi_url not in ("", self.monitor_url):
+            if service == "":
+                url = self.monitor_cgi_url + "/monitor/host/show?" + urllib.urlencode({"host": host})
+            else:
+                url = self.monitor_cgi_url + "/monitor/service/show?" + urllib.urlencode({"host": host, "service": service})
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), host=host, service=service, debug="Open host/service monitor web page " + url)
+            webbrowser.open(url)
+
+
+    def get_start_end(self, host):
+        return time.strftime("%Y-%m-%d %H:%M"), time.strftime("%Y-%m-%d %H:%M", time.localtime(time.time() + 7200))
+
+
+    def _set_recheck(self, host, service):
+        if service != "" and self.hosts[host].services[service].is_passive_only():
+            # Do not check passive only checks
+            return
+        # older Icinga 2 versions call force force_check
+        self._action("reschedule-check", [(host, service)], {"force": True, "force_check": True})
+
+
+    def recheck_all(self):
+        """
+        reschedule checks of all hosts and active services in trouble with few requests
+        """
+        objects = list()
+        for host in self.hosts.values():
+            objects.append((host.name, ""))
+            for service in host.services.values():
+                if not service.is_passive_only():
+                    objects.append((host.name, service.name))
+        self._action("reschedule-check", objects, {"force": True, "force_check": True})
+
+
+    def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services=[]):
+        # acknowledge all services on a host when told to do so - several of them per request
+        objects = [(host, service)] + [(host, s) for s in all_services]
+        self._action("acknowledge-problem", objects, {"author": author, "comment": comment, "sticky": sticky == True,\
+                                                      "notify": notify == True, "persistent": persistent == True})
+
+
+    def _set_downtime(self, host, service, author, comment, fixed, start_time, end_time, hours, minutes):
+        start_time = int(time.mktime(time.strptime(start_time, "%Y-%m-%d %H:%M")))
+        end_time = int(time.mktime(time.strptime(end_time, "%Y-%m-%d %H:%M")))
+        # duration is only used by flexible downtimes
+        duration = (int(hours) * 60 + int(minutes)) * 60
+        self._action("schedule-downtime", [(host, service)], {"author": author, "comment": comment,\
+                                                              "start_time": start_time, "end_time": end_time,\
+                                                              "fixed": fixed == True, "duration": duration})
+
+
+    def _set_submit_check_result(self, host, service, state, comment, check_output, performance_data):
+        if service == "":
+            exit_status = {"up": 0, "down": 1, "unreachable": 1}[state]
+        else:
+            exit_status = {"ok": 0, "warning": 1, "critical": 2, "unknown": 3}[state]
+        self._action("process-check-result", [(host, service)], {"exit_status": exit_status,\
+                                                                 "plugin_output": check_output,\
+                                                                 "performance_data": performance_data})
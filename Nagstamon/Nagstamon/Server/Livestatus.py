@@ -0,0 +1,478 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    Livestatus backend - queries Livestatus of Nagios, Icinga, Naemon or Check_MK sites directly
+    over TCP or a unix socket instead of scraping a web interface
+    monitor URL is the socket address like tcp:monitor.example.com:6557 or unix:/omd/sites/site/tmp/run/live,
+    monitor CGI URL might point to the web interface for the browser buttons
+"""
+
+import sys
+import socket
+import webbrowser
+import datetime
+import time
+import json
+import traceback
+
+from Nagstamon import Actions
+from Nagstamon.Objects import *
+from Nagstamon.Server.Generic import GenericServer
+from Nagstamon.Connection import is_connection_error
+
+
+class LivestatusError(Exception):
+    """
+        Livestatus answered with an error status
+    """
+    pass
+
+
+class LivestatusConnection(object):
+    """
+        one socket to Livestatus - with KeepAlive: on it stays open and is given back to the
+        connection pool of the server between queries
+    """
+
+    def __init__(self, address, timeout=None):
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address, timeout)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(address)
+            except:
+                self.sock.close()
+                raise
+
+
+    def send(self, request):
+        self.sock.sendall(request)
+
+
+    def read_response(self):
+        """
+        read answer with fixed16 header - 3 digits status, space, 11 characters body length, newline
+        gives back status and body
+        """
+        header = self._read(16)
+        try:
+            status, length = int(header[0:3]), int(header[4:15])
+        except ValueError:
+            raise LivestatusError("Invalid Livestatus response header: %s" % header.strip())
+        return status, self._read(length)
+
+
+    def _read(self, size):
+        chunks = list()
+        while size > 0:
+            data = self.sock.recv(min(size, 65536))
+            if data == "":
+                raise socket.error("Livestatus closed connection")
+            chunks.append(data)
+            size -= len(data)
+        return "".join(chunks)
+
+
+    def close(self):
+        if self.sock != None:
+            self.sock.close()
+            self.sock = None
+
+
+class LivestatusServer(GenericServer):
+    """
+        Livestatus over TCP or unix socket
+    """
+
+    TYPE = 'Livestatus'
+
+    # default Livestatus TCP port as used by Check_MK and OMD
+    DEFAULT_PORT = 6557
+
+    # web interface is optional and only used for browser buttons
+    BROWSER_URLS = {"monitor": "$MONITOR-CGI$",\
+                    "hosts": "$MONITOR-CGI$",\
+                    "services": "$MONITOR-CGI$",\
+                    "history": "$MONITOR-CGI$"}
+
+    # autologin is used only by Centreon, display names only by Icinga
+    DISABLED_CONTROLS = ["input_checkbutton_use_autologin",
+                         "label_autologin_key",
+                         "input_entry_autologin_key",
+                         "input_checkbutton_use_display_name_host",
+                         "input_checkbutton_use_display_name_service"]
+
+    STATES_MAPPING = {"hosts": {0: "UP", 1: "DOWN", 2: "UNREACHABLE"},\
+                      "services": {0: "OK", 1: "WARNING", 2: "CRITICAL", 3: "UNKNOWN"}}
+
+    # only columns which are really used get transferred
+    HOST_COLUMNS = ["name", "address", "state", "state_type", "current_attempt", "max_check_attempts",
+                    "last_check", "last_state_change", "plugin_output", "acknowledged",
+                    "scheduled_downtime_depth", "is_flapping", "notifications_enabled", "active_checks_enabled"]
+
+    SERVICE_COLUMNS = ["host_name", "description", "state", "state_type", "current_attempt", "max_check_attempts",
+                       "last_check", "last_state_change", "plugin_output", "acknowledged",
+                       "scheduled_downtime_depth", "is_flapping", "notifications_enabled", "active_checks_enabled",
+                       "host_address"]
+
+    def __init__(self, **kwds):
+        GenericServer.__init__(self, **kwds)
+
+        # Livestatus has no web interface of its own to open
+        self.MENU_ACTIONS = ["Recheck", "Acknowledge", "Submit check result", "Downtime"]
+
+
+    def init_config(self):
+        """
+        nothing to prepare - queries are built with every cycle because they contain the filters
+        """
+        pass
+
+
+    def get_address(self):
+        """
+        socket address of Livestatus out of monitor URL - (host, port) for TCP or path of unix socket
+        """
+        address = self.monitor_url.strip()
+        if address.startswith("unix:"):
+            return address[5:]
+        if address.startswith("/"):
+            return address
+        if address.startswith("tcp:"):
+            address = address[4:]
+        # IPv6 addresses come in brackets like tcp:[::1]:6557
+        if address.startswith("["):
+            host, port = address[1:].split("]", 1)
+            port = port.lstrip(":")
+        elif address.count(":") == 1:
+            host, port = address.split(":")
+        else:
+            host, port = address, ""
+        if port == "":
+            port = self.DEFAULT_PORT
+        return (host, int(port))
+
+
+    def _connect(self, timeout=None):
+        connect_start = time.time()
+        connection = LivestatusConnection(self.get_address(), timeout)
+        self.timings.add("connect", time.time() - connect_start)
+        return connection
+
+
+    def _query(self, query):
+        """
+        send one LQL query and give back its rows as lists in order of the requested columns
+        kept-alive connections which were closed by Livestatus meanwhile get replaced once
+        """
+        request = query + "OutputFormat: json\nKeepAlive: on\nResponseHeader: fixed16\n\n"
+        key = ("livestatus", str(self.get_address()))
+
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), debug="Livestatus query: " + query.replace("\n", " | ") +\
+                       " Connection pool: " + str(self.connection_pool.get_stats()))
+
+        while True:
+            connection = self.connection_pool.get(key)
+            reused = connection != None
+            if connection == None:
+                connection = self._connect()
+            try:
+                request_start = time.time()
+                connection.send(request)
+                status, body = connection.read_response()
+                self.timings.add("ttfb", time.time() - request_start)
+            except socket.error:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except:
+                connection.close()
+                raise
+            break
+
+        if status != 200:
+            # after an error Livestatus might not keep the connection
+            connection.close()
+            raise LivestatusError("Livestatus error %s: %s" % (status, body.strip()))
+        self.connection_pool.put(key, connection)
+
+        parse_start = time.time()
+        rows = json.loads(body)
+        self.timings.add("parse", time.time() - parse_start)
+        return rows
+
+
+    def _command(self, commands):
+        """
+        send external commands - several of them in one go, Livestatus does not answer them
+        """
+        timestamp = int(time.time())
+        request = "".join(["COMMAND [%s] %s\n\n" % (timestamp, command.replace("\n", " ")) for command in commands])
+
+        if str(self.conf.debug_mode) == "True":
+            for command in commands:
+                self.Debug(server=self.get_name(), debug="Livestatus command: " + command)
+
+        connection = self._connect()
+        try:
+            connection.send(request)
+        finally:
+            connection.close()
+
+
+    def _get_filters(self):
+        """
+        translate active filters into LQL Filter: headers for hosts and services so objects which
+        would be filtered out anyway are not transferred at all
+        """
+        hosts = ["Filter: state != 0"]
+        services = ["Filter: state != 0"]
+
+        if str(self.conf.filter_all_down_hosts) == "True":
+            hosts.append("Filter: state != 1")
+        if str(self.conf.filter_all_unreachable_hosts) == "True":
+            hosts.append("Filter: state != 2")
+        if str(self.conf.filter_all_warning_services) == "True":
+            services.append("Filter: state != 1")
+        if str(self.conf.filter_all_critical_services) == "True":
+            services.append("Filter: state != 2")
+        if str(self.conf.filter_all_unknown_services) == "True":
+            services.append("Filter: state != 3")
+
+        # filters which apply to hosts and services the same way
+        for flag, lql in [("filter_hosts_services_maintenance", "Filter: scheduled_downtime_depth = 0"),
+                          ("filter_acknowledged_hosts_services", "Filter: acknowledged = 0"),
+                          ("filter_hosts_services_disabled_checks", "Filter: active_checks_enabled = 1"),
+                          ("filter_hosts_services_disabled_notifications", "Filter: notifications_enabled = 1")]:
+            if str(self.conf.__dict__[flag]) == "True":
+                hosts.append(lql)
+                services.append(lql)
+
+        if str(self.conf.filter_all_flapping_hosts) == "True":
+            hosts.append("Filter: is_flapping = 0")
+        if str(self.conf.filter_all_flapping_services) == "True":
+            services.append("Filter: is_flapping = 0")
+        if str(self.conf.filter_hosts_in_soft_state) == "True":
+            hosts.append("Filter: state_type = 1")
+        if str(self.conf.filter_services_in_soft_state) == "True":
+            services.append("Filter: state_type = 1")
+
+        # services on certain hosts
+        if str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
+            services.append("Filter: host_scheduled_downtime_depth = 0")
+        if str(self.conf.filter_services_on_acknowledged_hosts) == "True":
+            services.append("Filter: host_acknowledged = 0")
+        if str(self.conf.filter_services_on_down_hosts) == "True":
+            services.append("Filter: host_state != 1")
+        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
+            services.append("Filter: host_state != 2")
+
+        return {"hosts": "".join([f + "\n" for f in hosts]),
+                "services": "".join([f + "\n" for f in services])}
+
+
+    def _get_status(self):
+        """
+        Get status from Livestatus
+        """
+        # new_hosts dictionary
+        self.new_hosts = dict()
+
+        filters = self._get_filters()
+        try:
+            hosts, services = self.RunConcurrently([\
+                (self._query, "GET hosts\nColumns: %s\n%s" % (" ".join(self.HOST_COLUMNS), filters["hosts"])),\
+                (self._query, "GET services\nColumns: %s\n%s" % (" ".join(self.SERVICE_COLUMNS), filters["services"]))])
+        except:
+            # Livestatus not reachable at all - refresh loop may probe it cheaply instead of full cycles
+            if is_connection_error(sys.exc_info()[1]):
+                self.breaker.connection_failed = True
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        parse_start = time.time()
+        try:
+            for name, address, state, state_type, attempt, max_attempts, last_check, last_state_change, output,\
+                acknowledged, downtime, flapping, notifications, active in hosts:
+                name = name.encode("utf-8")
+                if not self.new_hosts.has_key(name):
+                    new_host = GenericHost()
+                    new_host.name = name
+                    new_host.server = self.name
+                    new_host.status = self.STATES_MAPPING["hosts"][state]
+                    new_host.last_check = datetime.datetime.fromtimestamp(int(last_check)).isoformat(" ")
+                    new_host.duration = Actions.HumanReadableDurationThruk(last_state_change)
+                    new_host.attempt = "%s/%s" % (attempt, max_attempts)
+                    new_host.status_information = output.encode("utf-8").replace("\n", " ").strip()
+                    new_host.passiveonly = not bool(active)
+                    new_host.notifications_disabled = not bool(notifications)
+                    new_host.flapping = bool(flapping)
+                    new_host.acknowledged = bool(acknowledged)
+                    new_host.scheduled_downtime = bool(downtime)
+                    new_host.status_type = {0: "soft", 1: "hard"}[state_type]
+                    new_host.address = address.encode("utf-8")
+                    self.new_hosts[name] = new_host
+
+            for host, name, state, state_type, attempt, max_attempts, last_check, last_state_change, output,\
+                acknowledged, downtime, flapping, notifications, active, address in services:
+                host, name = host.encode("utf-8"), name.encode("utf-8")
+                # host objects contain service objects
+                if not self.new_hosts.has_key(host):
+                    self.new_hosts[host] = GenericHost()
+                    self.new_hosts[host].name = host
+                    self.new_hosts[host].server = self.name
+                    self.new_hosts[host].status = "UP"
+                    self.new_hosts[host].address = address.encode("utf-8")
+                # if a service does not exist create its object
+                if not self.new_hosts[host].services.has_key(name):
+                    new_service = GenericService()
+                    new_service.host = host
+                    new_service.name = name
+                    new_service.server = self.name
+                    new_service.status = self.STATES_MAPPING["services"][state]
+                    new_service.last_check = datetime.datetime.fromtimestamp(int(last_check)).isoformat(" ")
+                    new_service.duration = Actions.HumanReadableDurationThruk(last_state_change)
+                    new_service.attempt = "%s/%s" % (attempt, max_attempts)
+                    new_service.status_information = output.encode("utf-8").replace("\n", " ").strip()
+                    new_service.passiveonly = not bool(active)
+                    new_service.notifications_disabled = not bool(notifications)
+                    new_service.flapping = bool(flapping)
+                    new_service.acknowledged = bool(acknowledged)
+                    new_service.scheduled_downtime = bool(downtime)
+                    new_service.status_type = {0: "soft", 1: "hard"}[state_type]
+                    self.new_hosts[host].services[name] = new_service
+        except:
+            # set checking flag back to False
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        self.timings.add("parse", time.time() - parse_start)
+
+        return Result()
+
+
+    def Probe(self):
+        """
+        cheap check if Livestatus which could not be reached is back again
+        """
+        try:
+            connection = self._connect(self.breaker.PROBE_TIMEOUT)
+            try:
+                connection.send("GET status\nColumns: program_start\nResponseHeader: fixed16\n\n")
+                connection.read_response()
+            finally:
+                connection.close()
+        except:
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Probe failed: " + traceback.format_exception_only(*sys.exc_info()[:2])[0])
+            return False
+        return True
+
+
+    def GetHost(self, host):
+        """
+        address of host - mostly known from status, otherwise asked for
+        """
+        if str(self.conf.connect_by_host) == "True" or host == "":
+            return Result(result=host)
+
+        ip = self.address_cache.get(host)
+        if ip == None:
+            try:
+                rows = self._query("GET hosts\nColumns: address\nFilter: name = %s\n" % host)
+            except:
+                result, error = self.Error(sys.exc_info())
+                return Result(result=result, error=error)
+            if len(rows) == 0:
+                return Result(result=host)
+            ip = rows[0][0].encode("utf-8")
+            self.address_cache.put(host, ip)
+
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug="IP of %s:" % host + " " + ip)
+
+        return Result(result=self._resolve_address(ip))
+
+
+    def open_tree_view(self, host, service=""):
+        """
+        open web interface if there is one configured as monitor CGI URL
+        """
+        if self.monitor_cgi_url not in ("", self.monitor_url):
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), host=host, service=service, debug="Open web interface " + self.monitor_cgi_url)
+            webbrowser.open(self.monitor_cgi_url)
+
+
+    def get_start_end(self, host):
+        return time.strftime("%Y-%m-%d %H:%M"), time.strftime("%Y-%m-%d %H:%M", time.localtime(time.time() + 7200))
+
+
+    def _set_recheck(self, host, service):
+        if service == "":
+            self._command(["SCHEDULE_FORCED_HOST_CHECK;%s;%s" % (host, int(time.time()))])
+        else:
+            if self.hosts[host].services[service].is_passive_only():
+                # Do not check passive only checks
+                return
+            self._command(["SCHEDULE_FORCED_SVC_CHECK;%s;%s;%s" % (host, service, int(time.time()))])
+
+
+    def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services=[]):
+        # sticky acknowledgements are flagged by 2
+        flags = "%s;%s;%s" % (sticky == True and 2 or 1, int(notify == True), int(persistent == True))
+        commands = list()
+        if service == "":
+            commands.append("ACKNOWLEDGE_HOST_PROBLEM;%s;%s;%s;%s" % (host, flags, author, comment))
+        else:
+            commands.append("ACKNOWLEDGE_SVC_PROBLEM;%s;%s;%s;%s;%s" % (host, service, flags, author, comment))
+        # acknowledge all services on a host when told to do so - all in one go
+        for s in all_services:
+            commands.append("ACKNOWLEDGE_SVC_PROBLEM;%s;%s;%s;%s;%s" % (host, s, flags, author, comment))
+        self._command(commands)
+
+
+    def _set_downtime(self, host, service, author, comment, fixed, start_time, end_time, hours, minutes):
+        start_time = int(time.mktime(time.strptime(start_time, "%Y-%m-%d %H:%M")))
+        end_time = int(time.mktime(time.strptime(end_time, "%Y-%m-%d %H:%M")))
+        # duration is only used by flexible downtimes
+        duration = (int(hours) * 60 + int(minutes)) * 60
+        if service == "":
+            self._command(["SCHEDULE_HOST_DOWNTIME;%s;%s;%s;%s;0;%s;%s;%s" %\
+                           (host, start_time, end_time, int(fixed), duration, author, comment)])
+        else:
+            self._command(["SCHEDULE_SVC_DOWNTIME;%s;%s;%s;%s;%s;0;%s;%s;%s" %\
+                           (host, service, start_time, end_time, int(fixed), duration, author, comment)])
+
+
+    def _set_submit_check_result(self, host, service, state, comment, check_output, performance_data):
+        if performance_data != "":
+            check_output = "%s|%s" % (check_output, performance_data)
+        if service == "":
+            self._command(["PROCESS_HOST_CHECK_RESULT;%s;%s;%s" %\
+                           (host, {"up": "0", "down": "1", "unreachable": "2"}[state], check_output)])
+        else:
+            self._command(["PROCESS_SERVICE_CHECK_RESULT;%s;%s;%s;%s" %\
+                           (host, service, {"ok": "0", "warning": "1", "critical": "2", "unknown": "3"}[state], check_output)])
@@ -29,7 +29,10 @@ import sys
 import urllib
 import webbrowser
 import time
-import copy
+import json
+import ast
+import re
+import threading
 
 from Nagstamon import Actions
 from Nagstamon.Objects import *
@@ -42,6 +45,23 @@ class MultisiteError(Exception):
         self.result    = result
 
 
+# hidden _transid field of Check_MK action forms
+TRANSID_FIELD = re.compile(r'<input[^>]+name=["\']_transid["\'][^>]*>', re.IGNORECASE)
+TRANSID_VALUE = re.compile(r'value=["\']([^"\']+)["\']', re.IGNORECASE)
+
+# characters with special meaning in livestatus regular expressions
+REGEX_SPECIAL = re.compile(r'([\\^$.|?*+()\[\]{}])')
+
+
+def _utf8(value):
+    """
+    JSON output delivers unicode, Nagstamon works with UTF-8 encoded strings
+    """
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
 class LastCheckColumnMultisite(Column):
     """
     because Check_MK has a pretty different date format (much better readable) it has to
@@ -107,6 +127,14 @@ class MultisiteServer(GenericServer):
                          "input_checkbutton_use_display_name_host",
                          "input_checkbutton_use_display_name_service"]
 
+    # Check_MK transids can be used only once and only the newest 20 of a user are valid, so
+    # spare ones are kept only a short time
+    TRANSID_POOL_SIZE = 5
+    TRANSID_MAX_AGE = 60
+
+    # services of one host acknowledged by one action request
+    ACTION_BATCH_SIZE = 50
+
     COLUMNS = [
         HostColumn,
         ServiceColumn,
@@ -131,6 +159,13 @@ class MultisiteServer(GenericServer):
         # flag for newer cookie authentication
         self.CookieAuth = False
 
+        # views are requested as JSON, older Check_MK versions fall back to python output
+        self.output_format = "json"
+
+        # spare transids as list of (time, transid), collected from the answers to actions
+        self.transids = list()
+        self.transids_lock = threading.Lock()
+
 
     def init_HTTP(self):
         # Fix eventually missing tailing "/" in url
@@ -140,13 +175,13 @@ class MultisiteServer(GenericServer):
         # Prepare all urls needed by nagstamon if not yet done
         if len(self.urls) == len(self.statemap):
             self.urls = {
-              'api_services':    self.monitor_url + "view.py?view_name=nagstamon_svc&output_format=python&lang=&limit=hard",
+              'api_services':    self.monitor_url + "view.py?view_name=nagstamon_svc&output_format=%s&lang=&limit=hard" % self.output_format,
               'human_services':  self.monitor_url + "index.py?%s" % \
                                                    urllib.urlencode({'start_url': 'view.py?view_name=nagstamon_svc'}),
               'human_service':   self.monitor_url + "index.py?%s" %
                                                    urllib.urlencode({'start_url': 'view.py?view_name=service'}),
 
-              'api_hosts':       self.monitor_url + "view.py?view_name=nagstamon_hosts&output_format=python&lang=&limit=hard",
+              'api_hosts':       self.monitor_url + "view.py?view_name=nagstamon_hosts&output_format=%s&lang=&limit=hard" % self.output_format,
               'human_hosts':     self.monitor_url + "index.py?%s" %
                                                    urllib.urlencode({'start_url': 'view.py?view_name=nagstamon_hosts'}),
               'human_host':      self.monitor_url + "index.py?%s" %
@@ -159,6 +194,8 @@ class MultisiteServer(GenericServer):
               'api_host_act':    self.monitor_url + 'view.py?_transid=-1&_do_actions=yes&_do_confirm=Yes!&view_name=hoststatus&filled_in=actions&lang=',
               'api_service_act': self.monitor_url + 'view.py?_transid=-1&_do_actions=yes&_do_confirm=Yes!&view_name=service&filled_in=actions&lang=',
               'api_svcprob_act': self.monitor_url + 'view.py?_transid=-1&_do_actions=yes&_do_confirm=Yes!&view_name=svcproblems&filled_in=actions&lang=',
+              # services of a host, selected by service_regex - used for several services at once
+              'api_host_svcs_act': self.monitor_url + 'view.py?_transid=-1&_do_actions=yes&_do_confirm=Yes!&view_name=host&filled_in=actions&lang=',
               'human_events':    self.monitor_url + "index.py?%s" %
                                                    urllib.urlencode({'start_url': 'view.py?view_name=events'}),
               'togglevisibility':self.monitor_url + "user_profile.py",
@@ -189,12 +226,32 @@ class MultisiteServer(GenericServer):
         pass
 
 
+    def _decode(self, content):
+        """
+        decode view output - JSON as requested or python literals if the server is configured
+        to answer that way, remote content is never evaluated as code
+        """
+        parse_start = time.time()
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = ast.literal_eval(content.strip())
+            if self.output_format == "json":
+                # Check_MK versions without JSON output - ask for python output from now on
+                self.output_format = "python"
+                for api in ["api_hosts", "api_services"]:
+                    self.urls[api] = self.urls[api].replace("output_format=json", "output_format=python")
+                if str(self.conf.debug_mode) == "True":
+                    self.Debug(server=self.get_name(), debug="No JSON output available, using python output")
+        self.timings.add("parse", time.time() - parse_start)
+        return data
+
+
     def _get_url(self, url):
         result = self.FetchURL(url, 'raw')
         content, error = result.result, result.error
 
         if error != "":
-            #raise MultisiteError(True, Result(result = copy.deepcopy(content), error = error))
             raise MultisiteError(True, Result(result = content, error = error))
 
         if content.startswith('WARNING:'):
@@ -204,7 +261,7 @@ class MultisiteServer(GenericServer):
             self.Debug(server=self.get_name(), debug=c[0])
 
             raise MultisiteError(False, Result(result = "\n".join(c[1:]),
-                                               content = eval("\n".join(c[1:])),
+                                               content = self._decode("\n".join(c[1:])),
                                                error = c[0]))
         elif content.startswith('ERROR:'):
             raise MultisiteError(True, Result(result = content,
@@ -226,7 +283,17 @@ class MultisiteServer(GenericServer):
                 if content.startswith('<'):
                     return ""
 
-        return eval(content)
+        return self._decode(content)
+
+
+    def _get_url_or_error(self, url):
+        """
+        _get_url() for parallel requests - MultisiteError is given back instead of being raised
+        """
+        try:
+            return self._get_url(url)
+        except MultisiteError, e:
+            return e
 
 
     def _get_cookie_login(self):
@@ -263,54 +330,64 @@ class MultisiteServer(GenericServer):
         url_params += '&is_host_active_checks_enabled=-1&is_service_active_checks_enabled=-1'
         url_params += '&host_scheduled_downtime_depth=-1&is_in_downtime=-1'
 
+        # hosts and services are requested at once, services only with their extra filter
+        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
+            service_url_params = url_params + '&hst2=0'
+        else:
+            service_url_params = url_params
+        try:
+            responses = self.RunConcurrently([(self._get_url_or_error, self.urls['api_hosts'] + url_params),\
+                                              (self._get_url_or_error, self.urls['api_services'] + service_url_params)])
+        except:
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        parse_start = time.time()
         try:
             response = []
             try:
-                response = self._get_url(self.urls['api_hosts'] + url_params)
+                response = responses[0]
+                if isinstance(response, MultisiteError): raise response
             except MultisiteError, e:
                 if e.terminate:
                     return e.result
 
-            for row in response[1:]:
-                host= dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
-                n = {
-                    'host':               host['host'],
-                    'status':             self.statemap.get(host['host_state'], host['host_state']),
-                    'last_check':         host['host_check_age'],
-                    'duration':           host['host_state_age'],
-                    'status_information': host['host_plugin_output'],
-                    'attempt':            host['host_attempt'],
-                    'site':               host['sitename_plain'],
-                    'address':            host['host_address'],
-                }
+            # columns are looked up once by their header index instead of building a dict per row
+            column = dict((name, index) for index, name in enumerate(response and response[0] or []))
+            HOST, STATE, CHECK_AGE, STATE_AGE, OUTPUT, ATTEMPT, SITE, ADDRESS = [column.get(name) for name in\
+                ["host", "host_state", "host_check_age", "host_state_age", "host_plugin_output",
+                 "host_attempt", "sitename_plain", "host_address"]]
+            # transition to Check_MK 1.1.10p2 - these columns might not exist
+            IN_DOWNTIME, ACKNOWLEDGED = column.get("host_in_downtime"), column.get("host_acknowledged")
 
+            for row in response[1:]:
+                name = _utf8(row[HOST])
                 # host objects contain service objects
-                if not self.new_hosts.has_key(n["host"]):
-                    new_host = n["host"]
-                    self.new_hosts[new_host] = GenericHost()
-                    self.new_hosts[new_host].name = n["host"]
-                    self.new_hosts[new_host].server = self.name
-                    self.new_hosts[new_host].status = n["status"]
-                    self.new_hosts[new_host].last_check = n["last_check"]
-                    self.new_hosts[new_host].duration = n["duration"]
-                    self.new_hosts[new_host].attempt = n["attempt"]
-                    self.new_hosts[new_host].status_information= n["status_information"].replace("\n", " ")
-                    self.new_hosts[new_host].site = n["site"]
-                    self.new_hosts[new_host].address = n["address"]
-                    # transisition to Check_MK 1.1.10p2
-                    if host.has_key('host_in_downtime'):
-                        if host['host_in_downtime'] == 'yes':
-                            self.new_hosts[new_host].scheduled_downtime = True
-                    if host.has_key('host_acknowledged'):
-                        if host['host_acknowledged'] == 'yes':
-                            self.new_hosts[new_host].acknowledged = True
+                if not self.new_hosts.has_key(name):
+                    new_host = GenericHost()
+                    new_host.name = name
+                    new_host.server = self.name
+                    new_host.status = self.statemap.get(row[STATE], row[STATE])
+                    new_host.last_check = row[CHECK_AGE]
+                    new_host.duration = row[STATE_AGE]
+                    new_host.attempt = row[ATTEMPT]
+                    new_host.status_information = _utf8(row[OUTPUT]).replace("\n", " ")
+                    new_host.site = row[SITE]
+                    new_host.address = row[ADDRESS]
+                    if IN_DOWNTIME != None and row[IN_DOWNTIME] == "yes":
+                        new_host.scheduled_downtime = True
+                    if ACKNOWLEDGED != None and row[ACKNOWLEDGED] == "yes":
+                        new_host.acknowledged = True
 
                     # hard/soft state for later filter evaluation
-                    real_attempt, max_attempt = self.new_hosts[new_host].attempt.split("/")
+                    real_attempt, max_attempt = new_host.attempt.split("/")
                     if real_attempt <> max_attempt:
-                        self.new_hosts[new_host].status_type = "soft"
+                        new_host.status_type = "soft"
                     else:
-                        self.new_hosts[new_host].status_type = "hard"
+                        new_host.status_type = "hard"
+
+                    self.new_hosts[name] = new_host
 
             del response
 
@@ -319,82 +396,67 @@ class MultisiteServer(GenericServer):
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
-        # Add filters to the url which should only be applied to the service request
-        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
-            url_params += '&hst2=0'
-
         # services
         try:
             response = []
             try:
-                response = self._get_url(self.urls['api_services'] + url_params)
+                response = responses[1]
+                if isinstance(response, MultisiteError): raise response
             except MultisiteError, e:
                 if e.terminate:
                     return e.result
                 else:
-                    response = copy.deepcopy(e.result.content)
-                    ret = copy.deepcopy(e.result)
+                    response = e.result.content
+                    ret = e.result
+
+            column = dict((name, index) for index, name in enumerate(response and response[0] or []))
+            HOST, SERVICE, STATE, CHECK_AGE, STATE_AGE, ATTEMPT, OUTPUT, IS_ACTIVE, COMMAND, FLAPPING, SITE, ADDRESS =\
+                [column.get(name) for name in\
+                    ["host", "service_description", "service_state", "svc_check_age", "svc_state_age", "svc_attempt",
+                     "svc_plugin_output", "svc_is_active", "svc_check_command", "svc_flapping", "sitename_plain",
+                     "host_address"]]
+            # transition to Check_MK 1.1.10p2 - these columns might not exist
+            IN_DOWNTIME, ACKNOWLEDGED = column.get("svc_in_downtime"), column.get("svc_acknowledged")
 
             for row in response[1:]:
-                service = dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
-                n = {
-                    'host':               service['host'].encode("utf-8"),
-                    'service':            service['service_description'].encode("utf-8"),
-                    'status':             self.statemap.get(service['service_state'], service['service_state']),
-                    'last_check':         service['svc_check_age'],
-                    'duration':           service['svc_state_age'],
-                    'attempt':            service['svc_attempt'],
-                    'status_information': service['svc_plugin_output'].encode("utf-8"),
-                    # Check_MK passive services can be re-scheduled by using the Check_MK service
-                    'passiveonly':        service['svc_is_active'] == 'no' and not service['svc_check_command'].startswith('check_mk'),
-                    'notifications':      service['svc_notifications_enabled'] == 'yes',
-                    'flapping':           service['svc_flapping'] == 'yes',
-                    'site':               service['sitename_plain'],
-                    'address':            service['host_address'],
-                    'command':            service['svc_check_command'],
-                }
-
+                host, name = _utf8(row[HOST]), _utf8(row[SERVICE])
                 # host objects contain service objects
-                if not self.new_hosts.has_key(n["host"]):
-                    self.new_hosts[n["host"]] = GenericHost()
-                    self.new_hosts[n["host"]].name = n["host"]
-                    self.new_hosts[n["host"]].status = "UP"
-                    self.new_hosts[n["host"]].site = n["site"]
-                    self.new_hosts[n["host"]].address = n["address"]
+                if not self.new_hosts.has_key(host):
+                    self.new_hosts[host] = GenericHost()
+                    self.new_hosts[host].name = host
+                    self.new_hosts[host].status = "UP"
+                    self.new_hosts[host].site = row[SITE]
+                    self.new_hosts[host].address = row[ADDRESS]
                 # if a service does not exist create its object
-                if not self.new_hosts[n["host"]].services.has_key(n["service"]):
-                    new_service = n["service"]
-                    self.new_hosts[n["host"]].services[new_service] = GenericService()
-                    self.new_hosts[n["host"]].services[new_service].host = n["host"]
-                    self.new_hosts[n["host"]].services[new_service].server = self.name
-                    self.new_hosts[n["host"]].services[new_service].name = n["service"]
-                    self.new_hosts[n["host"]].services[new_service].status = n["status"]
-                    self.new_hosts[n["host"]].services[new_service].last_check = n["last_check"]
-                    self.new_hosts[n["host"]].services[new_service].duration = n["duration"]
-                    self.new_hosts[n["host"]].services[new_service].attempt = n["attempt"]
-                    self.new_hosts[n["host"]].services[new_service].status_information = n["status_information"].replace("\n", " ").strip()
-                    self.new_hosts[n["host"]].services[new_service].passiveonly = n["passiveonly"]
-                    self.new_hosts[n["host"]].services[new_service].flapping = n["flapping"]
-                    self.new_hosts[n["host"]].services[new_service].site = n["site"]
-                    self.new_hosts[n["host"]].services[new_service].address = n["address"]
-                    self.new_hosts[n["host"]].services[new_service].command = n["command"]
-                    # transistion to Check_MK 1.1.10p2
-                    if service.has_key('svc_in_downtime'):
-                        if service['svc_in_downtime'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].scheduled_downtime = True
-                    if service.has_key('svc_acknowledged'):
-                        if service['svc_acknowledged'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].acknowledged = True
-                    if service.has_key('svc_flapping'):
-                        if service['svc_flapping'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].flapping = True
+                if not self.new_hosts[host].services.has_key(name):
+                    new_service = GenericService()
+                    new_service.host = host
+                    new_service.server = self.name
+                    new_service.name = name
+                    new_service.status = self.statemap.get(row[STATE], row[STATE])
+                    new_service.last_check = row[CHECK_AGE]
+                    new_service.duration = row[STATE_AGE]
+                    new_service.attempt = row[ATTEMPT]
+                    new_service.status_information = _utf8(row[OUTPUT]).replace("\n", " ").strip()
+                    # Check_MK passive services can be re-scheduled by using the Check_MK service
+                    new_service.passiveonly = row[IS_ACTIVE] == "no" and not row[COMMAND].startswith("check_mk")
+                    new_service.flapping = row[FLAPPING] == "yes"
+                    new_service.site = row[SITE]
+                    new_service.address = row[ADDRESS]
+                    new_service.command = row[COMMAND]
+                    if IN_DOWNTIME != None and row[IN_DOWNTIME] == "yes":
+                        new_service.scheduled_downtime = True
+                    if ACKNOWLEDGED != None and row[ACKNOWLEDGED] == "yes":
+                        new_service.acknowledged = True
 
                     # hard/soft state for later filter evaluation
-                    real_attempt, max_attempt = self.new_hosts[n["host"]].services[new_service].attempt.split("/")
+                    real_attempt, max_attempt = new_service.attempt.split("/")
                     if real_attempt <> max_attempt:
-                        self.new_hosts[n["host"]].services[new_service].status_type = "soft"
+                        new_service.status_type = "soft"
                     else:
-                        self.new_hosts[n["host"]].services[new_service].status_type = "hard"
+                        new_service.status_type = "hard"
+
+                    self.new_hosts[host].services[name] = new_service
 
             del response
 
@@ -402,9 +464,11 @@ class MultisiteServer(GenericServer):
             # set checking flag back to False
             self.isChecking = False
             result, error = self.Error(sys.exc_info())
-            return Result(result=copy.deepcopy(result), error=copy.deepcopy(error))
+            return Result(result=result, error=error)
 
-        del url_params
+        del url_params, service_url_params, responses
+
+        self.timings.add("parse", time.time() - parse_start)
 
         return ret
 
@@ -434,27 +498,18 @@ class MultisiteServer(GenericServer):
         if str(self.conf.connect_by_host) == "True" or host == "":
             return Result(result=host)
 
-        ip = ""
-
-        try:
+        # address is known from status information
+        ip = self.address_cache.get(host)
+        if ip == None:
             if host in self.hosts:
                 ip = self.hosts[host].address
-
-            if str(self.conf.debug_mode) == "True":
-                self.Debug(server=self.get_name(), host=host, debug ="IP of %s:" % (host) + " " + ip)
-
-            if str(self.conf.connect_by_dns) == "True":
-                try:
-                    address = socket.gethostbyaddr(ip)[0]
-                except:
-                    address = ip
             else:
-                address = ip
-        except:
-            result, error = self.Error(sys.exc_info())
-            return Result(result=result, error=error)
+                ip = ""
 
-        return Result(result=address)
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug="IP of %s:" % host + " " + ip)
+
+        return Result(result=self._resolve_address(ip))
 
 
     def get_start_end(self, host):
@@ -508,9 +563,35 @@ class MultisiteServer(GenericServer):
         }
         self._action(self.hosts[host].site, host, service, p)
 
-        # acknowledge all services on a host when told to do so
-        for s in all_services:
-            self._action(self.hosts[host].site, host, s, p)
+        # acknowledge all services on a host when told to do so - several of them per request
+        for i in range(0, len(all_services), self.ACTION_BATCH_SIZE):
+            self._action_services(self.hosts[host].site, host, all_services[i:i + self.ACTION_BATCH_SIZE], p)
+
+
+    def _action_services(self, site, host, services, specific_params):
+        """
+        one action for several services of a host, selected in the host's service view by an
+        anchored regular expression
+        """
+        params = {
+            'site':           site,
+            'host':           host,
+            'service_regex':  "^(%s)$" % "|".join([REGEX_SPECIAL.sub(r"\\\1", s) for s in services]),
+        }
+        params.update(specific_params)
+        url = self.urls['api_host_svcs_act']
+
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug ="Submitting action for %s services: " % len(services) +\
+                                                              url + '&' + urllib.urlencode(params))
+
+        action = Actions.Action(type="url-check_mk-multisite",\
+                                string=url + '&' + urllib.urlencode(params),\
+                                conf=self.conf,\
+                                host = host,\
+                                service = "",\
+                                server=self)
+        action.run()
 
 
     def _set_recheck(self, host, service):
@@ -526,12 +607,19 @@ class MultisiteServer(GenericServer):
         """
         params = dict()
         params['_resched_checks'] = 'Reschedule active checks'
-        url = self.urls['api_svcprob_act']
+        # since werk #0766 a real transid is needed, any host will do
+        if len(self.hosts) > 0:
+            host = self.hosts.values()[0]
+            service = len(host.services) > 0 and host.services.keys()[0] or ""
+            url = self.urls['api_svcprob_act'].replace("?_transid=-1&", "?_transid=%s&" % self._get_transid(host.name, service))
+        else:
+            url = self.urls['api_svcprob_act']
 
         if str(self.conf.debug_mode) == "True":
             self.Debug(server=self.get_name(), debug ="Rechecking all action: " + url + '&' + urllib.urlencode(params))
 
         result = self.FetchURL(url + '&' + urllib.urlencode(params), giveback = 'raw')
+        self._keep_transid(result.result)
 
     """
     def ToggleVisibility(self, widget):
@@ -557,8 +645,48 @@ class MultisiteServer(GenericServer):
 
     def _get_transid(self, host, service):
         """
-        get transid for an action
+        get transid for an action - a spare one if there is still a fresh one, otherwise scraped
+        from the action form of the service view
         """
-        transid = self.FetchURL(self.urls["transid"].replace("$HOST$", host).replace("$SERVICE$", service.replace(" ", "+")),\
-                                "obj").result.find(attrs={"name" : "_transid"})["value"]
+        self.transids_lock.acquire()
+        # forget transids which might have been pushed out of the valid ones by other use of the web interface
+        self.transids = [t for t in self.transids if time.time() - t[0] < self.TRANSID_MAX_AGE]
+        if len(self.transids) > 0:
+            transid = self.transids.pop()[1]
+            self.transids_lock.release()
+            return transid
+        self.transids_lock.release()
+
+        content = self.FetchURL(self.urls["transid"].replace("$HOST$", urllib.quote_plus(host)).replace("$SERVICE$", urllib.quote_plus(service)),\
+                                "raw").result
+        transid = self._find_transid(content)
+        if transid == None:
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), host=host, service=service, debug="No transid found")
+            return "-1"
         return transid
+
+
+    def _find_transid(self, content):
+        """
+        transid of first action form in an HTML page or None
+        """
+        field = TRANSID_FIELD.search(content)
+        if field != None:
+            value = TRANSID_VALUE.search(field.group(0))
+            if value != None:
+                return value.group(1)
+        return None
+
+
+    def _keep_transid(self, content):
+        """
+        the answer to an action shows the view again with a fresh transid in its action form -
+        keep it for the next action so bulk actions need to scrape only once
+        """
+        transid = self._find_transid(content)
+        if transid != None:
+            self.transids_lock.acquire()
+            self.transids.append((time.time(), transid))
+            del self.transids[:-self.TRANSID_POOL_SIZE]
+            self.transids_lock.release()
@@ -17,6 +17,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
 
+import sys
+import re
+import json
+import datetime
+import time
+
+from Nagstamon import Actions
+from Nagstamon.Objects import *
 from Nagstamon.Server.Generic import GenericServer
 
 
@@ -24,7 +32,8 @@ class NagiosServer(GenericServer):
     """
         object of Nagios server - when nagstamon will be able to poll various servers this
         will be useful
-        As Nagios is the default server type all its methods are in GenericServer
+        As Nagios is the default server type all its methods are in GenericServer - except
+        status retrieval by statusjson.cgi of Nagios Core 4, HTML of status.cgi is the fallback
     """
 
     TYPE = 'Nagios'
@@ -36,3 +45,163 @@ class NagiosServer(GenericServer):
                          "input_checkbutton_use_display_name_host",
                          "input_checkbutton_use_display_name_service"]
 
+
+    # timestamps in statusjson.cgi answers which change with every request or status.dat update
+    VOLATILE_CONTENT = re.compile(GenericServer.VOLATILE_CONTENT.pattern + '|"(query_time|last_data_update|last_update)":\s*\d+')
+
+    # statusjson.cgi states as given with formatoptions=enumerate
+    STATES_MAPPING = {"hosts": {"up": "UP", "down": "DOWN", "unreachable": "UNREACHABLE"},\
+                      "services": {"ok": "OK", "warning": "WARNING", "critical": "CRITICAL", "unknown": "UNKNOWN"}}
+
+
+    def __init__(self, **kwds):
+        GenericServer.__init__(self, **kwds)
+
+        # None until the first cycle found out if there is a statusjson.cgi, False means HTML
+        self.use_statusjson = None
+
+
+    def init_config(self):
+        """
+        URLs of status.cgi for HTML fallback and of statusjson.cgi, which gives hard and soft states at once
+        """
+        GenericServer.init_config(self)
+        self.jsonurl_hosts = self.monitor_cgi_url + "/statusjson.cgi?query=hostlist&details=true&formatoptions=enumerate"
+        self.jsonurl_services = self.monitor_cgi_url + "/statusjson.cgi?query=servicelist&details=true&formatoptions=enumerate"
+
+
+    def reset_HTTP(self):
+        """
+        after authentication problems it is not sure anymore if statusjson.cgi is usable
+        """
+        GenericServer.reset_HTTP(self)
+        self.use_statusjson = None
+
+
+    def get_statusjson_filters(self):
+        """
+        translate active state filters into hoststatus and servicestatus of statusjson.cgi
+        all other filters have no equivalent there and are applied as usual
+        """
+        hoststatus = [state for state, flag in [("down", self.conf.filter_all_down_hosts),\
+                                                ("unreachable", self.conf.filter_all_unreachable_hosts)] if str(flag) != "True"]
+        servicestatus = [state for state, flag in [("warning", self.conf.filter_all_warning_services),\
+                                                   ("critical", self.conf.filter_all_critical_services),\
+                                                   ("unknown", self.conf.filter_all_unknown_services)] if str(flag) != "True"]
+        svc_hoststatus = [state for state, flag in [("up", "False"), ("pending", "False"),\
+                                                    ("down", self.conf.filter_services_on_down_hosts),\
+                                                    ("unreachable", self.conf.filter_services_on_unreachable_hosts)] if str(flag) != "True"]
+        # an empty filter would mean no filter at all so better get everything than nothing
+        if len(hoststatus) == 0:
+            hoststatus = ["down", "unreachable"]
+        if len(servicestatus) == 0:
+            servicestatus = ["warning", "critical", "unknown"]
+        # services on hosts in downtime can only be filtered if those hosts are known even if they are up
+        if str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
+            hoststatus.append("up")
+
+        return {"hosts": "&hoststatus=" + "+".join(hoststatus),\
+                "services": "&hoststatus=%s&servicestatus=%s" % ("+".join(svc_hoststatus), "+".join(servicestatus))}
+
+
+    def _get_status(self):
+        """
+        Get status from statusjson.cgi if there is one, otherwise from status.cgi
+        """
+        if self.use_statusjson == False:
+            return GenericServer._get_status(self)
+
+        filters = self.get_statusjson_filters()
+        results = self.FetchStatusURLs([self.jsonurl_hosts + filters["hosts"], self.jsonurl_services + filters["services"]])
+        for result in results:
+            if result.error != "":
+                if self.use_statusjson == None and "HTTP Error 404" in result.error:
+                    return self._use_html("no statusjson.cgi found")
+                return Result(result=result.result, error=result.error)
+
+        try:
+            hosts, services = [json.loads(result.result) for result in results]
+            answers = [hosts["result"], services["result"]]
+        except (ValueError, KeyError, TypeError):
+            if self.use_statusjson == None:
+                return self._use_html("statusjson.cgi does not give back its JSON")
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+        for answer in answers:
+            if answer["type_code"] != 0:
+                return Result(result="ERROR", error="statusjson.cgi: %s %s" % (answer["type_text"], answer["message"]))
+        if self.use_statusjson == None:
+            self.use_statusjson = True
+            if str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Using statusjson.cgi")
+
+        if self.StatusURLsUnchanged(results):
+            return Result(unchanged=True)
+
+        # new_hosts dictionary
+        self.new_hosts = dict()
+
+        parse_start = time.time()
+        try:
+            for name, h in hosts["data"]["hostlist"].iteritems():
+                # hosts which are up are only there for services on hosts in downtime
+                if h["status"] == "up" and h["scheduled_downtime_depth"] == 0:
+                    continue
+                name = name.encode("utf-8")
+                new_host = GenericHost()
+                new_host.name = name
+                new_host.server = self.name
+                self._fill(new_host, h, self.STATES_MAPPING["hosts"])
+                self.new_hosts[name] = new_host
+
+            for host, host_services in services["data"]["servicelist"].iteritems():
+                host = host.encode("utf-8")
+                # host objects contain service objects
+                if not self.new_hosts.has_key(host):
+                    self.new_hosts[host] = GenericHost()
+                    self.new_hosts[host].name = host
+                    self.new_hosts[host].status = "UP"
+                for name, s in host_services.iteritems():
+                    name = name.encode("utf-8")
+                    new_service = GenericService()
+                    new_service.host = host
+                    new_service.name = name
+                    new_service.server = self.name
+                    self._fill(new_service, s, self.STATES_MAPPING["services"])
+                    self.new_hosts[host].services[name] = new_service
+        except:
+            # set checking flag back to False
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        self.timings.add("parse", time.time() - parse_start)
+
+        return Result()
+
+
+    def _use_html(self, reason):
+        """
+        fall back to status.cgi for good
+        """
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), debug="Using status.cgi, " + reason)
+        self.use_statusjson = False
+        return GenericServer._get_status(self)
+
+
+    def _fill(self, item, details, states):
+        """
+        set attributes of host or service from statusjson.cgi details, timestamps come in milliseconds
+        """
+        item.status = states[details["status"]]
+        item.last_check = datetime.datetime.fromtimestamp(int(details["last_check"]) / 1000).isoformat(" ")
+        item.duration = Actions.HumanReadableDurationThruk(int(details["last_state_change"]) / 1000)
+        item.attempt = "%s/%s" % (details["current_attempt"], details["max_attempts"])
+        item.status_information = details["plugin_output"].encode("utf-8").replace("\n", " ").strip()
+        item.passiveonly = not details["checks_enabled"]
+        item.notifications_disabled = not details["notifications_enabled"]
+        item.flapping = details["is_flapping"]
+        item.acknowledged = details["problem_has_been_acknowledged"]
+        item.scheduled_downtime = details["scheduled_downtime_depth"] > 0
+        item.status_type = str(details["state_type"])
@@ -0,0 +1,210 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    status.dat backend for Nagstamon running on the monitoring host itself - reads status.dat or
+    retention.dat of Nagios or Icinga directly instead of asking the CGIs which read it anyway
+    monitor URL is the path of the file, actions still go to the CGIs at monitor CGI URL
+"""
+
+import sys
+import os
+import mmap
+import datetime
+import time
+
+from Nagstamon import Actions
+from Nagstamon.Objects import *
+from Nagstamon.Server.Generic import GenericServer
+
+
+class StatusDatServer(GenericServer):
+    """
+        local status.dat or retention.dat, memory-mapped
+    """
+
+    TYPE = 'Nagios status.dat'
+
+    # monitor URL is a file here so the web interface is reached by monitor CGI URL
+    BROWSER_URLS = { "monitor": "$MONITOR-CGI$",\
+                    "hosts": "$MONITOR-CGI$/status.cgi?hostgroup=all&style=hostdetail&hoststatustypes=12",\
+                    "services": "$MONITOR-CGI$/status.cgi?host=all&servicestatustypes=253",\
+                    "history": "$MONITOR-CGI$/history.cgi?host=all"}
+
+    # autologin is used only by Centreon
+    DISABLED_CONTROLS = ["input_checkbutton_use_autologin",
+                         "label_autologin_key",
+                         "input_entry_autologin_key",
+                         "input_checkbutton_use_display_name_host",
+                         "input_checkbutton_use_display_name_service"]
+
+    # status.dat has hoststatus and servicestatus blocks, retention.dat host and service blocks
+    BLOCK_TYPES = {"hoststatus": "host",
+                   "servicestatus": "service",
+                   "host": "host",
+                   "service": "service"}
+
+    STATES_MAPPING = {"host": {"0": "UP", "1": "DOWN", "2": "UNREACHABLE"},\
+                      "service": {"0": "OK", "1": "WARNING", "2": "CRITICAL", "3": "UNKNOWN"}}
+
+    def __init__(self, **kwds):
+        GenericServer.__init__(self, **kwds)
+
+        # inode, size and modification time of file at last parsing
+        self.file_stat = None
+
+
+    def init_config(self):
+        """
+        no status CGI URLs needed
+        """
+        pass
+
+
+    def _get_status(self):
+        """
+        Get status from status.dat
+        """
+        try:
+            stat = os.stat(self.monitor_url)
+        except:
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        # Nagios writes a new file and renames it - same inode, size and time mean same content
+        # objects of last parsing are still fine unless filters changed which might have hidden some of them
+        file_stat = (stat.st_ino, stat.st_size, stat.st_mtime)
+        if file_stat == self.file_stat and self._get_filters_fingerprint() == self.filters_fingerprint:
+            return Result(unchanged=True)
+
+        # new_hosts dictionary
+        self.new_hosts = dict()
+
+        parse_start = time.time()
+        try:
+            status_file = open(self.monitor_url, "rb")
+            try:
+                if stat.st_size > 0:
+                    status_map = mmap.mmap(status_file.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        self._parse(status_map)
+                    finally:
+                        status_map.close()
+            finally:
+                status_file.close()
+        except:
+            # set checking flag back to False
+            self.isChecking = False
+            self.file_stat = None
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+        self.timings.add("parse", time.time() - parse_start)
+
+        self.file_stat = file_stat
+        return Result()
+
+
+    def _parse(self, status_map):
+        """
+        find blocks by searching the mapped file and split only those of hosts and services in
+        trouble into their fields - the OK ones, mostly nearly all of them, are skipped after looking
+        at their current_state
+        """
+        services = list()
+        position = 0
+        while True:
+            brace = status_map.find(" {\n", position)
+            if brace == -1:
+                break
+            # fields are indented by a tab in status.dat but not in retention.dat
+            indent = status_map[brace + 3:brace + 4] == "\t" and "\t" or ""
+            end = status_map.find("\n%s}" % indent, brace)
+            if end == -1:
+                break
+            position = end + 2 + len(indent)
+
+            kind = self.BLOCK_TYPES.get(status_map[status_map.rfind("\n", 0, brace) + 1:brace])
+            if kind == None:
+                continue
+            state = status_map.find("\n%scurrent_state=" % indent, brace, end)
+            if state == -1 or status_map[state + 15 + len(indent)] == "0":
+                continue
+
+            block = dict()
+            for line in status_map[brace + 3:end].split("\n"):
+                key, equal, value = line.partition("=")
+                block[key.strip()] = value
+
+            if kind == "host":
+                self._add_host(block)
+            else:
+                # hosts of services should be known first
+                services.append(block)
+
+        for block in services:
+            self._add_service(block)
+
+
+    def _fill(self, item, kind, block):
+        """
+        set attributes common to hosts and services
+        """
+        item.server = self.name
+        item.status = self.STATES_MAPPING[kind][block["current_state"]]
+        item.last_check = datetime.datetime.fromtimestamp(int(block.get("last_check", 0))).isoformat(" ")
+        item.duration = Actions.HumanReadableDurationThruk(block.get("last_state_change", 0))
+        item.attempt = "%s/%s" % (block.get("current_attempt", "1"), block.get("max_attempts", "1"))
+        item.status_information = block.get("plugin_output", "").replace("\n", " ").strip()
+        item.passiveonly = block.get("active_checks_enabled", "1") == "0"
+        item.notifications_disabled = block.get("notifications_enabled", "1") == "0"
+        item.flapping = block.get("is_flapping", "0") == "1"
+        item.acknowledged = block.get("problem_has_been_acknowledged", "0") == "1"
+        item.scheduled_downtime = block.get("scheduled_downtime_depth", "0") != "0"
+        item.status_type = {"0": "soft", "1": "hard"}[block.get("state_type", "1")]
+
+
+    def _add_host(self, block):
+        name = block["host_name"]
+        if not self.new_hosts.has_key(name):
+            self.new_hosts[name] = GenericHost()
+            self.new_hosts[name].name = name
+            self._fill(self.new_hosts[name], "host", block)
+
+
+    def _add_service(self, block):
+        host, name = block["host_name"], block["service_description"]
+        # host objects contain service objects
+        if not self.new_hosts.has_key(host):
+            self.new_hosts[host] = GenericHost()
+            self.new_hosts[host].name = host
+            self.new_hosts[host].server = self.name
+            self.new_hosts[host].status = "UP"
+        # if a service does not exist create its object
+        if not self.new_hosts[host].services.has_key(name):
+            self.new_hosts[host].services[name] = GenericService()
+            self.new_hosts[host].services[name].host = host
+            self.new_hosts[host].services[name].name = name
+            self._fill(self.new_hosts[host].services[name], "service", block)
+
+
+    def Probe(self):
+        """
+        file is back again
+        """
+        return os.access(self.monitor_url, os.R_OK)
@@ -26,6 +26,7 @@ import json
 import datetime
 import urllib
 import copy
+import time
 
 # to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
 # see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
@@ -44,6 +45,9 @@ class ThrukServer(GenericServer):
     """
     TYPE = 'Thruk'
 
+    # JSON output contains timestamps only, no calculated durations
+    VOLATILE_CONTENT = None
+
     # GUI sortable columns stuff
     DEFAULT_SORT_COLUMN_ID = 2
     # lost any memory what this COLOR_COLUMN_ID is used for...
@@ -139,19 +143,20 @@ class ThrukServer(GenericServer):
         # create filters like described in
         # http://www.nagios-wiki.de/nagios/tips/host-_und_serviceproperties_fuer_status.cgi?s=servicestatustypes
         # Thruk allows requesting only needed information to reduce traffic
-        self.cgiurl_services = self.monitor_cgi_url + "/status.cgi?host=all&servicestatustypes=28&view_mode=json&"\
+        # status types and properties are added with every cycle according to the active filters
+        self.cgiurl_services = self.monitor_cgi_url + "/status.cgi?host=all&view_mode=json&"\
                                                       "entries=all&columns=host_name,description,state,last_check,"\
                                                       "last_state_change,plugin_output,current_attempt,"\
                                                       "max_check_attempts,active_checks_enabled,is_flapping,"\
                                                       "notifications_enabled,acknowledged,state_type,"\
-                                                      "scheduled_downtime_depth"
+                                                      "scheduled_downtime_depth,host_address"
         # hosts (up or down or unreachable)
-        self.cgiurl_hosts = self.monitor_cgi_url + "/status.cgi?hostgroup=all&style=hostdetail&hoststatustypes=12&"\
+        self.cgiurl_hosts = self.monitor_cgi_url + "/status.cgi?hostgroup=all&style=hostdetail&"\
                                                     "view_mode=json&entries=all&"\
                                                     "columns=name,state,last_check,last_state_change,"\
                                                     "plugin_output,current_attempt,max_check_attempts,"\
                                                     "active_checks_enabled,notifications_enabled,is_flapping,"\
-                                                    "acknowledged,scheduled_downtime_depth,state_type"
+                                                    "acknowledged,scheduled_downtime_depth,state_type,address"
 
         # test for cookies
         # put all necessary data into url string
@@ -177,22 +182,30 @@ class ThrukServer(GenericServer):
         # new_hosts dictionary
         self.new_hosts = dict()
 
+        # get hosts and services first to know if anything changed at all
+        # objects which would be filtered out anyway are not even transferred
+        filters = self.get_cgi_filters()
+        results = self.FetchStatusURLs([self.cgiurl_hosts + filters["hosts"], self.cgiurl_services + filters["services"]])
+        for result in results:
+            if result.error != "": return Result(result=result.result, error=result.error)
+            # in case basic auth did not work try form login cookie based login
+            if result.result.startswith("<"):
+                self.CookieAuth = True
+                return Result(result=None, error="Login failed.")
+        if self.StatusURLsUnchanged(results):
+            return Result(unchanged=True)
+
+        parse_start = time.time()
+
         # hosts - mostly the down ones
         # unfortunately the hosts status page has a different structure so
         # hosts must be analyzed separately
         try:
             # JSON experiments
-            result = self.FetchURL(self.cgiurl_hosts, giveback="raw")
-            jsonraw, error = copy.deepcopy(result.result), copy.deepcopy(result.error)
-            if error != "": return Result(result=jsonraw, error=error)
-
-            # in case basic auth did not work try form login cookie based login
-            if jsonraw.startswith("<"):
-                self.CookieAuth = True
-                return Result(result=None, error="Login failed.")
+            jsonraw = results[0].result
 
             # in case JSON is not empty evaluate it
-            elif not jsonraw == "[]":
+            if not jsonraw == "[]":
                 hosts = json.loads(jsonraw)
 
                 for h in hosts:
@@ -212,6 +225,7 @@ class ThrukServer(GenericServer):
                         self.new_hosts[h["name"]].acknowledged = bool(int(h["acknowledged"]))
                         self.new_hosts[h["name"]].scheduled_downtime = bool(int(h["scheduled_downtime_depth"]))
                         self.new_hosts[h["name"]].status_type =  {0: "soft", 1: "hard"}[h["state_type"]]
+                        self.new_hosts[h["name"]].address = h.get("address", "")
                     del h
         except:
             # set checking flag back to False
@@ -223,18 +237,10 @@ class ThrukServer(GenericServer):
         try:
 
             # JSON experiments
-            result = self.FetchURL(self.cgiurl_services, giveback="raw")
-            jsonraw, error = copy.deepcopy(result.result), copy.deepcopy(result.error)
-
-            if error != "": return Result(result=jsonraw, error=error)
-
-            # in case basic auth did not work try form login cookie based login
-            if jsonraw.startswith("<"):
-                self.CookieAuth = True
-                return Result(result=None, error="Login failed.")
+            jsonraw = results[1].result
 
             # in case JSON is not empty evaluate it
-            elif not jsonraw == "[]":
+            if not jsonraw == "[]":
                 services = json.loads(jsonraw)
 
                 for s in services:
@@ -244,6 +250,7 @@ class ThrukServer(GenericServer):
                         self.new_hosts[s["host_name"]].name = s["host_name"]
                         self.new_hosts[s["host_name"]].server = self.name
                         self.new_hosts[s["host_name"]].status = "UP"
+                        self.new_hosts[s["host_name"]].address = s.get("host_address", "")
 
                     # if a service does not exist create its object
                     if not self.new_hosts[s["host_name"]].services.has_key(s["description"]):
@@ -270,6 +277,8 @@ class ThrukServer(GenericServer):
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
+        self.timings.add("parse", time.time() - parse_start)
+
         #dummy return in case all is OK
         return Result()
 
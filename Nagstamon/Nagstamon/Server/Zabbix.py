@@ -52,6 +52,9 @@ class ZabbixServer(GenericServer):
     TYPE = 'Zabbix'
     zapi = None
 
+    # seconds after which all problem triggers are fetched again instead of only the changed ones
+    FULL_RESYNC_INTERVAL = 600
+
     # A Monitor CGI URL is not necessary so hide it in settings
     # autologin is used only by Centreon
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
@@ -74,9 +77,18 @@ class ZabbixServer(GenericServer):
         self.username = self.conf.servers[self.get_name()].username
         self.password = self.conf.servers[self.get_name()].password
 
+        # retained problem triggers by triggerid, merged with the changes of every cycle
+        self.triggers = dict()
+        self.hostgroup_ids = None
+        self.api_version = None
+        # newest lastchange seen on monitor and time of last full resync
+        self.last_change = 0
+        self.last_resync = 0
+
     def _login(self):
         try:
-            self.zapi = ZabbixAPI(server=self.monitor_url, path="", log_level=0)
+            # use urlopener of server to keep connections alive and get compressed answers
+            self.zapi = ZabbixAPI(server=self.monitor_url, path="", log_level=0, opener=self.urlopener)
             self.zapi.login(self.username, self.password)
         except ZabbixAPIException:
             result, error = self.Error(sys.exc_info())
@@ -111,17 +123,115 @@ class ZabbixServer(GenericServer):
         # Create URLs for the configured filters
         if self.zapi is None:
             self._login()
+            self.api_version = None
+            self.last_resync = 0
+
+        # only triggers changed since last cycle are asked for, every FULL_RESYNC_INTERVAL
+        # all problem triggers are fetched again to catch acknowledgements and config changes
+        full_resync = time.time() - self.last_resync > self.FULL_RESYNC_INTERVAL
+
+        # all information is asked for in one batch request - at a full resync hosts and triggers
+        # have to wait for host group ids if there are host groups configured in monitor_cgi_url
+        trigger_params = {'sortfield': 'lastchange',
+                          'withUnacknowledgedEvents': True,
+                          'monitored': True,
+                          'filter': {'value': 1},
+                          'expandDescription': True,
+                          'output': 'extend',
+                          'select_items': 'extend',
+                          'expandData': True}
+        # only unavailable monitored hosts are of interest so the amount of transferred hosts
+        # scales with the problems and not with the size of the monitored network
+        host_params = {'output': ['host', 'ip', 'status', 'available', 'error', 'errors_from'],
+                       'filter': {'available': 2, 'status': 0}}
+        calls = []
+        # API version does not change during a session
+        if self.api_version is None:
+            calls.append(("APIInfo.version", {}))
+        if full_resync:
+            # newest change on monitor is the starting point for the following incremental cycles
+            calls.append(("trigger.get", {'output': ['triggerid', 'lastchange'],
+                                          'sortfield': 'lastchange',
+                                          'sortorder': 'DESC',
+                                          'limit': 1}))
+            if self.monitor_cgi_url:
+                group_list = self.monitor_cgi_url.split(',')
+                calls.append(("hostgroup.get", {'output': 'extend',
+                                                'with_monitored_items': True,
+                                                'filter': {"name": group_list}}))
+            else:
+                calls.append(("host.get", host_params))
+                calls.append(("trigger.get", trigger_params))
+        else:
+            # one second overlap because lastChangeSince is exclusive and changes may happen
+            # in the same second as the last cycle
+            changed_params = {'output': ['triggerid', 'lastchange'],
+                              'monitored': True,
+                              'lastChangeSince': self.last_change - 1}
+            if self.hostgroup_ids is not None:
+                host_params['groupids'] = self.hostgroup_ids
+                changed_params['groupids'] = self.hostgroup_ids
+                trigger_params['groupids'] = self.hostgroup_ids
+            trigger_params['lastChangeSince'] = self.last_change - 1
+            calls.append(("host.get", host_params))
+            calls.append(("trigger.get", changed_params))
+            calls.append(("trigger.get", trigger_params))
+
+        try:
+            results = self.zapi.batch(calls)
+            if self.api_version is None:
+                self.api_version = results.pop(0)
+            if full_resync:
+                changed = results.pop(0)
+                if self.monitor_cgi_url:
+                    self.hostgroup_ids = [x['groupid'] for x in results.pop(0) if int(x['internal']) == 0]
+                    host_params['groupids'] = self.hostgroup_ids
+                    trigger_params['groupids'] = self.hostgroup_ids
+                    results = self.zapi.batch([("host.get", host_params), ("trigger.get", trigger_params)])
+                else:
+                    self.hostgroup_ids = None
+                hosts, problems = results
+            else:
+                hosts, changed, problems = results
+        except:
+            # retained triggers might be out of date now
+            self.last_resync = 0
+            # set checking flag back to False
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        # older Zabbix versions give away triggers as dictionary
+        if type(changed) is dict:
+            changed = changed.values()
+        if type(problems) is dict:
+            problems = problems.values()
+
+        # merge changes into retained triggers - triggers which changed but are no unacknowledged
+        # problem anymore vanish, at a full resync everything is replaced
+        if full_resync:
+            triggers = dict()
+        else:
+            triggers = self.triggers
+            for trigger in changed:
+                triggers.pop(trigger['triggerid'], None)
+        for trigger in problems:
+            triggers[trigger['triggerid']] = trigger
+        self.triggers = triggers
+
+        for trigger in changed + problems:
+            self.last_change = max(self.last_change, int(trigger['lastchange']))
+        if full_resync:
+            self.last_resync = time.time()
+
+        if str(self.conf.debug_mode) == "True":
+            if full_resync:
+                self.Debug(server=self.get_name(), debug="Full resync: %s problem triggers" % len(problems))
+            else:
+                self.Debug(server=self.get_name(), debug="Incremental update: %s changed triggers, %s problem triggers" %
+                           (len(changed), len(self.triggers)))
 
         try:
-            hosts = []
-            try:
-                hosts = self.zapi.host.get(
-                    {"output": ["host", "ip", "status", "available", "error", "errors_from"], "filter": {}})
-            except:
-                # set checking flag back to False
-                self.isChecking = False
-                result, error = self.Error(sys.exc_info())
-                return Result(result=result, error=error)
 
             for host in hosts:
                 # johncan
@@ -135,7 +245,8 @@ class ZabbixServer(GenericServer):
                     'status_information': host['error'],
                     'attempt': '0/0',
                     'site': '',
-                    'address': host['host'],
+                    # older Zabbix versions give away ip of host, newer ones keep it in interfaces
+                    'address': host.get('ip', '') or host['host'],
                 }
 
                 # add dictionary full of information about this host item to nagitems
@@ -172,51 +283,13 @@ class ZabbixServer(GenericServer):
 
         # services
         services = []
-        groupids = []
-        zabbix_triggers = []
-        api_version = self.zapi.api_version()
         try:
             response = []
             try:
-                #service = self.zapi.trigger.get({"select_items":"extend","monitored":1,"only_true":1,"min_severity":3,"output":"extend","filter":{}})
-                triggers_list = []
-                if self.monitor_cgi_url:
-                    group_list = self.monitor_cgi_url.split(',')
-                    # johncan
-                    # self.Debug(str(group_list))
-                    hostgroup_ids = [x['groupid'] for x in self.zapi.hostgroup.get(
-                        {'output': 'extend',
-                         'with_monitored_items': True,
-                         'filter': {"name": group_list}}) if int(x['internal']) == 0]
-                    # johncan
-                    # self.Debug(str(hostgroup_ids))
-                    # johncan
-                    # hostgroup_ids = [7]
-                    zabbix_triggers = self.zapi.trigger.get(
-                        {'sortfield': 'lastchange', 'withUnacknowledgedEvents': True, 'groupids': hostgroup_ids,
-                         "monitored": True, "filter": {'value': 1}})
-                else:
-                    zabbix_triggers = self.zapi.trigger.get(
-                        {'sortfield': 'lastchange', 'withUnacknowledgedEvents': True, "monitored": True,
-                         "filter": {'value': 1}})
-                triggers_list = []
-                for trigger in zabbix_triggers:
-                    triggers_list.append(trigger.get('triggerid'))
-                this_trigger = self.zapi.trigger.get(
-                    {'triggerids': triggers_list,
-                     'expandDescription': True,
-                     'output': 'extend',
-                     'select_items': 'extend',
-                     'expandData': True}
-                )
                 # johncan
                 # self.Debug(str(this_trigger))
-                if type(this_trigger) is dict:
-                    for triggerid in this_trigger.keys():
-                        services.append(this_trigger[triggerid])
-                elif type(this_trigger) is list:
-                    for trigger in this_trigger:
-                        services.append(trigger)
+                for trigger in self.triggers.values():
+                    services.append(trigger)
 
             except ZabbixError, e:
                 #print "------------------------------------"
@@ -229,7 +302,7 @@ class ZabbixServer(GenericServer):
             for service in services:
                 # johncan
                 # self.Debug(str(service))
-                if api_version > '1.8':
+                if self.api_version > '1.8':
                     state = '%s' % service['description']
                 else:
                     state = '%s=%s' % (service['items'][0]['key_'], service['items'][0]['lastvalue']) 
@@ -295,6 +368,9 @@ class ZabbixServer(GenericServer):
             print sys.exc_info()
             return Result(result=result, error=error)
 
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), debug="Transferred bytes: " + str(self.transfer_stats.get_stats()))
+
         return ret
 
     def _open_browser(self, url):
@@ -336,27 +412,18 @@ class ZabbixServer(GenericServer):
         if str(self.conf.connect_by_host) == "True":
             return Result(result=host)
 
-        ip = ""
-
-        try:
+        # address is known from status information
+        ip = self.address_cache.get(host)
+        if ip == None:
             if host in self.hosts:
                 ip = self.hosts[host].address
-
-            if str(self.conf.debug_mode) == "True":
-                self.Debug(server=self.get_name(), host=host, debug="IP of %s:" % host + " " + ip)
-
-            if str(self.conf.connect_by_dns) == "True":
-                try:
-                    address = socket.gethostbyaddr(ip)[0]
-                except:
-                    address = ip
             else:
-                address = ip
-        except ZabbixError:
-            result, error = self.Error(sys.exc_info())
-            return Result(result=result, error=error)
+                ip = ""
+
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=host, debug="IP of %s:" % host + " " + ip)
 
-        return Result(result=address)
+        return Result(result=self._resolve_address(ip))
 
     def _set_recheck(self, host, service):
         pass
@@ -395,3 +462,6 @@ class ZabbixServer(GenericServer):
         # acknowledge all services on a host when told to do so
         for s in all_services:
             self._action(self.hosts[host].site, host, s, p)
+
+        # acknowledgements do not change triggers so they only vanish with a full resync
+        self.last_resync = 0
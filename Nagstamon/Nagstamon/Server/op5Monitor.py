@@ -22,6 +22,8 @@ import json
 import urllib
 import datetime
 import time
+import threading
+import re
 
 from datetime import datetime
 
@@ -57,7 +59,6 @@ class Op5MonitorServer(GenericServer):
     """
 
     TYPE = 'op5Monitor'
-    api_count='/api/filter/count/?query='
     api_query='/api/filter/query/?query='
     api_cmd='/api/command'
 
@@ -65,6 +66,7 @@ class Op5MonitorServer(GenericServer):
     api_host_col = []
     api_host_col.append('acknowledged')
     api_host_col.append('active_checks_enabled')
+    api_host_col.append('address')
     api_host_col.append('alias')
     api_host_col.append('current_attempt')
     api_host_col.append('is_flapping')
@@ -81,6 +83,7 @@ class Op5MonitorServer(GenericServer):
     api_svc_col.append('active_checks_enabled')
     api_svc_col.append('current_attempt')
     api_svc_col.append('description')
+    api_svc_col.append('host.address')
     api_svc_col.append('host.name')
     api_svc_col.append('host.state')
     api_svc_col.append('host.active_checks_enabled')
@@ -93,17 +96,17 @@ class Op5MonitorServer(GenericServer):
     api_svc_col.append('scheduled_downtime_depth')
     api_svc_col.append('state')
 
-    api_default_svc_query='[services] state !=0'
-    api_default_svc_query+=' or host.state != 0'
-    api_default_svc_query+='&columns=%s' % (','.join(api_svc_col))
-    api_default_svc_query+='&format=json'
+    # queries are paged by limit and offset - a stable sort order keeps rows from being skipped or
+    # fetched twice if others come and go between two pages
+    api_default_svc_query='[services] (state != 0 or host.state != 0)'
+    api_svc_params='&columns=%s&sort=host.name,description&format=json' % (','.join(api_svc_col))
 
-    api_default_host_query='[hosts] state !=0'
-    api_default_host_query+='&columns=%s' % (','.join(api_host_col))
-    api_default_host_query+='&format=json'
+    api_default_host_query='[hosts] state != 0'
+    api_host_params='&columns=%s&sort=name&format=json' % (','.join(api_host_col))
 
-    api_default_host_query = api_default_host_query.replace(" ", "%20")
-    api_default_svc_query = api_default_svc_query.replace(" ", "%20")
+    # regular expressions of filters are only given to op5 if they mean the same in its query
+    # language as in Python - no escapes, classes or extensions
+    SIMPLE_RE = re.compile(r'^(?!.*\(\?)[^\\"\[\]{}]*$')
 
     # autologin is used only by Centreon
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
@@ -133,122 +136,205 @@ class Op5MonitorServer(GenericServer):
         """
         Get status from op5 Monitor Server
         """
-        # create Nagios items dictionary with to lists for services and hosts
-        # every list will contain a dictionary for every failed service/host
-        # this dictionary is only temporarily
-        nagitems = {"hosts":[], "services":[]}
-
         # new_hosts dictionary
         self.new_hosts = dict()
+        # hosts and services are fetched in parallel and both might create hosts
+        self.new_hosts_lock = threading.Lock()
 
         # Fetch api listview with filters
         try:
-
-            # Fetch Host info
-            result = self.FetchURL(self.monitor_url + self.api_count + self.api_default_host_query, giveback="raw")
-            data = json.loads(result.result)
-            if data['count']:
-                count = data['count']
-                result = self.FetchURL(self.monitor_url + self.api_query + self.api_default_host_query + '&limit=' + str(count), giveback="raw")
-                data = json.loads(result.result)
-                n = dict()
-                for api in data:
-                    n['host'] = api['name']
-                    n["acknowledged"] = api['acknowledged']
-                    n["flapping"] = api['is_flapping']
-                    n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
-                    n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
-                    n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
-                    n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
-                    n['duration'] = human_duration(api['last_state_change'])
-                    n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
-                    n['status'] = self.STATUS_HOST_MAPPING[str(api['state'])]
-                    n['status_information'] = api['plugin_output']
-                    n['status_type'] = api['state']
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].acknowledged = n["acknowledged"]
-                        self.new_hosts[n['host']].attempt = n['attempt']
-                        self.new_hosts[n['host']].duration = n['duration']
-                        self.new_hosts[n['host']].flapping = n["flapping"]
-                        self.new_hosts[n['host']].last_check = n['last_check']
-                        self.new_hosts[n['host']].notifications_disabled = n["notifications_disabled"]
-                        self.new_hosts[n['host']].passiveonly = n["passiveonly"]
-                        self.new_hosts[n['host']].scheduled_downtime = n["scheduled_downtime"]
-                        self.new_hosts[n['host']].status = n['status']
-                        self.new_hosts[n['host']].status_information = n['status_information'].replace("\n", " ").strip()
-                        self.new_hosts[n['host']].status_type = n['status_type']
-                    nagitems['hosts'].append(n)
-                del n
-
-
-            # Fetch services info
-            result = self.FetchURL(self.monitor_url + self.api_count + self.api_default_svc_query, giveback="raw")
-            data = json.loads(result.result)
-            if data['count']:
-                count = data['count']
-                result = self.FetchURL(self.monitor_url + self.api_query + self.api_default_svc_query + '&limit=' + str(count), giveback="raw")
-                data = json.loads(result.result)
-                for api in data:
-                    n = dict()
-                    n['host'] = api['host']['name']
-                    n['status'] = self.STATUS_HOST_MAPPING[str(api['host']['state'])]
-                    n["passiveonly"] = 0 if api['host']['active_checks_enabled'] else 1
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].status = n['status']
-                        self.new_hosts[n['host']].passiveonly = n["passiveonly"]
-
-                    n['service'] = api['description']
-                    n["acknowledged"] = api['acknowledged']
-                    n["flapping"] = api['is_flapping']
-                    n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
-                    n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
-                    n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
-                    n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
-                    n['duration'] = human_duration(api['last_state_change'])
-                    n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
-                    n['status_information'] = api['plugin_output']
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].status = n['status']
-
-                    if not self.new_hosts[n['host']].services.has_key(n['service']):
-                        n['status'] = self.STATUS_SVC_MAPPING[str(api['state'])]
-
-                        self.new_hosts[n['host']].services[n['service']] = GenericService()
-                        self.new_hosts[n['host']].services[n['service']].acknowledged = n['acknowledged']
-                        self.new_hosts[n['host']].services[n['service']].attempt = n['attempt']
-                        self.new_hosts[n['host']].services[n['service']].duration = n['duration']
-                        self.new_hosts[n['host']].services[n['service']].flapping = n['flapping']
-                        self.new_hosts[n['host']].services[n['service']].host = n['host']
-                        self.new_hosts[n['host']].services[n['service']].last_check = n['last_check']
-                        self.new_hosts[n['host']].services[n['service']].name = n['service']
-                        self.new_hosts[n['host']].services[n['service']].notifications_disabled = n["notifications_disabled"]
-                        self.new_hosts[n['host']].services[n['service']].passiveonly = n['passiveonly']
-                        self.new_hosts[n['host']].services[n['service']].scheduled_downtime = n['duration']
-                        self.new_hosts[n['host']].services[n['service']].scheduled_downtime = n['scheduled_downtime']
-                        self.new_hosts[n['host']].services[n['service']].status = n['status']
-                        self.new_hosts[n['host']].services[n['service']].status_information = n['status_information'].replace("\n", " ").strip()
-
-                    nagitems['services'].append(n)
-                return Result()
+            # rows are processed while they are downloaded, page by page
+            host_query, svc_query = self._get_queries()
+            results = self.RunConcurrently([(self._query_all, host_query, self._add_host),\
+                                            (self._query_all, svc_query, self._add_service)])
+            for result in results:
+                if result.error != "": return Result(result=result.result, error=result.error)
+            if self.StatusURLsUnchanged(results):
+                return Result(unchanged=True)
         except:
-            print "========================================== b0rked =========================================="
             self.isChecking = False
             result,error = self.Error(sys.exc_info())
-            print error
             return Result(result=result, error=error)
 
         return Result()
 
 
+    def _get_queries(self):
+        """
+        translate active filters into op5 query language so objects which would be filtered out
+        anyway are not even transferred - gives back URL parameters for hosts and services query
+        """
+        host_filters = [self.api_default_host_query]
+        svc_filters = [self.api_default_svc_query]
+
+        if str(self.conf.filter_all_down_hosts) == "True":
+            host_filters.append('state != 1')
+        if str(self.conf.filter_all_unreachable_hosts) == "True":
+            host_filters.append('state != 2')
+        if str(self.conf.filter_all_warning_services) == "True":
+            svc_filters.append('state != 1')
+        if str(self.conf.filter_all_critical_services) == "True":
+            svc_filters.append('state != 2')
+        if str(self.conf.filter_all_unknown_services) == "True":
+            svc_filters.append('state != 3')
+
+        for filters in host_filters, svc_filters:
+            if str(self.conf.filter_acknowledged_hosts_services) == "True":
+                filters.append('acknowledged = 0')
+            if str(self.conf.filter_hosts_services_maintenance) == "True":
+                filters.append('scheduled_downtime_depth = 0')
+            if str(self.conf.filter_hosts_services_disabled_notifications) == "True":
+                filters.append('notifications_enabled = 1')
+            if str(self.conf.filter_hosts_services_disabled_checks) == "True":
+                filters.append('active_checks_enabled = 1')
+        if str(self.conf.filter_all_flapping_hosts) == "True":
+            host_filters.append('is_flapping = 0')
+        if str(self.conf.filter_all_flapping_services) == "True":
+            svc_filters.append('is_flapping = 0')
+        if str(self.conf.filter_hosts_in_soft_state) == "True":
+            host_filters.append('state_type = 1')
+        if str(self.conf.filter_services_in_soft_state) == "True":
+            svc_filters.append('state_type = 1')
+
+        if str(self.conf.filter_services_on_acknowledged_hosts) == "True":
+            svc_filters.append('host.acknowledged = 0')
+        if str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
+            svc_filters.append('host.scheduled_downtime_depth = 0')
+        if str(self.conf.filter_services_on_down_hosts) == "True":
+            svc_filters.append('host.state != 1')
+        if str(self.conf.filter_services_on_unreachable_hosts) == "True":
+            svc_filters.append('host.state != 2')
+
+        # host names matching the regular expression are filtered out, unless it is reversed
+        for enabled, pattern, reverse, columns in\
+                ((self.conf.re_host_enabled, self.conf.re_host_pattern, self.conf.re_host_reverse,
+                  ((host_filters, 'name'), (svc_filters, 'host.name'))),
+                 (self.conf.re_service_enabled, self.conf.re_service_pattern, self.conf.re_service_reverse,
+                  ((svc_filters, 'description'),)),
+                 (self.conf.re_status_information_enabled, self.conf.re_status_information_pattern,
+                  self.conf.re_status_information_reverse, ((host_filters, 'plugin_output'), (svc_filters, 'plugin_output')))):
+            if str(enabled) == "True" and self.SIMPLE_RE.match(pattern):
+                if str(reverse) == "True":
+                    operator = '~'
+                else:
+                    operator = '!~'
+                for filters, column in columns:
+                    filters.append('%s %s "%s"' % (column, operator, pattern))
+
+        return urllib.quote(' and '.join(host_filters)) + self.api_host_params,\
+               urllib.quote(' and '.join(svc_filters)) + self.api_svc_params
+
+
+    def _query_all(self, query, callback):
+        """
+        fetch all rows of query page by page into callback - a page with less rows than the page size
+        is the last one, so there is no need to count them before
+        """
+        page_size = self.get_page_size()
+        offset = 0
+        unchanged = True
+        while True:
+            url = self.monitor_url + self.api_query + query + '&limit=%s&offset=%s' % (page_size, offset)
+            result = self.FetchJSONRows(url, callback)
+            if result.error != "":
+                return result
+            unchanged = unchanged and result.unchanged
+            if result.result < page_size:
+                return Result(result=offset + result.result, unchanged=unchanged)
+            offset += page_size
+
+
+    def _add_host(self, api):
+        """
+        create host object of one row of host query
+        """
+        n = dict()
+        n['host'] = api['name']
+        n["acknowledged"] = api['acknowledged']
+        n["flapping"] = api['is_flapping']
+        n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
+        n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
+        n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
+        n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
+        n['duration'] = human_duration(api['last_state_change'])
+        n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
+        n['status'] = self.STATUS_HOST_MAPPING[str(api['state'])]
+        n['status_information'] = api['plugin_output']
+        n['status_type'] = api['state']
+
+        self.new_hosts_lock.acquire()
+        try:
+            # host might have been created already by one of its services
+            if not self.new_hosts.has_key(n['host']):
+                self.new_hosts[n['host']] = GenericHost()
+            self.new_hosts[n['host']].name = n['host']
+            self.new_hosts[n['host']].address = api.get('address', '')
+            self.new_hosts[n['host']].acknowledged = n["acknowledged"]
+            self.new_hosts[n['host']].attempt = n['attempt']
+            self.new_hosts[n['host']].duration = n['duration']
+            self.new_hosts[n['host']].flapping = n["flapping"]
+            self.new_hosts[n['host']].last_check = n['last_check']
+            self.new_hosts[n['host']].notifications_disabled = n["notifications_disabled"]
+            self.new_hosts[n['host']].passiveonly = n["passiveonly"]
+            self.new_hosts[n['host']].scheduled_downtime = n["scheduled_downtime"]
+            self.new_hosts[n['host']].status = n['status']
+            self.new_hosts[n['host']].status_information = n['status_information'].replace("\n", " ").strip()
+            self.new_hosts[n['host']].status_type = n['status_type']
+        finally:
+            self.new_hosts_lock.release()
+
+
+    def _add_service(self, api):
+        """
+        create service object of one row of service query
+        """
+        n = dict()
+        n['host'] = api['host']['name']
+        n['status'] = self.STATUS_HOST_MAPPING[str(api['host']['state'])]
+        n["passiveonly"] = 0 if api['host']['active_checks_enabled'] else 1
+        host_address = api['host'].get('address', '')
+        host_passiveonly = n["passiveonly"]
+
+        n['service'] = api['description']
+        n["acknowledged"] = api['acknowledged']
+        n["flapping"] = api['is_flapping']
+        n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
+        n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
+        n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
+        n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
+        n['duration'] = human_duration(api['last_state_change'])
+        n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
+        n['status_information'] = api['plugin_output']
+
+        self.new_hosts_lock.acquire()
+        try:
+            if not self.new_hosts.has_key(n['host']):
+                self.new_hosts[n['host']] = GenericHost()
+                self.new_hosts[n['host']].name = n['host']
+                self.new_hosts[n['host']].address = host_address
+                self.new_hosts[n['host']].status = n['status']
+                self.new_hosts[n['host']].passiveonly = host_passiveonly
+
+            if not self.new_hosts[n['host']].services.has_key(n['service']):
+                n['status'] = self.STATUS_SVC_MAPPING[str(api['state'])]
+
+                self.new_hosts[n['host']].services[n['service']] = GenericService()
+                self.new_hosts[n['host']].services[n['service']].acknowledged = n['acknowledged']
+                self.new_hosts[n['host']].services[n['service']].attempt = n['attempt']
+                self.new_hosts[n['host']].services[n['service']].duration = n['duration']
+                self.new_hosts[n['host']].services[n['service']].flapping = n['flapping']
+                self.new_hosts[n['host']].services[n['service']].host = n['host']
+                self.new_hosts[n['host']].services[n['service']].last_check = n['last_check']
+                self.new_hosts[n['host']].services[n['service']].name = n['service']
+                self.new_hosts[n['host']].services[n['service']].notifications_disabled = n["notifications_disabled"]
+                self.new_hosts[n['host']].services[n['service']].passiveonly = n['passiveonly']
+                self.new_hosts[n['host']].services[n['service']].scheduled_downtime = n['scheduled_downtime']
+                self.new_hosts[n['host']].services[n['service']].status = n['status']
+                self.new_hosts[n['host']].services[n['service']].status_information = n['status_information'].replace("\n", " ").strip()
+        finally:
+            self.new_hosts_lock.release()
+
+
     def open_tree_view(self, host, service):
         if not service:
             url = "%s/monitor/index.php/extinfo/details?host=%s" % (self.monitor_url, host)
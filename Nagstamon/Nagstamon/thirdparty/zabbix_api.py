@@ -36,6 +36,7 @@ try:
 except ImportError:
     import urllib.request as urllib2  # python3
 import re
+import zlib
 from collections import deque
 
 default_log_handler = logging.StreamHandler(sys.stdout)
@@ -134,10 +135,12 @@ class ZabbixAPI(object):
     # passwd: HTTP auth password
     # log_level: logging level
     # r_query_len: max len query history
+    # opener: urllib2 opener to use for all requests, for example one keeping
+    #         connections alive - if None one is built once for this object
     # **kwargs: Data to pass to each api module
 
     def __init__(self, server='http://localhost/zabbix', user=None, passwd=None,
-                 log_level=logging.WARNING, timeout=10, r_query_len=10, **kwargs):
+                 log_level=logging.WARNING, timeout=10, r_query_len=10, opener=None, **kwargs):
         """ Create an API object.  """
         self._setuplogging()
         self.set_log_level(log_level)
@@ -174,6 +177,20 @@ class ZabbixAPI(object):
         self.apiinfo = ZabbixAPISubClass(self, dict({"prefix": "apiinfo"}, **kwargs))
         self.id = 0
         self.r_query = deque([], maxlen=r_query_len)
+        # one opener for all requests instead of a new one per request
+        if opener is None:
+            if self.proto == "https":
+                opener = urllib2.build_opener(urllib2.HTTPSHandler(debuglevel=0))
+            elif self.proto == "http":
+                opener = urllib2.build_opener(urllib2.HTTPHandler(debuglevel=0))
+            else:
+                raise ZabbixAPIException("Unknow protocol %s" % self.proto)
+        self.opener = opener
+        # set to False if server does not understand JSON-RPC batch requests
+        self.batch_supported = True
+        # bytes received on the wire and after decompression
+        self.bytes_wire = 0
+        self.bytes_decoded = 0
         self.debug(logging.INFO, "url: " + self.url)
 
     def _setuplogging(self):
@@ -199,17 +216,22 @@ class ZabbixAPI(object):
         self.logger.log(level, strval)
 
     def json_obj(self, method, params={}):
-        obj = {'jsonrpc': '2.0',
-               'method': method,
-               'params': params,
-               'auth': self.auth,
-               'id': self.id
-              }
+        obj = self.json_dict(method, params)
 
         self.debug(logging.DEBUG, "json_obj: " + str(obj))
 
         return json.dumps(obj)
 
+    def json_dict(self, method, params={}, id=None):
+        if id is None:
+            id = self.id
+        return {'jsonrpc': '2.0',
+                'method': method,
+                'params': params,
+                'auth': self.auth,
+                'id': id
+               }
+
     def login(self, user='', password='', save=True):
         if user != '':
             l_user = user
@@ -245,9 +267,11 @@ class ZabbixAPI(object):
         else:
             return False
 
-    def do_request(self, json_obj):
+    def post(self, json_obj):
+        """ POST JSON string to API and give back decoded answer. """
         headers = {'Content-Type': 'application/json-rpc',
-                   'User-Agent': 'python/zabbix_api'}
+                   'User-Agent': 'python/zabbix_api',
+                   'Accept-Encoding': 'gzip, deflate'}
 
         if self.httpuser:
             self.debug(logging.INFO, "HTTP Auth enabled")
@@ -258,45 +282,109 @@ class ZabbixAPI(object):
         self.debug(logging.DEBUG, "Sending headers: " + str(headers))
 
         request = urllib2.Request(url=self.url, data=json_obj.encode('utf-8'), headers=headers)
-        if self.proto == "https":
-            https_handler = urllib2.HTTPSHandler(debuglevel=0)
-            opener = urllib2.build_opener(https_handler)
-        elif self.proto == "http":
-            http_handler = urllib2.HTTPHandler(debuglevel=0)
-            opener = urllib2.build_opener(http_handler)
-        else:
-            raise ZabbixAPIException("Unknow protocol %s" % self.proto)
-
-        urllib2.install_opener(opener)
-        response = opener.open(request, timeout=self.timeout)
+        response = self.opener.open(request, timeout=self.timeout)
         self.debug(logging.INFO, "Response Code: " + str(response.code))
 
         # NOTE: Getting a 412 response code means the headers are not in the
         # list of allowed headers.
         if response.code != 200:
             raise ZabbixAPIException("HTTP ERROR %s: %s"
-                    % (response.status, response.reason))
-        reads = response.read()
+                    % (response.code, response.msg))
+        reads = self.read_response(response)
         if len(reads) == 0:
             raise ZabbixAPIException("Received zero answer")
         try:
             jobj = json.loads(reads.decode('utf-8'))
         except ValueError as msg:
-            print ("unable to decode. returned string: %s" % reads)
-            sys.exit(-1)
+            raise ZabbixAPIException("Unable to decode answer: %s" % reads[:200])
         self.debug(logging.DEBUG, "Response Body: " + str(jobj))
+        return jobj
 
-        self.id += 1
-
+    def check_error(self, jobj, json_obj):
         if 'error' in jobj:  # some exception
             msg = "Error %s: %s, %s while sending %s" % (jobj['error']['code'],
-                    jobj['error']['message'], jobj['error']['data'], str(json_obj))
-            if re.search(".*already\sexists.*", jobj["error"]["data"], re.I):  # already exists
+                    jobj['error']['message'], jobj['error'].get('data', ''), str(json_obj))
+            if re.search(".*already\sexists.*", jobj["error"].get("data", ""), re.I):  # already exists
                 raise Already_Exists(msg, jobj['error']['code'])
             else:
                 raise ZabbixAPIException(msg, jobj['error']['code'])
+
+    def do_request(self, json_obj):
+        jobj = self.post(json_obj)
+
+        self.id += 1
+
+        self.check_error(jobj, json_obj)
         return jobj
 
+    def batch(self, calls):
+        """
+        Send several method calls in one JSON-RPC 2.0 batch request.
+        calls is a list of (method, params) tuples, results are given back
+        in the same order. Servers which do not understand batches get the
+        calls one after another.
+        """
+        self.__checkauth__()
+        if not self.batch_supported or len(calls) == 1:
+            return [self.do_request(self.json_obj(method, params))['result'] for method, params in calls]
+
+        objs = []
+        for method, params in calls:
+            objs.append(self.json_dict(method, params, self.id))
+            self.id += 1
+        json_obj = json.dumps(objs)
+        jobj = self.post(json_obj)
+
+        if not isinstance(jobj, list):
+            # no batch support - single error object for the whole request
+            self.debug(logging.INFO, "Batch requests not supported: " + str(jobj))
+            self.batch_supported = False
+            return self.batch(calls)
+
+        answers = dict((answer.get('id'), answer) for answer in jobj)
+        results = []
+        for obj in objs:
+            if obj['id'] not in answers:
+                raise ZabbixAPIException("No answer for %s" % obj['method'])
+            self.check_error(answers[obj['id']], json.dumps(obj))
+            results.append(answers[obj['id']]['result'])
+        return results
+
+    def read_response(self, response, chunk_size=65536):
+        """ Read response body, decompressing it chunk by chunk if needed. """
+        encoding = (response.info().get('Content-Encoding') or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decompressor = zlib.decompressobj()
+        else:
+            decompressor = None
+        chunks = []
+        first = True
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            self.bytes_wire += len(chunk)
+            if decompressor is not None:
+                try:
+                    chunk = decompressor.decompress(chunk)
+                except zlib.error:
+                    # raw deflate stream without zlib header
+                    if encoding != 'deflate' or not first:
+                        raise
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    chunk = decompressor.decompress(chunk)
+            first = False
+            self.bytes_decoded += len(chunk)
+            chunks.append(chunk)
+        if decompressor is not None:
+            chunk = decompressor.flush()
+            self.bytes_decoded += len(chunk)
+            chunks.append(chunk)
+        response.close()
+        return b''.join(chunks)
+
     def logged_in(self):
         if self.auth != '':
             return True
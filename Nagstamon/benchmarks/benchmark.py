@@ -0,0 +1,79 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    common parts of the benchmarks - makes Nagstamon of this source tree importable, reads rows and
+    repeats from command line, checks that both ways agree and prints their best times
+    to be imported by the benchmarks before any Nagstamon module, which are run like
+    python benchmarks/multisite_view.py [rows] [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# GUI has to come first like in nagstamon.py - Actions and GUI import each other
+from Nagstamon import GUI
+
+
+def get_arguments(rows, repeats=3):
+    """
+    rows and repeats from command line or defaults
+    """
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        repeats = int(sys.argv[2])
+    return rows, repeats
+
+
+def compare(former, current):
+    """
+    both ways have to build the same hosts and services before comparing their speed
+    """
+    assert sorted(former.keys()) == sorted(current.keys())
+    for name in former:
+        assert sorted(former[name].services.keys()) == sorted(current[name].services.keys())
+
+
+def measure(function, repeats):
+    """
+    best of repeats in seconds
+    """
+    durations = list()
+    for i in range(repeats):
+        start = time.time()
+        function()
+        durations.append(time.time() - start)
+    return min(durations)
+
+
+def report(description, repeats, former, current):
+    """
+    print best times of former and current way as (label, function) tuples and the speedup
+    """
+    print "%s, best of %s" % (description, repeats)
+    width = max(len(former[0]), len(current[0])) + 2
+    former_time = measure(former[1], repeats)
+    print "%s %.3f s" % ((former[0] + ":").ljust(width), former_time)
+    current_time = measure(current[1], repeats)
+    print "%s %.3f s" % ((current[0] + ":").ljust(width), current_time)
+    print "%s %.1fx" % ("speedup:".ljust(width), former_time / current_time)
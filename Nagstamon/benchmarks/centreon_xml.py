@@ -0,0 +1,162 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    benchmark of Centreon status XML processing - the former BeautifulStoneSoup way against
+    the streaming expat parser used by CentreonServer, on synthetic hostXML/serviceXML pages
+"""
+
+import benchmark
+from Nagstamon import Config
+from Nagstamon.Objects import *
+from Nagstamon.Server.Centreon import CentreonServer, BeautifulStoneSoup
+
+HARD_SOFT = CentreonServer.HARD_SOFT
+
+
+def host_xml(rows):
+    """
+    synthetic hostXML.php answer
+    """
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>\n<reponse><i><numrows>%s</numrows><num>0</num><limit>%s</limit></i>' % (rows, rows)]
+    for i in range(rows):
+        xml.append('<l class="list_one"><o>%s</o><hc>#F7FAFF</hc><f></f><hid>%s</hid><hn>host%05d</hn>'
+                   '<hnl>host%05d</hnl><a>10.%s.%s.%s</a><ou>CRITICAL - 10.0.0.1: rta nan, lost 100%%</ou>'
+                   '<lc>15/05/2014 12:00:00</lc><cs>DOWN</cs><pha>0</pha><pce>1</pce><ha>%s</ha><hae>1</hae>'
+                   '<ace>1</ace><lsc>2d 3h 4m 5s</lsc><tr>3/3 (H)</tr><ne>1</ne><hdtm>0</hdtm><is>0</is>'
+                   '<ico></ico><cih>Critical</cih></l>' % (i, i, i, i, i / 65536, i / 256 % 256, i % 256, i % 2))
+    xml.append('</reponse>')
+    return "".join(xml)
+
+
+def service_xml(rows):
+    """
+    synthetic serviceXML.php answer
+    """
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>\n<reponse><i><numrows>%s</numrows><num>0</num><limit>%s</limit></i>' % (rows, rows)]
+    for i in range(rows):
+        xml.append('<l class="list_two"><o>%s</o><f></f><hc>#F7FAFF</hc><hn>host%05d</hn><hau></hau><hnl>host%05d</hnl>'
+                   '<hid>%s</hid><ppd>0</ppd><hs>UP</hs><sd>Service %s &amp; more</sd><svc_id>%s</svc_id>'
+                   '<sc>#F7D507</sc><cs>WARNING</cs><po>WARNING - load average: 5.01, 4.20, 3.99</po>'
+                   '<ca>1/3 (S)</ca><ne>1</ne><pa>%s</pa><pc>1</pc><ac>1</ac><eh>1</eh><is>0</is><fd>1</fd>'
+                   '<dtm>0</dtm><d>4m 12s</d><lc>15/05/2014 12:00:00</lc><nc>15/05/2014 12:05:00</nc>'
+                   '<lsc>15/05/2014 11:55:48</lsc><cih>Critical</cih></l>' % (i, i / 10, i / 10, i / 10, i, i, i % 2))
+    xml.append('</reponse>')
+    return "".join(xml)
+
+
+def former_way(hosts, services):
+    """
+    objects built like CentreonServer did before with BeautifulStoneSoup
+    """
+    new_hosts = dict()
+    xmlobj = BeautifulStoneSoup(hosts.decode("utf8"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
+    for l in xmlobj.findAll("l"):
+        if not new_hosts.has_key(str(l.hn.text)):
+            new_hosts[str(l.hn.text)] = GenericHost()
+            new_hosts[str(l.hn.text)].name =  str(l.hn.text)
+            new_hosts[str(l.hn.text)].status = str(l.cs.text)
+            new_hosts[str(l.hn.text)].attempt, new_hosts[str(l.hn.text)].status_type  = str(l.tr.text).split(" ")
+            new_hosts[str(l.hn.text)].status_type = HARD_SOFT[new_hosts[str(l.hn.text)].status_type]
+            new_hosts[str(l.hn.text)].last_check = str(l.lc.text)
+            new_hosts[str(l.hn.text)].duration = str(l.lsc.text)
+            new_hosts[str(l.hn.text)].status_information= str(l.ou.text)
+            if l.find("cih") != None:
+                new_hosts[str(l.hn.text)].criticality = str(l.cih.text)
+            else:
+                new_hosts[str(l.hn.text)].criticality = ""
+            new_hosts[str(l.hn.text)].acknowledged = bool(int(str(l.ha.text)))
+            new_hosts[str(l.hn.text)].scheduled_downtime = bool(int(str(l.hdtm.text)))
+            if l.find("is") != None:
+                new_hosts[str(l.hn.text)].flapping = bool(int(str(l.find("is").text)))
+            else:
+                new_hosts[str(l.hn.text)].flapping = False
+            new_hosts[str(l.hn.text)].notifications_disabled = not bool(int(str(l.ne.text)))
+            new_hosts[str(l.hn.text)].passiveonly = not bool(int(str(l.ace.text)))
+            if l.find("a") != None:
+                new_hosts[str(l.hn.text)].address = str(l.a.text)
+    del xmlobj
+
+    xmlobj = BeautifulStoneSoup(services.decode("utf8"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
+    for l in xmlobj.findAll("l"):
+        if not new_hosts.has_key(str(l.hn.text)):
+            new_hosts[str(l.hn.text)] = GenericHost()
+            new_hosts[str(l.hn.text)].name = str(l.hn.text)
+            new_hosts[str(l.hn.text)].status = "UP"
+        if not new_hosts[str(l.hn.text)].services.has_key(str(l.sd.text)):
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)] = GenericService()
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].host = str(l.hn.text)
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].name = str(l.sd.text)
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].status = str(l.cs.text)
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].attempt, \
+                new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type = str(l.ca.text).split(" ")
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type =\
+                HARD_SOFT[new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type]
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].last_check = str(l.lc.text)
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].duration = str(l.d.text)
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_information = str(l.po.text).replace("\n", " ").strip()
+            if l.find("cih") != None:
+                new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = str(l.cih.text)
+            else:
+                new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = ""
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].acknowledged = bool(int(str(l.pa.text)))
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].scheduled_downtime = bool(int(str(l.dtm.text)))
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].flapping = bool(int(str(l.find("is").text)))
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].notifications_disabled = not bool(int(str(l.ne.text)))
+            new_hosts[str(l.hn.text)].services[str(l.sd.text)].passiveonly = not bool(int(str(l.ac.text)))
+    del xmlobj
+
+    return new_hosts
+
+
+def streaming_way(server, hosts, services):
+    """
+    objects built by CentreonServer itself, only the HTTP request is left out
+    """
+    answers = {"hostXML.php": hosts, "serviceXML.php": services}
+
+    def fetch(url, callback):
+        answer = answers[url.split("?")[0].split("/")[-1]]
+        for start in range(0, len(answer), 65536):
+            callback(answer[start:start + 65536])
+        callback("")
+        return Result()
+
+    server.FetchURLChunks = fetch
+    server.new_hosts = dict()
+    result = server._get_status()
+    if result.error != "":
+        raise Exception(result.error)
+    return server.new_hosts
+
+
+if __name__ == "__main__":
+    rows, repeats = benchmark.get_arguments(10000)
+
+    hosts, services = host_xml(rows), service_xml(rows)
+
+    server = CentreonServer(conf=Config.Config(), name="benchmark")
+    server.SID = "benchmark"
+    server.page_size = rows
+
+    benchmark.compare(former_way(hosts, services), streaming_way(server, hosts, services))
+    benchmark.report("%s host rows (%s KB), %s service rows (%s KB)" %\
+                     (rows, len(hosts) / 1024, rows, len(services) / 1024), repeats,
+                     ("BeautifulStoneSoup", lambda: former_way(hosts, services)),
+                     ("expat streaming", lambda: streaming_way(server, hosts, services)))
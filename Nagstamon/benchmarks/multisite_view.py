@@ -0,0 +1,158 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    benchmark of Check_MK Multisite view processing - the former eval() of python output with a
+    deep-copied dict per row against JSON decoding with header indexed columns used by MultisiteServer
+"""
+
+import copy
+import json
+
+import benchmark
+from Nagstamon import Config
+from Nagstamon.Objects import *
+from Nagstamon.Server.Multisite import MultisiteServer
+
+HOST_HEADER = ["host_state", "host", "host_icons", "num_services_ok", "num_services_warn", "num_services_unknown",
+               "num_services_crit", "num_services_pending", "host_check_age", "host_state_age", "host_plugin_output",
+               "host_attempt", "sitename_plain", "host_address", "host_in_downtime", "host_acknowledged"]
+
+SERVICE_HEADER = ["service_state", "host", "service_description", "service_icons", "svc_plugin_output",
+                  "svc_state_age", "svc_check_age", "svc_attempt", "svc_is_active", "svc_check_command",
+                  "svc_notifications_enabled", "svc_flapping", "sitename_plain", "host_address",
+                  "svc_in_downtime", "svc_acknowledged"]
+
+
+def host_rows(rows):
+    """
+    synthetic nagstamon_hosts view
+    """
+    view = [HOST_HEADER]
+    for i in range(rows):
+        view.append(["DOWN", u"host%05d" % i, "", "3", "1", "0", "2", "0", "12 sec", "2 hrs",
+                     u"CRITICAL - 10.0.0.1: rta nan, lost 100%", "3/3", "site%s" % (i % 3),
+                     "10.%s.%s.%s" % (i / 65536, i / 256 % 256, i % 256), "no", i % 2 and "yes" or "no"])
+    return view
+
+
+def service_rows(rows):
+    """
+    synthetic nagstamon_svc view
+    """
+    view = [SERVICE_HEADER]
+    for i in range(rows):
+        view.append(["WARN", u"host%05d" % (i / 10), u"Service %s \xe4\xf6\xfc" % i, "",
+                     u"WARNING - load average: 5.01, 4.20, 3.99\nsecond line", "4 min", "8 sec",
+                     i % 3 and "1/3" or "3/3", i % 4 and "yes" or "no", i % 5 and "check_mk-cpu.loads" or "check_nrpe",
+                     "yes", "no", "site%s" % (i % 3), "10.0.%s.%s" % (i / 2560, i / 10 % 256), "no",
+                     i % 2 and "yes" or "no"])
+    return view
+
+
+def former_way(hosts, services):
+    """
+    objects built like MultisiteServer did before with eval() and a deep-copied dict per row
+    """
+    new_hosts = dict()
+    response = eval(hosts)
+    for row in response[1:]:
+        host = dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
+        if not new_hosts.has_key(host["host"]):
+            new_hosts[host["host"]] = GenericHost()
+            new_hosts[host["host"]].name = host["host"]
+            new_hosts[host["host"]].status = host["host_state"]
+            new_hosts[host["host"]].last_check = host["host_check_age"]
+            new_hosts[host["host"]].duration = host["host_state_age"]
+            new_hosts[host["host"]].attempt = host["host_attempt"]
+            new_hosts[host["host"]].status_information = host["host_plugin_output"].replace("\n", " ")
+            new_hosts[host["host"]].site = host["sitename_plain"]
+            new_hosts[host["host"]].address = host["host_address"]
+            if host.has_key("host_in_downtime") and host["host_in_downtime"] == "yes":
+                new_hosts[host["host"]].scheduled_downtime = True
+            if host.has_key("host_acknowledged") and host["host_acknowledged"] == "yes":
+                new_hosts[host["host"]].acknowledged = True
+            real_attempt, max_attempt = new_hosts[host["host"]].attempt.split("/")
+            new_hosts[host["host"]].status_type = real_attempt <> max_attempt and "soft" or "hard"
+    del response
+
+    response = eval(services)
+    for row in response[1:]:
+        service = dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
+        n = {"host": service["host"].encode("utf-8"),
+             "service": service["service_description"].encode("utf-8")}
+        if not new_hosts.has_key(n["host"]):
+            new_hosts[n["host"]] = GenericHost()
+            new_hosts[n["host"]].name = n["host"]
+            new_hosts[n["host"]].status = "UP"
+        if not new_hosts[n["host"]].services.has_key(n["service"]):
+            new_service = GenericService()
+            new_service.host = n["host"]
+            new_service.name = n["service"]
+            new_service.status = service["service_state"]
+            new_service.last_check = service["svc_check_age"]
+            new_service.duration = service["svc_state_age"]
+            new_service.attempt = service["svc_attempt"]
+            new_service.status_information = service["svc_plugin_output"].encode("utf-8").replace("\n", " ").strip()
+            new_service.passiveonly = service["svc_is_active"] == "no" and not service["svc_check_command"].startswith("check_mk")
+            new_service.flapping = service["svc_flapping"] == "yes"
+            new_service.site = service["sitename_plain"]
+            new_service.address = service["host_address"]
+            if service.has_key("svc_in_downtime") and service["svc_in_downtime"] == "yes":
+                new_service.scheduled_downtime = True
+            if service.has_key("svc_acknowledged") and service["svc_acknowledged"] == "yes":
+                new_service.acknowledged = True
+            real_attempt, max_attempt = new_service.attempt.split("/")
+            new_service.status_type = real_attempt <> max_attempt and "soft" or "hard"
+            new_hosts[n["host"]].services[n["service"]] = new_service
+    del response
+
+    return new_hosts
+
+
+def current_way(server, hosts, services):
+    """
+    objects built by MultisiteServer itself, only the HTTP request is left out
+    """
+    answers = {"nagstamon_hosts": hosts, "nagstamon_svc": services}
+    # FetchURL gives back unicode
+    server.FetchURL = lambda url, giveback: Result(result=answers[url.split("view_name=")[1].split("&")[0]].decode("utf-8"))
+    server.new_hosts = dict()
+    result = server._get_status()
+    if result.error != "":
+        raise Exception(result.error)
+    return server.new_hosts
+
+
+if __name__ == "__main__":
+    rows, repeats = benchmark.get_arguments(50000)
+
+    # hosts are a tenth of the services like in the views
+    python_hosts, python_services = repr(host_rows(rows / 10)), repr(service_rows(rows))
+    json_hosts, json_services = json.dumps(host_rows(rows / 10)), json.dumps(service_rows(rows))
+
+    server = MultisiteServer(conf=Config.Config(), name="benchmark")
+    server.monitor_url = "http://benchmark/check_mk/"
+    server.init_HTTP()
+
+    benchmark.compare(former_way(python_hosts, python_services), current_way(server, json_hosts, json_services))
+    benchmark.report("%s host rows, %s service rows (python %s KB, JSON %s KB)" %\
+                     (rows / 10, rows, len(python_services) / 1024, len(json_services) / 1024), repeats,
+                     ("eval() and deepcopy", lambda: former_way(python_hosts, python_services)),
+                     ("JSON and column index", lambda: current_way(server, json_hosts, json_services)))
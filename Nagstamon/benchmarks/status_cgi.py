@@ -0,0 +1,187 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+    benchmark of status.cgi HTML processing - the former BeautifulSoup way against the streaming
+    status table extractor used by GenericServer and IcingaServer, on synthetic Nagios pages
+"""
+
+import benchmark
+from Nagstamon import Config
+from Nagstamon.Objects import *
+from Nagstamon.Server.Generic import GenericServer, BeautifulSoup, not_empty
+
+HEAD = '''<html><head><title>Current Network Status</title></head><body CLASS='status'>
+<table border=0 width=100%% cellspacing=0 cellpadding=0><tr><td align=left valign=top width=33%%>
+<table class='infoBox' border=1 cellspacing=0 cellpadding=0><tr><td class='infoBox'>
+<div class='infoBoxTitle'>Current Network Status</div>Last Updated: Thu May 15 12:00:00 CEST 2014<br>
+</td></tr></table></td></tr></table>
+<table border=0 width=100%% class='status'>
+<tr><th class='status'>Host</th><th class='status'>%s</th><th class='status'>Status</th>
+<th class='status'>Last Check</th><th class='status'>Duration</th><th class='status'>%s</th></tr>
+'''
+
+FOOT = '''</table>\n<div class='itemTotalsTitle'>%s Matching Entries Displayed</div>\n</body></html>\n'''
+
+HOST_CELL = '''<td class='statusHOSTDOWN'><table border=0 width='100%%' cellpadding=0 cellspacing=0><tr>
+<td align='left'><table border=0 cellpadding=0 cellspacing=0><tr><td align=left valign=center class='statusHOSTDOWN'>
+<a href='extinfo.cgi?type=1&host=host%05d'>host%05d</a>&nbsp;</td></tr></table></td><td align=right valign=center>
+<table border=0 cellpadding=0 cellspacing=0><tr>%s<td><a href='status.cgi?host=host%05d'>
+<img src='/nagios/images/status2.gif' border=0 alt='View Service Details For This Host'></a></td></tr></table>
+</td></tr></table></td>'''
+
+ICONS = ["", "<td align=center valign=center><img src='/nagios/images/ack.gif' border=0 width=20 height=20></td>",
+         "<td align=center valign=center><img src='/nagios/images/downtime.gif' border=0 width=20 height=20></td>"]
+
+
+def host_html(rows):
+    """
+    synthetic status.cgi?style=hostdetail answer
+    """
+    html = [HEAD % ("Status", "Status Information")]
+    for i in range(rows):
+        html.append("<tr>%s<td class='statusHOSTDOWN'>DOWN</td><td class='statusBGDOWN' nowrap>2014-05-15 12:00:00</td>"
+                    "<td class='statusBGDOWN' nowrap>2d 3h 4m 5s</td><td class='statusBGDOWN'>CRITICAL - 10.0.0.1: "
+                    "rta nan, lost 100%%</td></tr>\n" % (HOST_CELL % (i, i, ICONS[i % 3], i)))
+    html.append(FOOT % rows)
+    return "".join(html)
+
+
+def service_html(rows):
+    """
+    synthetic status.cgi?host=all answer - like Nagios only the first service of a host shows the host
+    """
+    html = [HEAD % ("Service", "Attempt</th><th class='status'>Status Information")]
+    for i in range(rows):
+        host = i % 10 == 0 and HOST_CELL % (i / 10, i / 10, "", i / 10) or "<td></td>"
+        html.append("<tr>%s<td class='statusBGWARNING'><table border=0 width='100%%' cellspacing=0 cellpadding=0><tr>"
+                    "<td align=left valign=center class='statusBGWARNING'><a href='extinfo.cgi?type=2&host=host%05d&"
+                    "service=Service+%s'>Service %s &amp; more</a></td><td align=right class='statusBGWARNING'>"
+                    "<table border=0 cellspacing=0 cellpadding=0><tr>%s</tr></table></td></tr></table></td>"
+                    "<td class='statusWARNING'>WARNING</td><td class='statusBGWARNING' nowrap>2014-05-15 12:00:00</td>"
+                    "<td class='statusBGWARNING' nowrap>0d 0h 4m 12s</td><td class='statusBGWARNING'>1/3</td>"
+                    "<td class='statusBGWARNING' valign='center'>WARNING - load average: 5.01, 4.20, 3.99</td>"
+                    "</tr>\n" % (host, i / 10, i, i, ICONS[i % 3]))
+        # Nagios puts empty rows between hosts
+        if i % 10 == 9:
+            html.append("<tr><td colspan=6></td></tr>\n")
+    html.append(FOOT % rows)
+    return "".join(html)
+
+
+def former_way(hosts, services):
+    """
+    objects built like GenericServer did before with BeautifulSoup
+    """
+    new_hosts = dict()
+    htobj = BeautifulSoup(hosts, convertEntities=BeautifulSoup.ALL_ENTITIES)
+    trs = htobj('table', {'class': 'status'})[0]('tr', recursive=False)
+    trs.pop(0)
+    for tr in trs:
+        tds = tr('td', recursive=False)
+        if len(tds) > 1:
+            host = str(tds[0].table.tr.td.table.tr.td.a.string)
+            if not new_hosts.has_key(host):
+                new_hosts[host] = GenericHost()
+                new_hosts[host].name = host
+                new_hosts[host].status = str(tds[1].string)
+                new_hosts[host].last_check = str(tds[2].string)
+                new_hosts[host].duration = str(tds[3].string)
+                new_hosts[host].status_information = str(tds[4].string).encode("utf-8").replace("\n", " ").strip()
+                new_hosts[host].attempt = "N/A"
+                for i in tds[0].findAll('img'):
+                    icon = i["src"].split("/")[-1]
+                    if icon in GenericServer.STATUS_MAPPING:
+                        new_hosts[host].__dict__[GenericServer.STATUS_MAPPING[icon]] = True
+    htobj.decompose()
+    del htobj, trs
+
+    htobj = BeautifulSoup(services, convertEntities=BeautifulSoup.ALL_ENTITIES)
+    trs = htobj('table', {'class': 'status'})[0]('tr', recursive=False)
+    trs.pop(0)
+    host = ""
+    for tr in trs:
+        tds = tr('td', recursive=False)
+        if len(tds) > 1:
+            try:
+                host = str(tds[0](text=not_empty)[0])
+            except:
+                pass
+            service = str(tds[1](text=not_empty)[0])
+            if not new_hosts.has_key(host):
+                new_hosts[host] = GenericHost()
+                new_hosts[host].name = host
+                new_hosts[host].status = "UP"
+            if not new_hosts[host].services.has_key(service):
+                new_hosts[host].services[service] = GenericService()
+                new_hosts[host].services[service].host = host
+                new_hosts[host].services[service].name = service
+                new_hosts[host].services[service].status = str(tds[2](text=not_empty)[0])
+                new_hosts[host].services[service].last_check = str(tds[3](text=not_empty)[0])
+                new_hosts[host].services[service].duration = str(tds[4](text=not_empty)[0])
+                new_hosts[host].services[service].attempt = str(tds[5](text=not_empty)[0]).strip()
+                new_hosts[host].services[service].status_information = str(tds[6](text=not_empty)[0]).encode("utf-8")
+                for i in tds[1].findAll('img'):
+                    icon = i["src"].split("/")[-1]
+                    if icon in GenericServer.STATUS_MAPPING:
+                        new_hosts[host].services[service].__dict__[GenericServer.STATUS_MAPPING[icon]] = True
+    htobj.decompose()
+    del htobj, trs
+
+    return new_hosts
+
+
+def streaming_way(server, hosts, services):
+    """
+    objects built by GenericServer itself, only the HTTP requests are left out
+    """
+    # FetchURL gives back unicode
+    server.FetchStatusURLs = lambda urls: [Result(result=("hostdetail" in url and hosts or services).decode("utf-8"))\
+                                           for url in urls]
+    server.StatusURLsUnchanged = lambda results: False
+    result = server._get_status()
+    if result.error != "":
+        raise Exception(result.error)
+    return server.new_hosts
+
+
+if __name__ == "__main__":
+    rows, repeats = benchmark.get_arguments(20000)
+
+    # hosts are a tenth of the services, hard and soft pages are the same here
+    hosts, services = host_html(rows / 10), service_html(rows)
+
+    server = GenericServer(conf=Config.Config(), name="benchmark")
+    server.monitor_cgi_url = "http://benchmark/nagios/cgi-bin"
+    server.init_config()
+
+    former, streaming = former_way(hosts, services), streaming_way(server, hosts, services)
+    benchmark.compare(former, streaming)
+    for name in former:
+        assert former[name].status_information == streaming[name].status_information
+        assert former[name].acknowledged == streaming[name].acknowledged
+        for service in former[name].services:
+            assert former[name].services[service].status_information == streaming[name].services[service].status_information
+            assert former[name].services[service].scheduled_downtime == streaming[name].services[service].scheduled_downtime
+
+    # GenericServer reads hard and soft pages
+    benchmark.report("%s host rows (%s KB), %s service rows (%s KB)" %\
+                     (rows / 10, len(hosts) / 1024, rows, len(services) / 1024), repeats,
+                     ("BeautifulSoup", lambda: [former_way(hosts, services) for status_type in "hard", "soft"]),
+                     ("HTMLParser streaming", lambda: streaming_way(server, hosts, services)))